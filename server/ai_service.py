@@ -2,10 +2,15 @@
 from google import genai
 from google.genai import types
 from config import config
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterator, AsyncIterator, Callable, Tuple
 import traceback
+import asyncio
+from werkzeug.utils import secure_filename
 
-from models import NPCProfile, DialogueRequest, FactionStandingLevel
+from models import NPCProfile, DialogueRequest, FactionStandingLevel, StructuredDialogueOutput
+from prompt_cache import PersonaPrefixCache, build_context_cache_backend
+from response_cache import ResponseCache, CachedModelResponse, response_cache_key
+from token_budget import TokenEstimator, BudgetReport, make_section, fit_sections, section_caps
 
 # The new SDK handles model names robustly. 
 # "gemini-1.5-flash" is the recommended model for speed/cost.
@@ -53,192 +58,689 @@ class AIService:
             ]
         )
 
-    def summarize_interaction_for_memory(self, player_utterance: str, npc_response: str) -> str:
+        # Structured-output mode: same sampling and safety settings, but the reply is JSON constrained to
+        # StructuredDialogueOutput. Slightly more room, since the memory summary is part of the same reply.
+        self.structured_generation_config = self.generation_config.model_copy(update={
+            "max_output_tokens": 1200,
+            "response_mime_type": "application/json",
+            "response_schema": StructuredDialogueOutput
+        })
+
+        # Persona prefixes registered with the context cache (provider-side when a client is configured).
+        self.persona_cache = PersonaPrefixCache(build_context_cache_backend(self.client))
+        # Replies to identical prompts, served without a model call.
+        self.response_cache = ResponseCache()
+        # Local token estimates for prompt budgeting, calibrated against the counts the model reports.
+        self.token_estimator = TokenEstimator(model_name)
+
+    def build_memory_summary_prompt(self, player_utterance: str, npc_response: str) -> str:
+        return (
+            "You are a summarization assistant for a TTRPG. "
+            "Condense the following player-NPC interaction into a single, concise memory for the NPC. "
+            "Focus on the key facts, entities, and the emotional tone of the exchange. "
+            "Start with a verb. For example: 'Learned that...', 'Agreed to...', 'Became suspicious of...'.\n\n"
+            f"Player's statement: \"{player_utterance}\"\n"
+            f"NPC's response: \"{npc_response}\"\n\n"
+            "Concise memory (third person perspective for the NPC, e.g., 'He learned that...' or 'She felt...'):"
+        )
+
+    def _finalize_memory_summary(self, response, player_utterance: str) -> str:
+        if response.text:
+            return response.text.strip()
+        else:
+            print(f"Warning: AI response empty. Reason: {response.candidates[0].finish_reason if response.candidates else 'Unknown'}")
+            return f"Interaction regarding '{player_utterance}' occurred."
+
+    def summarize_interaction_for_memory(self, player_utterance: str, npc_response: str, raise_on_error: bool = False) -> str:
+        # raise_on_error lets the background job queue retry a failed call instead of storing the fallback text
         if not self.client:
             print("AI Service Error: Client not initialized.")
+            if raise_on_error:
+                raise RuntimeError("AI client not initialized")
             return f"Player: {player_utterance} / NPC: {npc_response}"
         
         try:
-            prompt = (
-                "You are a summarization assistant for a TTRPG. "
-                "Condense the following player-NPC interaction into a single, concise memory for the NPC. "
-                "Focus on the key facts, entities, and the emotional tone of the exchange. "
-                "Start with a verb. For example: 'Learned that...', 'Agreed to...', 'Became suspicious of...'.\n\n"
-                f"Player's statement: \"{player_utterance}\"\n"
-                f"NPC's response: \"{npc_response}\"\n\n"
-                "Concise memory (third person perspective for the NPC, e.g., 'He learned that...' or 'She felt...'):"
-            )
+            prompt = self.build_memory_summary_prompt(player_utterance, npc_response)
             
-            # NEW GENERATION CALL
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt,
-                config=self.generation_config
-            )
+            # NEW GENERATION CALL (a retried job for the same exchange is answered from the response cache)
+            response = self._generate_content(prompt, self.generation_config,
+                                              response_cache_key(self.model_name, self.generation_config, prompt))
+            if raise_on_error and not response.text:
+                raise RuntimeError(f"Empty summary response ({response.candidates[0].finish_reason if response.candidates else 'Unknown'})")
+            return self._finalize_memory_summary(response, player_utterance)
 
-            if response.text:
-                return response.text.strip()
-            else:
-                print(f"Warning: AI response empty. Reason: {response.candidates[0].finish_reason if response.candidates else 'Unknown'}")
-                return f"Interaction regarding '{player_utterance}' occurred."
+        except Exception as e:
+            if raise_on_error:
+                raise
+            print(f"Error during memory summarization: {e}")
+            traceback.print_exc()
+            return f"Player asked about '{player_utterance}', and I responded."
+
+    def summarize_memories_for_compaction(self, npc_name: str, memory_texts: List[str]) -> str:
+        # Memory compaction job: condense one period of an NPC's memories into a single summary memory.
+        # Raises on any failure so the job is retried instead of replacing the memories with a placeholder.
+        if not self.client:
+            raise RuntimeError("AI client not initialized")
+        prompt = (
+            "You are a summarization assistant for a TTRPG. "
+            f"Condense the following memories of the NPC {npc_name}, oldest first, into one short paragraph "
+            "that keeps every fact, name, promise and change of attitude that could matter later. "
+            "Write in the third person, past tense.\n\n"
+            + "\n".join(f"- {memory_text}" for memory_text in memory_texts)
+            + "\n\nSummary:"
+        )
+        response = self._generate_content(prompt, self.generation_config,
+                                          response_cache_key(self.model_name, self.generation_config, prompt))
+        if not response.text or not response.text.strip():
+            raise RuntimeError(f"Empty compaction summary ({response.candidates[0].finish_reason if response.candidates else 'Unknown'})")
+        return response.text.strip()
+
+    async def asummarize_interaction_for_memory(self, player_utterance: str, npc_response: str) -> str:
+        # Async twin of summarize_interaction_for_memory using the SDK's aio client; cancellation propagates to the caller
+        if not self.client:
+            print("AI Service Error: Client not initialized.")
+            return f"Player: {player_utterance} / NPC: {npc_response}"
+
+        try:
+            prompt = self.build_memory_summary_prompt(player_utterance, npc_response)
+            response = await self._agenerate_content(prompt, self.generation_config,
+                                                     response_cache_key(self.model_name, self.generation_config, prompt))
+            return self._finalize_memory_summary(response, player_utterance)
 
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             print(f"Error during memory summarization: {e}")
             traceback.print_exc()
             return f"Player asked about '{player_utterance}', and I responded."
 
-    def generate_npc_dialogue(self,
+    def build_persona_prefix(self,
+                             npc: NPCProfile,
+                             world_lore_summary: Optional[str] = None,
+                             detailed_character_history: Optional[str] = None) -> str:
+        # The static part of the prompt: only depends on the NPC's profile, history files and linked lore,
+        # so it is identical across turns and can be cached (see prompt_cache.py). Canned topics are chosen
+        # per utterance (see canned_matcher.py), so they belong to the turn suffix.
+        prompt_parts = [
+            f"You are embodying the character of {npc.name} in a tabletop roleplaying game.",
+            "--- Your Core Identity ---",
+            f"Name: {npc.name}",
+            f"Description: {npc.description}",
+            f"Personality Traits: {', '.join(npc.personality_traits) if npc.personality_traits else 'Not specified'}.",
+        ]
+        if npc.age: prompt_parts.append(f"Age: {npc.age}.")
+        if npc.race: prompt_parts.append(f"Race: {npc.race}.")
+        if npc.class_str: prompt_parts.append(f"Class/Role: {npc.class_str}.")
+        if npc.alignment: prompt_parts.append(f"Alignment: {npc.alignment}.")
+        if npc.speech_patterns: prompt_parts.append(f"Typical Speech Style: {npc.speech_patterns}")
+        if npc.mannerisms: prompt_parts.append(f"Common Mannerisms: {npc.mannerisms}")
+
+        if npc.background_story:
+            prompt_parts.append(f"\n--- Your General Background ---")
+            prompt_parts.append(npc.background_story)
+
+        if detailed_character_history and detailed_character_history.strip():
+            prompt_parts.append("\n--- Your Detailed History (Draw upon this deeply) ---")
+            prompt_parts.append(detailed_character_history.strip())
+
+        if world_lore_summary and world_lore_summary.strip() and "no specific linked lore" not in world_lore_summary.lower():
+            prompt_parts.append("\n--- Relevant World Lore & Context (Refer to this) ---")
+            prompt_parts.append(world_lore_summary.strip())
+        else:
+             prompt_parts.append(f"\n(No specific detailed history or linked world lore beyond your general background is provided for this interaction.)")
+
+        if npc.motivations:
+            prompt_parts.append(f"\nYour Motivations: {', '.join(npc.motivations)}")
+
+        prompt_parts.append("\n--- Meaning of Standings ---")
+        prompt_parts.append("- Ally/Warmly: Eager to help, friendly, open, trusting.")
+        prompt_parts.append("- Amiable/Kindly: Polite, willing to talk, generally positive.")
+        prompt_parts.append("- Indifferent: Neutral, business-like, transactional, disinterested.")
+        prompt_parts.append("- Apprehensive/Dubious: Suspicious, guarded, short answers, unwilling to help without reason.")
+        prompt_parts.append("- Threatening: Hostile, aggressive, actively unhelpful, might attack or threaten.")
+
+        return "\n".join(prompt_parts)
+
+    def build_turn_suffix(self,
+                          npc: NPCProfile,
+                          dialogue_request: DialogueRequest,
+                          current_pc_standing: Optional[FactionStandingLevel] = None,
+                          speaking_pc_name: Optional[str] = "the player",
+                          structured_output: bool = False,
+                          canned_conversations: Optional[Dict[str, str]] = None,
+                          retrieved_knowledge: Optional[List[str]] = None) -> str:
+        # Everything that changes between turns: memories, disposition, the scene, retrieved knowledge,
+        # candidate canned topics, the utterance and the output format
+        prompt_parts: List[str] = []
+
+        if npc.memories:
+            relevant_memories = npc.memories[-5:]
+            if relevant_memories:
+                memory_summary = "\n".join([f"- ({mem.type} on {mem.timestamp.strftime('%Y-%m-%d %H:%M')} from {mem.source}): {mem.content}" for mem in relevant_memories])
+                prompt_parts.append("\n--- Your Memories Most Relevant Now (Oldest first) ---")
+                prompt_parts.append(memory_summary)
+
+        prompt_parts.append(f"\n--- Your Current Disposition towards {speaking_pc_name} ---")
+        if current_pc_standing:
+            prompt_parts.append(f"CRITICAL INSTRUCTION: Your standing towards {speaking_pc_name} is strictly: {current_pc_standing.value}.")
+            prompt_parts.append(f"You MUST align your tone and willingness to cooperate with the '{current_pc_standing.value}' standing (see Meaning of Standings). Do not break character by being too helpful if you are hostile, or too cold if you are an ally.")
+        else:
+            prompt_parts.append(f"You currently have no specific established standing towards {speaking_pc_name}. Assume a neutral or initial reaction based on the context.")
+
+        prompt_parts.append(f"\n--- Current Situation ---")
+        prompt_parts.append(f"Scene: {dialogue_request.scene_context if dialogue_request.scene_context.strip() else 'A general setting.'}")
+        if dialogue_request.active_pcs:
+            prompt_parts.append(f"Other Player Characters present: {', '.join(dialogue_request.active_pcs)}")
+
+        if dialogue_request.recent_dialogue_history:
+            prompt_parts.append("\n--- Recent Conversation (Most recent line last) ---")
+            prompt_parts.append("\n".join(dialogue_request.recent_dialogue_history))
+
+        if retrieved_knowledge:
+            # Passages picked for this utterance by the knowledge index (see retrieval.py)
+            prompt_parts.append("\n--- Knowledge Relevant to This Moment (Use if it fits; do not recite) ---")
+            prompt_parts.append("\n".join(f"- {passage}" for passage in retrieved_knowledge))
+
+        if canned_conversations:
+            prompt_parts.append("\n--- Pre-defined Conversation Topics ---")
+            prompt_parts.append("If the player's utterance is a direct match or clear inquiry about one of the following topics, you MUST use the provided response verbatim.")
+            for topic, response in canned_conversations.items():
+                prompt_parts.append(f"Topic Keyword: '{topic}'")
+                prompt_parts.append(f"Your Canned Response: \"{response}\"")
+
+        prompt_parts.append("\n--- Your Task ---")
+
+        is_canned_response_directive = dialogue_request.player_utterance and dialogue_request.player_utterance.strip().startswith("(System Directive: Canned Response Used)")
+
+        if is_canned_response_directive:
+            # Logic for handling system directive for canned response
+            try:
+                canned_response_text = dialogue_request.player_utterance.split('The response was: "')[1].rsplit('"', 1)[0]
+                prompt_parts.append(f"A system event has occurred. You have already spoken: \"{canned_response_text}\"")
+                main_instruction = f"Based on what you just said, generate the suggestions (Action, Check, Topics, Standing) ONLY. Do NOT generate dialogue."
+            except IndexError:
+                 # Fallback if parsing fails
+                 main_instruction = "Generate actions and suggestions based on the previous canned response."
+        elif dialogue_request.player_utterance and dialogue_request.player_utterance.strip():
+            if dialogue_request.player_utterance.strip().startswith("(System Directive:"):
+                prompt_parts.append(f"System Directive: \"{dialogue_request.player_utterance.strip()}\"")
+                main_instruction = f"Respond IN CHARACTER as {npc.name}. Only speak dialogue or brief reaction descriptions."
+            else:
+                prompt_parts.append(f"{speaking_pc_name} says: \"{dialogue_request.player_utterance.strip()}\"")
+                main_instruction = f"Respond IN CHARACTER as {npc.name}. Only speak dialogue. Do not narrate actions unless minor parentheticals."
+        else:
+            main_instruction = f"Describe what you, {npc.name}, say or do. Be concise and in character."
+
+        prompt_parts.append(main_instruction)
+
+        if structured_output:
+            # The response schema enforces the shape; these lines only explain what each field should contain.
+            prompt_parts.append("\n--- Output Format (Required) ---")
+            prompt_parts.append("Reply with a single JSON object matching the provided schema:")
+            prompt_parts.append("- dialogue: your in-character reply (an empty string if you were told not to generate dialogue).")
+            prompt_parts.append("- npc_actions: three brief non-verbal actions.")
+            prompt_parts.append("- player_checks: one relevant skill check suggestion.")
+            prompt_parts.append("- generated_topics: two brief follow-up questions.")
+            prompt_parts.append(f"- suggested_new_standing: your new standing towards {speaking_pc_name} if it should change, otherwise null.")
+            prompt_parts.append("- standing_change_justification: a brief explanation.")
+            prompt_parts.append("- memory_summary: one concise third-person memory of this exchange for you, starting with a verb (e.g. 'Learned that...'). Empty if nothing was said to you.")
+            return "\n".join(prompt_parts)
+
+        prompt_parts.append("\n--- Additional Suggestions (Required Output) ---")
+        prompt_parts.append(f"After your dialogue, you MUST provide the following suggestions in the exact format below.")
+        prompt_parts.append(f"NPC_ACTION: [Three brief non-verbal actions, separated by semicolons]")
+        prompt_parts.append(f"PLAYER_CHECK: [One relevant skill check suggestion]")
+        prompt_parts.append(f"GENERATED_TOPICS: [Two brief follow-up questions, separated by semicolons]")
+        prompt_parts.append(f"STANDING_CHANGE_SUGGESTION_FOR_{dialogue_request.speaking_pc_id if dialogue_request.speaking_pc_id else 'PLAYER'}: [New standing level OR 'No change']")
+        prompt_parts.append(f"JUSTIFICATION: [Brief explanation]")
+
+        return "\n".join(prompt_parts)
+
+    def build_dialogue_prompt(self,
                               npc: NPCProfile,
                               dialogue_request: DialogueRequest,
                               current_pc_standing: Optional[FactionStandingLevel] = None,
                               speaking_pc_name: Optional[str] = "the player",
                               world_lore_summary: Optional[str] = None,
                               detailed_character_history: Optional[str] = None,
-                              canned_conversations: Optional[Dict[str, str]] = None) -> str:
-        if not self.client:
-            print("AI Service Error: Client not initialized.")
-            return "Error: AI model not available. Please check configuration and GEMINI_API_KEY."
+                              canned_conversations: Optional[Dict[str, str]] = None,
+                              retrieved_knowledge: Optional[List[str]] = None,
+                              structured_output: bool = False) -> str:
+        # The complete prompt as one string: the budgeted persona prefix followed by the turn suffix
+        prefix, suffix, _ = self.build_budgeted_prompt(npc, dialogue_request, current_pc_standing, speaking_pc_name, world_lore_summary,
+                                                       detailed_character_history, canned_conversations, retrieved_knowledge, structured_output)
+        return prefix + "\n" + suffix
 
-        try:
-            # --- PROMPT CONSTRUCTION (Same as before) ---
-            prompt_parts = [
-                f"You are embodying the character of {npc.name} in a tabletop roleplaying game.",
-                "--- Your Core Identity ---",
-                f"Name: {npc.name}",
-                f"Description: {npc.description}",
-                f"Personality Traits: {', '.join(npc.personality_traits) if npc.personality_traits else 'Not specified'}.",
-            ]
-            if npc.age: prompt_parts.append(f"Age: {npc.age}.")
-            if npc.race: prompt_parts.append(f"Race: {npc.race}.")
-            if npc.class_str: prompt_parts.append(f"Class/Role: {npc.class_str}.")
-            if npc.alignment: prompt_parts.append(f"Alignment: {npc.alignment}.")
-            if npc.speech_patterns: prompt_parts.append(f"Typical Speech Style: {npc.speech_patterns}")
-            if npc.mannerisms: prompt_parts.append(f"Common Mannerisms: {npc.mannerisms}")
-
-            if npc.background_story:
-                prompt_parts.append(f"\n--- Your General Background ---")
-                prompt_parts.append(npc.background_story)
-
-            if detailed_character_history and detailed_character_history.strip():
-                prompt_parts.append("\n--- Your Detailed History (Draw upon this deeply) ---")
-                prompt_parts.append(detailed_character_history.strip())
-
-            if world_lore_summary and world_lore_summary.strip() and "no specific linked lore" not in world_lore_summary.lower():
-                prompt_parts.append("\n--- Relevant World Lore & Context (Refer to this) ---")
-                prompt_parts.append(world_lore_summary.strip())
-            else:
-                 prompt_parts.append(f"\n(No specific detailed history or linked world lore beyond your general background is provided for this interaction.)")
-
-            if canned_conversations:
-                prompt_parts.append("\n--- Pre-defined Conversation Topics ---")
-                prompt_parts.append("If the player's utterance is a direct match or clear inquiry about one of the following topics, you MUST use the provided response verbatim.")
-                for topic, response in canned_conversations.items():
-                    prompt_parts.append(f"Topic Keyword: '{topic}'")
-                    prompt_parts.append(f"Your Canned Response: \"{response}\"")
-
-            if npc.motivations:
-                prompt_parts.append(f"\nYour Motivations: {', '.join(npc.motivations)}")
-
-            if npc.memories:
-                relevant_memories = npc.memories[-5:]
-                if relevant_memories:
-                    memory_summary = "\n".join([f"- ({mem.type} on {mem.timestamp.strftime('%Y-%m-%d %H:%M')} from {mem.source}): {mem.content}" for mem in relevant_memories])
-                    prompt_parts.append("\n--- Your Recent Memories (Most recent first) ---")
-                    prompt_parts.append(memory_summary)
-
-
-            prompt_parts.append(f"\n--- Your Current Disposition towards {speaking_pc_name} ---")
-            if current_pc_standing:
-                prompt_parts.append(f"CRITICAL INSTRUCTION: Your standing towards {speaking_pc_name} is strictly: {current_pc_standing.value}.")
-                prompt_parts.append("Meaning of Standings:")
-                prompt_parts.append("- Ally/Warmly: Eager to help, friendly, open, trusting.")
-                prompt_parts.append("- Amiable/Kindly: Polite, willing to talk, generally positive.")
-                prompt_parts.append("- Indifferent: Neutral, business-like, transactional, disinterested.")
-                prompt_parts.append("- Apprehensive/Dubious: Suspicious, guarded, short answers, unwilling to help without reason.")
-                prompt_parts.append("- Threatening: Hostile, aggressive, actively unhelpful, might attack or threaten.")
-                prompt_parts.append(f"You MUST align your tone and willingness to cooperate with the '{current_pc_standing.value}' standing. Do not break character by being too helpful if you are hostile, or too cold if you are an ally.")
-            else:
-                prompt_parts.append(f"You currently have no specific established standing towards {speaking_pc_name}. Assume a neutral or initial reaction based on the context.")
+    def build_budgeted_prompt(self,
+                              npc: NPCProfile,
+                              dialogue_request: DialogueRequest,
+                              current_pc_standing: Optional[FactionStandingLevel] = None,
+                              speaking_pc_name: Optional[str] = "the player",
+                              world_lore_summary: Optional[str] = None,
+                              detailed_character_history: Optional[str] = None,
+                              canned_conversations: Optional[Dict[str, str]] = None,
+                              retrieved_knowledge: Optional[List[str]] = None,
+                              structured_output: bool = False) -> Tuple[str, str, BudgetReport]:
+        # Fits the variable prompt sections into PROMPT_TOKEN_BUDGET (see token_budget.py) and returns
+        # (prefix, suffix, report). The persona sections are fitted against the budget minus the turn sections'
+        # caps, so their cut never depends on the turn and the cached prefix stays identical from turn to turn.
+        estimator = self.token_estimator
+        caps = section_caps()
+        budget = config.PROMPT_TOKEN_BUDGET or None
+        recent_memories = npc.memories[-5:]
 
-            prompt_parts.append(f"\n--- Current Situation ---")
-            prompt_parts.append(f"Scene: {dialogue_request.scene_context if dialogue_request.scene_context.strip() else 'A general setting.'}")
-            if dialogue_request.active_pcs:
-                prompt_parts.append(f"Other Player Characters present: {', '.join(dialogue_request.active_pcs)}")
+        # Everything that is not budgeted (identity, standings legend, disposition, task, output format).
+        bare_npc = npc.model_copy(update={"background_story": None, "memories": []})
+        bare_request = dialogue_request.model_copy(update={"recent_dialogue_history": []})
+        fixed_tokens = estimator.estimate(self.build_persona_prefix(bare_npc) + "\n"
+                                          + self.build_turn_suffix(npc, bare_request, current_pc_standing, speaking_pc_name, structured_output))
 
-            if dialogue_request.recent_dialogue_history:
-                prompt_parts.append("\n--- Recent Conversation (Most recent line last) ---")
-                prompt_parts.append("\n".join(dialogue_request.recent_dialogue_history))
+        persona_sections = [
+            make_section("background", estimator, text=npc.background_story or "", caps=caps),
+            # History files grow at both ends of interest: how the character began and what happened last.
+            make_section("history", estimator, text=detailed_character_history or "", keep="both", caps=caps),
+            make_section("lore", estimator, text=world_lore_summary or "", caps=caps),
+        ]
+        turn_sections = [
+            make_section("memories", estimator, items=[memory.content for memory in recent_memories], keep="tail", caps=caps),
+            make_section("conversation", estimator, items=dialogue_request.recent_dialogue_history, keep="tail", caps=caps),
+            make_section("knowledge", estimator, items=retrieved_knowledge or [], caps=caps),
+            make_section("canned_topics", estimator, items=[f"{topic}: {response}" for topic, response in (canned_conversations or {}).items()], caps=caps),
+        ]
+        turn_reserve = sum(section.cap or 0 for section in turn_sections)
+        fit_sections(persona_sections, None if budget is None else max(0, budget - fixed_tokens - turn_reserve), estimator)
+        persona_tokens = sum(section.tokens for section in persona_sections)
+        fit_sections(turn_sections, None if budget is None else max(0, budget - fixed_tokens - persona_tokens), estimator)
 
-            prompt_parts.append("\n--- Your Task ---")
-            
-            is_canned_response_directive = dialogue_request.player_utterance and dialogue_request.player_utterance.strip().startswith("(System Directive: Canned Response Used)")
+        background, history, lore = persona_sections
+        memories, conversation, knowledge, canned = turn_sections
+        budgeted_npc = npc.model_copy(update={
+            "background_story": background.text or None,
+            "memories": recent_memories[len(recent_memories) - memories.kept_items:] if memories.kept_items else []
+        })
+        budgeted_request = dialogue_request.model_copy(update={"recent_dialogue_history": conversation.kept()})
+        kept_topics = set(canned.kept())
+        budgeted_canned = {topic: response for topic, response in (canned_conversations or {}).items() if f"{topic}: {response}" in kept_topics}
+
+        prefix = self.build_persona_prefix(budgeted_npc, lore.text or None, history.text or None)
+        suffix = self.build_turn_suffix(budgeted_npc, budgeted_request, current_pc_standing, speaking_pc_name, structured_output,
+                                        budgeted_canned, knowledge.kept())
+        report = BudgetReport(budget or 0, fixed_tokens, persona_sections + turn_sections)
+        print(f"[Prompt Budget] {npc.name}: {report}")
+        return prefix, suffix, report
+
+    def _persona_cache_tags(self, npc: NPCProfile) -> Dict[str, set]:
+        # Sync change kinds (see database.register_sync_listener) that should drop this NPC's cached prefix.
+        # History files are tagged by the on-disk name the data watcher reports (the secure_filename that is read).
+        return {
+            "character": {npc.name},
+            "history": {secure_filename(filename) for filename in npc.associated_history_files if filename},
+            "lore": set(npc.linked_lore_by_name)
+        }
+
+    def _with_cached_prefix(self, prefix: str, suffix: str, handle: Optional[str], generation_config: types.GenerateContentConfig,
+                            dialogue_request: DialogueRequest):
+        # With a provider-side handle only the suffix is sent; otherwise the full prompt goes out as before.
+        # The response cache key always covers the full prompt, so it does not depend on the prefix handle.
+        full_prompt = prefix + "\n" + suffix
+        cache_key = None if dialogue_request.bypass_cache else response_cache_key(self.model_name, generation_config, full_prompt)
+        if handle and self.persona_cache.provider_side:
+            return suffix, generation_config.model_copy(update={"cached_content": handle}), cache_key
+        return full_prompt, generation_config, cache_key
+
+    def _observe_prompt_tokens(self, contents: str, usage_metadata):
+        # Calibrate the token estimator with the prompt size the model reports (minus tokens served from a context cache)
+        if usage_metadata is None or not usage_metadata.prompt_token_count:
+            return
+        self.token_estimator.observe(contents, usage_metadata.prompt_token_count - (usage_metadata.cached_content_token_count or 0))
+
+    def _generate_content(self, contents: str, call_config: types.GenerateContentConfig, cache_key: Optional[str],
+                          is_cacheable: Optional[Callable[[str], bool]] = None):
+        # One model call through the response cache; only replies with text (that pass is_cacheable) are stored
+        cached_text = self.response_cache.get(cache_key)
+        if cached_text is not None:
+            return CachedModelResponse(cached_text)
+        response = self.client.models.generate_content(model=self.model_name, contents=contents, config=call_config)
+        self._observe_prompt_tokens(contents, getattr(response, "usage_metadata", None))
+        if response.text and (is_cacheable is None or is_cacheable(response.text)):
+            self.response_cache.put(cache_key, self.model_name, response.text)
+        return response
+
+    async def _agenerate_content(self, contents: str, call_config: types.GenerateContentConfig, cache_key: Optional[str],
+                                 is_cacheable: Optional[Callable[[str], bool]] = None):
+        # Async twin of _generate_content
+        cached_text = await self.response_cache.aget(cache_key)
+        if cached_text is not None:
+            return CachedModelResponse(cached_text)
+        response = await self.client.aio.models.generate_content(model=self.model_name, contents=contents, config=call_config)
+        self._observe_prompt_tokens(contents, getattr(response, "usage_metadata", None))
+        if response.text and (is_cacheable is None or is_cacheable(response.text)):
+            await self.response_cache.aput(cache_key, self.model_name, response.text)
+        return response
+
+    def prepare_dialogue_call(self, npc: NPCProfile, dialogue_request: DialogueRequest,
+                              current_pc_standing: Optional[FactionStandingLevel] = None,
+                              speaking_pc_name: Optional[str] = "the player",
+                              world_lore_summary: Optional[str] = None,
+                              detailed_character_history: Optional[str] = None,
+                              canned_conversations: Optional[Dict[str, str]] = None,
+                              retrieved_knowledge: Optional[List[str]] = None,
+                              structured_output: bool = False):
+        # Returns (contents, config, response cache key) for a dialogue call, registering the NPC's persona prefix on first use
+        generation_config = self.structured_generation_config if structured_output else self.generation_config
+        prefix, suffix, _ = self.build_budgeted_prompt(npc, dialogue_request, current_pc_standing, speaking_pc_name, world_lore_summary,
+                                                       detailed_character_history, canned_conversations, retrieved_knowledge, structured_output)
+        handle = self.persona_cache.handle_for(self.model_name, prefix, npc.name, self._persona_cache_tags(npc))
+        return self._with_cached_prefix(prefix, suffix, handle, generation_config, dialogue_request)
+
+    async def aprepare_dialogue_call(self, npc: NPCProfile, dialogue_request: DialogueRequest,
+                                     current_pc_standing: Optional[FactionStandingLevel] = None,
+                                     speaking_pc_name: Optional[str] = "the player",
+                                     world_lore_summary: Optional[str] = None,
+                                     detailed_character_history: Optional[str] = None,
+                                     canned_conversations: Optional[Dict[str, str]] = None,
+                                     retrieved_knowledge: Optional[List[str]] = None,
+                                     structured_output: bool = False):
+        # Async twin of prepare_dialogue_call; registering a new prefix runs in a worker thread
+        generation_config = self.structured_generation_config if structured_output else self.generation_config
+        prefix, suffix, _ = self.build_budgeted_prompt(npc, dialogue_request, current_pc_standing, speaking_pc_name, world_lore_summary,
+                                                       detailed_character_history, canned_conversations, retrieved_knowledge, structured_output)
+        handle = await self.persona_cache.ahandle_for(self.model_name, prefix, npc.name, self._persona_cache_tags(npc))
+        return self._with_cached_prefix(prefix, suffix, handle, generation_config, dialogue_request)
+
+    def _finalize_dialogue_output(self, npc: NPCProfile, dialogue_request: DialogueRequest, response) -> str:
+        is_canned_response_directive = dialogue_request.player_utterance and dialogue_request.player_utterance.strip().startswith("(System Directive: Canned Response Used)")
+
+        # Accessing text in the new SDK
+        if response.text:
+            full_ai_output = response.text.strip()
 
             if is_canned_response_directive:
-                # Logic for handling system directive for canned response
                 try:
                     canned_response_text = dialogue_request.player_utterance.split('The response was: "')[1].rsplit('"', 1)[0]
-                    prompt_parts.append(f"A system event has occurred. You have already spoken: \"{canned_response_text}\"")
-                    main_instruction = f"Based on what you just said, generate the suggestions (Action, Check, Topics, Standing) ONLY. Do NOT generate dialogue."
-                except IndexError:
-                     # Fallback if parsing fails
-                     main_instruction = "Generate actions and suggestions based on the previous canned response."
-            elif dialogue_request.player_utterance and dialogue_request.player_utterance.strip():
-                if dialogue_request.player_utterance.strip().startswith("(System Directive:"):
-                    prompt_parts.append(f"System Directive: \"{dialogue_request.player_utterance.strip()}\"")
-                    main_instruction = f"Respond IN CHARACTER as {npc.name}. Only speak dialogue or brief reaction descriptions."
-                else:
-                    prompt_parts.append(f"{speaking_pc_name} says: \"{dialogue_request.player_utterance.strip()}\"")
-                    main_instruction = f"Respond IN CHARACTER as {npc.name}. Only speak dialogue. Do not narrate actions unless minor parentheticals."
+                    return f"{canned_response_text}\n{full_ai_output}"
+                except:
+                    return full_ai_output
             else:
-                main_instruction = f"Describe what you, {npc.name}, say or do. Be concise and in character."
-            
-            prompt_parts.append(main_instruction)
+                return full_ai_output
+        else:
+            # Handle blocked or empty responses
+            error_msg = "AI output blocked or empty."
+            if response.candidates and response.candidates[0].finish_reason:
+                 error_msg += f" Reason: {response.candidates[0].finish_reason}"
+            print(f"Warning: {error_msg}")
+            return f"({npc.name} seems lost in thought.)\nNPC_ACTION: None\nPLAYER_CHECK: None\nGENERATED_TOPICS: None\nSTANDING_CHANGE_SUGGESTION_FOR_PLAYER: No change\nJUSTIFICATION: {error_msg}"
 
-            prompt_parts.append("\n--- Additional Suggestions (Required Output) ---")
-            prompt_parts.append(f"After your dialogue, you MUST provide the following suggestions in the exact format below.")
-            prompt_parts.append(f"NPC_ACTION: [Three brief non-verbal actions, separated by semicolons]")
-            prompt_parts.append(f"PLAYER_CHECK: [One relevant skill check suggestion]")
-            prompt_parts.append(f"GENERATED_TOPICS: [Two brief follow-up questions, separated by semicolons]")
-            prompt_parts.append(f"STANDING_CHANGE_SUGGESTION_FOR_{dialogue_request.speaking_pc_id if dialogue_request.speaking_pc_id else 'PLAYER'}: [New standing level OR 'No change']")
-            prompt_parts.append(f"JUSTIFICATION: [Brief explanation]")
+    def _dialogue_error_output(self, npc: NPCProfile, e: Exception) -> str:
+        error_details = f"Error during AI dialogue generation for {npc.name}: {e}"
+        print(error_details)
+        traceback.print_exc()
+        return f"Error: Exception during AI dialogue generation - {type(e).__name__}.\nNPC_ACTION: None\nPLAYER_CHECK: None\nGENERATED_TOPICS: None\nSTANDING_CHANGE_SUGGESTION_FOR_PLAYER: No change\nJUSTIFICATION: Internal server error."
 
-            prompt = "\n".join(prompt_parts)
+    def generate_npc_dialogue(self,
+                              npc: NPCProfile,
+                              dialogue_request: DialogueRequest,
+                              current_pc_standing: Optional[FactionStandingLevel] = None,
+                              speaking_pc_name: Optional[str] = "the player",
+                              world_lore_summary: Optional[str] = None,
+                              detailed_character_history: Optional[str] = None,
+                              canned_conversations: Optional[Dict[str, str]] = None,
+                              retrieved_knowledge: Optional[List[str]] = None) -> str:
+        if not self.client:
+            print("AI Service Error: Client not initialized.")
+            return "Error: AI model not available. Please check configuration and GEMINI_API_KEY."
+
+        try:
+            contents, call_config, cache_key = self.prepare_dialogue_call(npc, dialogue_request, current_pc_standing, speaking_pc_name,
+                                                                          world_lore_summary, detailed_character_history, canned_conversations, retrieved_knowledge)
 
             print(f"\n----- AI PROMPT for {npc.name} -----")
             # print(prompt) # Uncomment to debug full prompt
             print("----- END PROMPT -----\n")
 
             # NEW GENERATION CALL
-            response = self.client.models.generate_content(
+            response = self._generate_content(contents, call_config, cache_key)
+            return self._finalize_dialogue_output(npc, dialogue_request, response)
+
+        except Exception as e:
+            return self._dialogue_error_output(npc, e)
+
+    async def agenerate_npc_dialogue(self,
+                                     npc: NPCProfile,
+                                     dialogue_request: DialogueRequest,
+                                     current_pc_standing: Optional[FactionStandingLevel] = None,
+                                     speaking_pc_name: Optional[str] = "the player",
+                                     world_lore_summary: Optional[str] = None,
+                                     detailed_character_history: Optional[str] = None,
+                                     canned_conversations: Optional[Dict[str, str]] = None,
+                                     retrieved_knowledge: Optional[List[str]] = None) -> str:
+        # Async twin of generate_npc_dialogue using the SDK's aio client so the event loop is never blocked;
+        # cancelling the awaiting task (e.g. on client disconnect) cancels the in-flight model request
+        if not self.client:
+            print("AI Service Error: Client not initialized.")
+            return "Error: AI model not available. Please check configuration and GEMINI_API_KEY."
+
+        try:
+            contents, call_config, cache_key = await self.aprepare_dialogue_call(npc, dialogue_request, current_pc_standing, speaking_pc_name,
+                                                                                 world_lore_summary, detailed_character_history, canned_conversations, retrieved_knowledge)
+            response = await self._agenerate_content(contents, call_config, cache_key)
+            return self._finalize_dialogue_output(npc, dialogue_request, response)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return self._dialogue_error_output(npc, e)
+
+    def _canned_stream_prefix(self, dialogue_request: DialogueRequest) -> Optional[str]:
+        # For a canned-response directive the line was already spoken; streams replay it ahead of the suggestions
+        utterance = dialogue_request.player_utterance
+        if not utterance or not utterance.strip().startswith("(System Directive: Canned Response Used)"):
+            return None
+        try:
+            return utterance.split('The response was: "')[1].rsplit('"', 1)[0] + "\n"
+        except IndexError:
+            return None
+
+    def _empty_stream_output(self, npc: NPCProfile) -> str:
+        print("Warning: AI output blocked or empty.")
+        return f"({npc.name} seems lost in thought.)\nNPC_ACTION: None\nPLAYER_CHECK: None\nGENERATED_TOPICS: None\nSTANDING_CHANGE_SUGGESTION_FOR_PLAYER: No change\nJUSTIFICATION: AI output blocked or empty."
+
+    def stream_npc_dialogue(self,
+                            npc: NPCProfile,
+                            dialogue_request: DialogueRequest,
+                            current_pc_standing: Optional[FactionStandingLevel] = None,
+                            speaking_pc_name: Optional[str] = "the player",
+                            world_lore_summary: Optional[str] = None,
+                            detailed_character_history: Optional[str] = None,
+                            canned_conversations: Optional[Dict[str, str]] = None,
+                            retrieved_knowledge: Optional[List[str]] = None) -> Iterator[str]:
+        # Streaming twin of generate_npc_dialogue: yields text chunks as the model produces them.
+        # Concatenated, the chunks equal what generate_npc_dialogue would have returned.
+        if not self.client:
+            print("AI Service Error: Client not initialized.")
+            yield "Error: AI model not available. Please check configuration and GEMINI_API_KEY."
+            return
+
+        produced_text = False
+        try:
+            contents, call_config, cache_key = self.prepare_dialogue_call(npc, dialogue_request, current_pc_standing, speaking_pc_name,
+                                                                          world_lore_summary, detailed_character_history, canned_conversations, retrieved_knowledge)
+
+            canned_prefix = self._canned_stream_prefix(dialogue_request)
+            cached_text = self.response_cache.get(cache_key)
+            if cached_text is not None:
+                # A cached reply is replayed as a single chunk.
+                yield (canned_prefix or "") + cached_text
+                return
+
+            streamed_parts: List[str] = []
+            usage_metadata = None
+            for chunk in self.client.models.generate_content_stream(
                 model=self.model_name,
-                contents=prompt,
-                config=self.generation_config
-            )
-
-            # Accessing text in the new SDK
-            if response.text:
-                full_ai_output = response.text.strip()
-                
-                if is_canned_response_directive:
-                    try:
-                        canned_response_text = dialogue_request.player_utterance.split('The response was: "')[1].rsplit('"', 1)[0]
-                        return f"{canned_response_text}\n{full_ai_output}"
-                    except:
-                        return full_ai_output
-                else:
-                    return full_ai_output
+                contents=contents,
+                config=call_config
+            ):
+                # Token counts arrive with the final chunk(s).
+                usage_metadata = getattr(chunk, "usage_metadata", None) or usage_metadata
+                if not chunk.text:
+                    continue
+                if not produced_text:
+                    produced_text = True
+                    if canned_prefix:
+                        yield canned_prefix
+                streamed_parts.append(chunk.text)
+                yield chunk.text
+
+            self._observe_prompt_tokens(contents, usage_metadata)
+            if not produced_text:
+                yield self._empty_stream_output(npc)
             else:
-                # Handle blocked or empty responses
-                error_msg = "AI output blocked or empty."
-                if response.candidates and response.candidates[0].finish_reason:
-                     error_msg += f" Reason: {response.candidates[0].finish_reason}"
-                print(f"Warning: {error_msg}")
-                return f"({npc.name} seems lost in thought.)\nNPC_ACTION: None\nPLAYER_CHECK: None\nGENERATED_TOPICS: None\nSTANDING_CHANGE_SUGGESTION_FOR_PLAYER: No change\nJUSTIFICATION: {error_msg}"
+                self.response_cache.put(cache_key, self.model_name, "".join(streamed_parts))
 
         except Exception as e:
-            error_details = f"Error during AI dialogue generation for {npc.name}: {e}"
-            print(error_details)
-            traceback.print_exc()
-            return f"Error: Exception during AI dialogue generation - {type(e).__name__}.\nNPC_ACTION: None\nPLAYER_CHECK: None\nGENERATED_TOPICS: None\nSTANDING_CHANGE_SUGGESTION_FOR_PLAYER: No change\nJUSTIFICATION: Internal server error."
+            yield ("\n" if produced_text else "") + self._dialogue_error_output(npc, e)
+
+    async def astream_npc_dialogue(self,
+                                   npc: NPCProfile,
+                                   dialogue_request: DialogueRequest,
+                                   current_pc_standing: Optional[FactionStandingLevel] = None,
+                                   speaking_pc_name: Optional[str] = "the player",
+                                   world_lore_summary: Optional[str] = None,
+                                   detailed_character_history: Optional[str] = None,
+                                   canned_conversations: Optional[Dict[str, str]] = None,
+                                   retrieved_knowledge: Optional[List[str]] = None) -> AsyncIterator[str]:
+        # Async twin of stream_npc_dialogue; closing the generator (client disconnect) aborts the model stream
+        if not self.client:
+            print("AI Service Error: Client not initialized.")
+            yield "Error: AI model not available. Please check configuration and GEMINI_API_KEY."
+            return
+
+        produced_text = False
+        try:
+            contents, call_config, cache_key = await self.aprepare_dialogue_call(npc, dialogue_request, current_pc_standing, speaking_pc_name,
+                                                                                 world_lore_summary, detailed_character_history, canned_conversations, retrieved_knowledge)
+
+            canned_prefix = self._canned_stream_prefix(dialogue_request)
+            cached_text = await self.response_cache.aget(cache_key)
+            if cached_text is not None:
+                # A cached reply is replayed as a single chunk.
+                yield (canned_prefix or "") + cached_text
+                return
+
+            streamed_parts: List[str] = []
+            usage_metadata = None
+            async for chunk in await self.client.aio.models.generate_content_stream(
+                model=self.model_name,
+                contents=contents,
+                config=call_config
+            ):
+                # Token counts arrive with the final chunk(s).
+                usage_metadata = getattr(chunk, "usage_metadata", None) or usage_metadata
+                if not chunk.text:
+                    continue
+                if not produced_text:
+                    produced_text = True
+                    if canned_prefix:
+                        yield canned_prefix
+                streamed_parts.append(chunk.text)
+                yield chunk.text
+
+            self._observe_prompt_tokens(contents, usage_metadata)
+            if not produced_text:
+                yield self._empty_stream_output(npc)
+            else:
+                await self.response_cache.aput(cache_key, self.model_name, "".join(streamed_parts))
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            yield ("\n" if produced_text else "") + self._dialogue_error_output(npc, e)
+
+    def _finalize_structured_output(self, npc: NPCProfile, dialogue_request: DialogueRequest, response) -> StructuredDialogueOutput:
+        # Validate the JSON reply into the schema; a blocked, empty or malformed reply becomes a safe placeholder
+        if not response.text:
+            error_msg = "AI output blocked or empty."
+            if response.candidates and response.candidates[0].finish_reason:
+                error_msg += f" Reason: {response.candidates[0].finish_reason}"
+            print(f"Warning: {error_msg}")
+            return StructuredDialogueOutput(dialogue=f"({npc.name} seems lost in thought.)", standing_change_justification=error_msg)
+
+        try:
+            structured = StructuredDialogueOutput.model_validate_json(response.text)
+        except ValueError as e:
+            print(f"Warning: Structured dialogue output failed validation for {npc.name}: {e}")
+            return StructuredDialogueOutput(dialogue=f"({npc.name} seems lost in thought.)", standing_change_justification="AI output did not match the schema.")
+
+        canned_prefix = self._canned_stream_prefix(dialogue_request)
+        if canned_prefix:
+            # The canned line was already spoken; it is the dialogue, whatever the model put there.
+            structured.dialogue = canned_prefix.strip()
+        return structured
+
+    def _is_valid_structured_text(self, text: str) -> bool:
+        # Only replies that validate are cached, so a malformed reply is never replayed
+        try:
+            StructuredDialogueOutput.model_validate_json(text)
+            return True
+        except ValueError:
+            return False
+
+    def _structured_error_output(self, npc: NPCProfile, e: Exception) -> StructuredDialogueOutput:
+        print(f"Error during structured AI dialogue generation for {npc.name}: {e}")
+        traceback.print_exc()
+        return StructuredDialogueOutput(
+            dialogue=f"Error: Exception during AI dialogue generation - {type(e).__name__}.",
+            standing_change_justification="Internal server error."
+        )
+
+    def generate_structured_npc_dialogue(self,
+                                         npc: NPCProfile,
+                                         dialogue_request: DialogueRequest,
+                                         current_pc_standing: Optional[FactionStandingLevel] = None,
+                                         speaking_pc_name: Optional[str] = "the player",
+                                         world_lore_summary: Optional[str] = None,
+                                         detailed_character_history: Optional[str] = None,
+                                         canned_conversations: Optional[Dict[str, str]] = None,
+                                         retrieved_knowledge: Optional[List[str]] = None) -> StructuredDialogueOutput:
+        # Structured-output mode: one schema-constrained call returns the reply, suggestions and memory summary
+        if not self.client:
+            print("AI Service Error: Client not initialized.")
+            return StructuredDialogueOutput(dialogue="Error: AI model not available. Please check configuration and GEMINI_API_KEY.")
+
+        try:
+            contents, call_config, cache_key = self.prepare_dialogue_call(npc, dialogue_request, current_pc_standing, speaking_pc_name,
+                                                                          world_lore_summary, detailed_character_history, canned_conversations, retrieved_knowledge,
+                                                                          structured_output=True)
+            response = self._generate_content(contents, call_config, cache_key, is_cacheable=self._is_valid_structured_text)
+            return self._finalize_structured_output(npc, dialogue_request, response)
+
+        except Exception as e:
+            return self._structured_error_output(npc, e)
+
+    async def agenerate_structured_npc_dialogue(self,
+                                                npc: NPCProfile,
+                                                dialogue_request: DialogueRequest,
+                                                current_pc_standing: Optional[FactionStandingLevel] = None,
+                                                speaking_pc_name: Optional[str] = "the player",
+                                                world_lore_summary: Optional[str] = None,
+                                                detailed_character_history: Optional[str] = None,
+                                                canned_conversations: Optional[Dict[str, str]] = None,
+                                                retrieved_knowledge: Optional[List[str]] = None) -> StructuredDialogueOutput:
+        # Async twin of generate_structured_npc_dialogue
+        if not self.client:
+            print("AI Service Error: Client not initialized.")
+            return StructuredDialogueOutput(dialogue="Error: AI model not available. Please check configuration and GEMINI_API_KEY.")
+
+        try:
+            contents, call_config, cache_key = await self.aprepare_dialogue_call(npc, dialogue_request, current_pc_standing, speaking_pc_name,
+                                                                                 world_lore_summary, detailed_character_history, canned_conversations, retrieved_knowledge,
+                                                                                 structured_output=True)
+            response = await self._agenerate_content(contents, call_config, cache_key, is_cacheable=self._is_valid_structured_text)
+            return self._finalize_structured_output(npc, dialogue_request, response)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return self._structured_error_output(npc, e)
 
 ai_service_instance = AIService()
\ No newline at end of file
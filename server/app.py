@@ -1,22 +1,26 @@
 import os
-import json
 import re
 import traceback
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import Optional, List, Dict, Any, Union
+from typing import Optional, List, Dict, Any, Tuple, Union
 from enum import Enum
 
-from flask import Flask, request, jsonify, render_template
-from bson import ObjectId, json_util
+from flask import Flask, request, jsonify, render_template, Response
+from bson import ObjectId
 from werkzeug.utils import secure_filename
 from pydantic import ValidationError
+from pymongo.errors import PyMongoError
 
 from config import config as app_config
-from database import db_connector, sync_data_from_files
+from database import db_connector, sync_data_from_files, register_sync_listener, write_mirrored_file
 from models import (
     NPCProfile, 
     DialogueRequest, 
     DialogueResponse, 
+    SceneDialogueRequest, 
+    StructuredDialogueOutput,
     MemoryItem, 
     NPCProfileWithHistoryAndLore, 
     FactionStandingLevel, 
@@ -24,9 +28,38 @@ from models import (
     LoreEntryType
 )
 from ai_service import ai_service_instance
+from data_watcher import start_data_watcher
+from serialization import BSONJSONProvider, dumps_bytes, to_json_compatible
+from http_cache import DOC_VERSION_FIELD, version_bump, make_strong_etag, not_modified_response, compress_response
+from dialogue_stream import (
+    IncrementalSuggestionParser,
+    suggestion_keywords,
+    suggestion_pc_key,
+    parse_suggestion_line,
+    format_sse_event,
+    format_parser_event,
+    SSE_HEADERS
+)
+from canned_matcher import canned_matcher_cache
+from live_chat import LiveChatUpdate, live_chat_buffer
+from history_cache import HistoryCache
+from lore_cache import lore_cache, fetch_lore_by_name
+from retrieval import knowledge_index
+from memory_recall import memory_recall
+from token_budget import section_caps
+from job_queue import enqueue_job, get_job, retry_job, register_job_handler, start_job_workers, JOBS_COLLECTION, JOB_STATUS_DEAD, JOB_STATUS_QUEUED, JOB_STATUS_RUNNING
+from memory_store import (
+    DUPLICATE_ACTIONS, PROMPT_RECENT_MEMORIES, add_memory_deduplicated, backfill_lsh_bands, compact_memories, dedupe_memories, count_memories, delete_memory, delete_npc_memories,
+    import_memories, list_memories, migrate_embedded_memories, needs_compaction, recent_memories
+)
+from indexes import REQUIRED_INDEXES, ensure_indexes, verify_query_plans, print_query_plan_report
 
 app = Flask(__name__)
 app.secret_key = app_config.SECRET_KEY
+# Encode Mongo documents (ObjectId, datetime, Enum) directly in jsonify instead of round-tripping them through json_util
+app.json = BSONJSONProvider(app)
+# Negotiate gzip/brotli compression for every sufficiently large response
+app.after_request(compress_response)
 mongo_db = db_connector.get_db()
 
 # Application Paths aligned with Config
@@ -53,13 +86,25 @@ PLAYER_CHARACTER_MAPPING = {
     "ortiz alehammer": "Moriah Kiah",
     "ortizalehammer": "Moriah Kiah"
 }
-live_session_history: List[str] = []
+
+# Background job type that turns a dialogue exchange into a pending NPC memory.
+MEMORY_SUMMARY_JOB = 'summarize_memory'
+# Background job type that rolls a character's old memories into one summary memory per period.
+MEMORY_COMPACTION_JOB = 'compact_memories'
+# Background job type that collapses near-duplicate memories of one character (or of every character).
+MEMORY_DEDUPE_JOB = 'dedupe_memories'
+
+# --- LISTING PROJECTIONS ---
+# Lightweight projections used by list views; full documents are fetched per character/lore entry on demand.
+CHARACTER_SUMMARY_FIELDS = ['name', 'character_type', 'race', 'class', 'img', 'pc_faction_standings']
+LORE_SUMMARY_FIELDS = ['lore_id', 'name', 'lore_type', 'tags']
+LISTING_FIELD_PATTERN = re.compile(r'^[A-Za-z_][\w]*(\.[A-Za-z_][\w]*)*$')
 
 # --- UTILITY FUNCTIONS ---
 
 def parse_json(data: Any) -> Any:
-    # Safely parse MongoDB BSON documents using json_util to handle ObjectIds and datetimes properly
-    return json.loads(json_util.dumps(data))
+    # Convert MongoDB BSON documents into plain JSON-compatible Python objects in a single encoding pass
+    return to_json_compatible(data)
 
 def slugify(text: Any) -> str:
     # Convert arbitrary text strings into clean URL-friendly or filesystem-friendly slug strings
@@ -78,53 +123,70 @@ def parse_discord_transcript(raw_text: str) -> str:
         formatted_lines.append(f"{user}: {clean_message}")
     return "\n".join(formatted_lines)
 
+def read_history_file(file_path: str) -> str:
+    # Read one history file from disk, converting Discord (Scriptly) transcripts to plain "user: message" lines
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    if "[Scriptly]" in content:
+        content = parse_discord_transcript(content)
+    return content
+
+# Parsed history files and combined per-character history strings, invalidated by the data watcher.
+history_cache = HistoryCache(read_history_file)
+register_sync_listener(history_cache.invalidate_changes)
+register_sync_listener(lore_cache.invalidate_changes)
+
 def load_history_content_for_npc(npc_doc: Dict[str, Any]) -> Dict[str, Any]:
-    # Load associated text history documents linked to a specific NPC from the history storage folder safely
+    # Attach the NPC's history file contents and combined history string, served from the history cache
     npc_doc.setdefault('pc_faction_standings', {})
     npc_doc.setdefault('linked_lore_by_name', []) 
-    history_contents_loaded: Dict[str, str] = {}
-    combined_content_parts: List[str] = []
     abs_history_data_dir = os.path.abspath(HISTORY_DATA_DIR)
-
-    if 'associated_history_files' in npc_doc and npc_doc['associated_history_files']:
-        for history_filename in npc_doc['associated_history_files']:
-            if not history_filename or not isinstance(history_filename, str):
-                continue
-            safe_history_filename = secure_filename(history_filename)
-            file_path = os.path.join(abs_history_data_dir, safe_history_filename)
-            # Use safe context manager for file reading to avoid handle leaks
-            if os.path.exists(file_path) and os.path.isfile(file_path):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        if "[Scriptly]" in content:
-                            content = parse_discord_transcript(content)
-                        history_contents_loaded[history_filename] = content
-                        combined_content_parts.append(f"--- From History File: {history_filename} ---\n{content}\n")
-                except Exception as e:
-                    history_contents_loaded[history_filename] = "[Error loading content]"
-            else:
-                history_contents_loaded[history_filename] = "[File not found]"
-    
+    history_filenames = [
+        history_filename for history_filename in (npc_doc.get('associated_history_files') or [])
+        if history_filename and isinstance(history_filename, str)
+    ]
+    history_contents_loaded, combined_history_content = history_cache.load(
+        history_filenames,
+        lambda history_filename: os.path.join(abs_history_data_dir, secure_filename(history_filename))
+    )
     npc_doc['history_contents_loaded'] = history_contents_loaded
-    npc_doc['combined_history_content'] = "\n".join(combined_content_parts).strip() if combined_content_parts else "No history content."
+    npc_doc['combined_history_content'] = combined_history_content
     return npc_doc
 
+def build_character_etag(npc_doc: Dict[str, Any]) -> str:
+    # Derive a strong ETag for a character detail response from its document version and the stats of its history files
+    abs_history_data_dir = os.path.abspath(HISTORY_DATA_DIR)
+    history_signatures: List[str] = []
+    for history_filename in npc_doc.get('associated_history_files') or []:
+        if not history_filename or not isinstance(history_filename, str):
+            continue
+        try:
+            stat_result = os.stat(os.path.join(abs_history_data_dir, secure_filename(history_filename)))
+            history_signatures.append(f"{history_filename}:{stat_result.st_size}:{stat_result.st_mtime_ns}")
+        except OSError:
+            history_signatures.append(f"{history_filename}:missing")
+    return make_strong_etag(npc_doc['_id'], npc_doc.get(DOC_VERSION_FIELD, 0), *history_signatures)
+
+def format_lore_summary_line(lore_entry_doc: Dict[str, Any]) -> str:
+    # Render the one-line prompt summary of a lore entry; shared by the sync and async dialogue paths
+    return f"Regarding '{lore_entry_doc.get('name')}': {lore_entry_doc.get('description', '')[:150]}..."
+
+def summarize_linked_lore(linked_lore_names: List[str], lore_by_name: Dict[str, Dict[str, Any]]) -> str:
+    # Join the summaries of already-fetched lore entries in the order the character links them
+    if not linked_lore_names:
+        return "No specific linked lore."
+    return "\n".join(format_lore_summary_line(lore_by_name[lore_name]) for lore_name in linked_lore_names if lore_name in lore_by_name)
+
 def get_linked_lore_summary_for_npc(npc_doc: Dict[str, Any]) -> str:
-    # Query MongoDB collection to compile summaries of lore entries explicitly linked by name to an NPC
+    # Summarize the lore entries linked by name to an NPC; cached names cost nothing, the rest share one `$in` query
     if mongo_db is None or 'linked_lore_by_name' not in npc_doc or not npc_doc['linked_lore_by_name']:
         return "No specific linked lore."
-    lore_summaries: List[str] = []
-    lore_collection = mongo_db.lore_entries
-    for lore_name in npc_doc['linked_lore_by_name']:
-        try:
-            lore_entry_doc = lore_collection.find_one({"name": lore_name})
-            if lore_entry_doc:
-                summary = f"Regarding '{lore_entry_doc.get('name')}': {lore_entry_doc.get('description', '')[:150]}..."
-                lore_summaries.append(summary)
-        except Exception:
-            continue
-    return "\n".join(lore_summaries)
+    linked_lore_names = npc_doc['linked_lore_by_name']
+    try:
+        lore_by_name = lore_cache.get_many(linked_lore_names, lambda lore_names: fetch_lore_by_name(mongo_db, lore_names))
+    except PyMongoError:
+        return ""
+    return summarize_linked_lore(linked_lore_names, lore_by_name)
 
 def parse_ai_suggestions(full_ai_output: str, speaking_pc_id: Optional[str]) -> Dict[str, Any]:
     # Parse unstructured multi-line LLM output text blocks into structured dictionaries containing dialogue and game metadata
@@ -137,21 +199,15 @@ def parse_ai_suggestions(full_ai_output: str, speaking_pc_id: Optional[str]) ->
     new_standing_str = "No change"
     justification_str = "Not specified"
     
-    suggestion_pc_key_for_parsing = speaking_pc_id if speaking_pc_id and speaking_pc_id.strip() != "" else "PLAYER"
+    suggestion_pc_key_for_parsing = suggestion_pc_key(speaking_pc_id)
     
     lines = full_ai_output.splitlines()
-    suggestion_keywords = [
-        "NPC_ACTION:", 
-        "PLAYER_CHECK:", 
-        "GENERATED_TOPICS:", 
-        f"STANDING_CHANGE_SUGGESTION_FOR_{suggestion_pc_key_for_parsing}:", 
-        "JUSTIFICATION:"
-    ]
+    suggestion_keywords_for_pc = suggestion_keywords(suggestion_pc_key_for_parsing)
     
     first_suggestion_line_index = -1
     for i, line in enumerate(lines):
         stripped_line = line.strip()
-        if any(stripped_line.startswith(kw) for kw in suggestion_keywords):
+        if any(stripped_line.startswith(kw) for kw in suggestion_keywords_for_pc):
             first_suggestion_line_index = i
             break
     
@@ -162,25 +218,22 @@ def parse_ai_suggestions(full_ai_output: str, speaking_pc_id: Optional[str]) ->
         dialogue_parts = lines
         suggestion_lines = []
 
+    # The line grammar lives in dialogue_stream.py so the streaming endpoint parses suggestions identically
     for line in suggestion_lines:
-        stripped_line = line.strip()
-        if stripped_line.startswith("NPC_ACTION:"):
-            actions_str = stripped_line.replace("NPC_ACTION:", "").strip()
-            if actions_str.lower() != 'none':
-                npc_actions_list = [action.strip() for action in actions_str.split(';') if action.strip()]
-        elif stripped_line.startswith("PLAYER_CHECK:"):
-            checks_str = stripped_line.replace("PLAYER_CHECK:", "").strip()
-            if checks_str.lower() != 'none':
-                player_checks_list = [check.strip() for check in checks_str.split(';') if check.strip()]
-        elif stripped_line.startswith("GENERATED_TOPICS:"):
-            topics_str = stripped_line.replace("GENERATED_TOPICS:", "").strip()
-            if topics_str.lower() != 'none':
-                generated_topics_list = [topic.strip() for topic in topics_str.split(';') if topic.strip()]
-        elif stripped_line.startswith(f"STANDING_CHANGE_SUGGESTION_FOR_{suggestion_pc_key_for_parsing}:"):
-            raw_standing_val = stripped_line.replace(f"STANDING_CHANGE_SUGGESTION_FOR_{suggestion_pc_key_for_parsing}:", "").strip()
-            new_standing_str = raw_standing_val.replace('[', '').replace(']', '').replace('"', '').replace("'", "").strip()
-        elif stripped_line.startswith("JUSTIFICATION:"):
-            justification_str = stripped_line.replace("JUSTIFICATION:", "").strip()
+        parsed_line = parse_suggestion_line(line.strip(), suggestion_pc_key_for_parsing)
+        if parsed_line is None:
+            continue
+        field_name, field_value = parsed_line
+        if field_name == "npc_action":
+            npc_actions_list = field_value
+        elif field_name == "player_check":
+            player_checks_list = field_value
+        elif field_name == "generated_topics":
+            generated_topics_list = field_value
+        elif field_name == "new_standing":
+            new_standing_str = field_value
+        elif field_name == "justification":
+            justification_str = field_value
             
     npc_dialogue_final = "\n".join(dialogue_parts).strip()
     
@@ -203,15 +256,351 @@ def parse_ai_suggestions(full_ai_output: str, speaking_pc_id: Optional[str]) ->
         "justification": justification_str
     }
 
-def create_standard_response(success: bool, data: Optional[Any] = None, error: Optional[str] = None) -> Dict[str, Any]:
+def prepare_dialogue_request(npc_data_with_history: Dict[str, Any], dialogue_req_payload: Dict[str, Any]) -> Tuple[NPCProfile, DialogueRequest]:
+    # Validate the NPC and the dialogue payload, then prepend the live session transcript to the request's history
+    npc_profile = NPCProfile(**npc_data_with_history)
+    dialogue_req_data = DialogueRequest(**dialogue_req_payload)
+
+    # Inject live session history into context
+    recent_context = live_chat_buffer.recent(15)
+    if dialogue_req_data.recent_dialogue_history:
+        dialogue_req_data.recent_dialogue_history = recent_context + dialogue_req_data.recent_dialogue_history
+    else:
+        dialogue_req_data.recent_dialogue_history = recent_context
+    return npc_profile, dialogue_req_data
+
+def should_summarize_interaction(dialogue_req_data: DialogueRequest, parsed_suggestions: Dict[str, Any]) -> bool:
+    # A memory summary is only generated when the player actually said something and the NPC answered
+    return bool(dialogue_req_data.player_utterance and parsed_suggestions["dialogue"])
+
+def build_dialogue_response(npc_id_str: str, dialogue_req_data: DialogueRequest, parsed_suggestions: Dict[str, Any], memory_suggestions: List[Any], memory_job_id: Optional[str] = None) -> DialogueResponse:
+    # Assemble the API response model from the parsed AI output; shared by the sync and async dialogue paths
+    return DialogueResponse(
+        npc_id=npc_id_str, 
+        npc_dialogue=parsed_suggestions["dialogue"],
+        new_memory_suggestions=memory_suggestions, 
+        generated_topics=parsed_suggestions["generated_topics"],
+        suggested_npc_actions=parsed_suggestions["npc_action"],
+        suggested_player_checks=parsed_suggestions["player_check"],
+        suggested_standing_pc_id=dialogue_req_data.speaking_pc_id if parsed_suggestions["new_standing"] else None,
+        suggested_new_standing=parsed_suggestions["new_standing"],
+        standing_change_justification=parsed_suggestions["justification"],
+        memory_job_id=memory_job_id
+    )
+
+def schedule_memory_summary(npc_id_str: str, player_utterance: str, npc_dialogue: str) -> Tuple[Optional[str], List[str]]:
+    # Queue the memory summary as a background job so the reply returns at once; returns (job id, inline suggestions).
+    # If the queue cannot be written the summary is produced inline, as it was before the queue existed.
+    try:
+        job_id = enqueue_job(MEMORY_SUMMARY_JOB, {
+            "npc_id": npc_id_str,
+            "player_utterance": player_utterance,
+            "npc_dialogue": npc_dialogue
+        })
+        return job_id, []
+    except PyMongoError as e:
+        print(f"[Jobs] Could not queue memory summary, summarizing inline: {e}")
+        return None, [ai_service_instance.summarize_interaction_for_memory(player_utterance, npc_dialogue)]
+
+def finalize_dialogue_turn(npc_id_str: str, dialogue_req_data: DialogueRequest, full_ai_output: str) -> DialogueResponse:
+    # Parse the complete model reply, queue its memory summary and build the response; shared by every dialogue endpoint
+    parsed_suggestions = parse_ai_suggestions(full_ai_output, dialogue_req_data.speaking_pc_id)
+    
+    memory_job_id: Optional[str] = None
+    memory_suggestions: List[Any] = []
+    if should_summarize_interaction(dialogue_req_data, parsed_suggestions):
+        memory_job_id, memory_suggestions = schedule_memory_summary(
+            npc_id_str,
+            dialogue_req_data.player_utterance, 
+            parsed_suggestions["dialogue"]
+        )
+        
+    return build_dialogue_response(npc_id_str, dialogue_req_data, parsed_suggestions, memory_suggestions, memory_job_id)
+
+def resolve_canned_turn(npc_id_str: str, npc_profile: NPCProfile, dialogue_req_data: DialogueRequest) -> Tuple[Optional[DialogueResponse], Dict[str, str]]:
+    # Match the utterance against the NPC's canned topics locally: returns (instant canned response, None when the model
+    # is needed) and the undecided topics to offer the model. System directives and bypass_canned skip the matcher.
+    utterance = (dialogue_req_data.player_utterance or "").strip()
+    canned_conversations = npc_profile.canned_conversations or {}
+    if (not app_config.CANNED_MATCH_ENABLED or dialogue_req_data.bypass_canned or not canned_conversations
+            or not utterance or utterance.startswith("(System Directive:")):
+        return None, {}
+    canned_match, candidate_topics = canned_matcher_cache.get(canned_conversations).resolve(utterance, addressee=npc_profile.name)
+    if canned_match is None:
+        return None, candidate_topics
+    print(f"[Canned] {npc_profile.name}: '{canned_match.topic}' ({canned_match.method}, score {canned_match.score})")
+    return DialogueResponse(
+        npc_id=npc_id_str,
+        npc_dialogue=canned_match.response,
+        canned_topic=canned_match.topic
+    ), {}
+
+def retrieve_turn_knowledge(npc_profile: NPCProfile, dialogue_req_data: DialogueRequest) -> List[str]:
+    # Pick the lore and own-knowledge passages most relevant to the utterance and scene, formatted as prompt lines
+    if not app_config.RETRIEVAL_ENABLED:
+        return []
+    knowledge_index.ensure_built(mongo_db)
+    query_text = dialogue_req_data.player_utterance or ""
+    if query_text.strip().startswith("(System Directive:"):
+        query_text = ""
+    # The last line of the conversation often names what the utterance refers to ("him", "that place").
+    context_text = " ".join([dialogue_req_data.scene_context or "", *dialogue_req_data.recent_dialogue_history[-1:]])
+    passages = knowledge_index.query(query_text or context_text, context_text if query_text else "", owner=npc_profile.name)
+    return [
+        f"(Something you know) {passage.text}" if passage.source_kind == "knowledge" else f"{passage.source_name}: {passage.text}"
+        for passage in passages
+    ]
+
+def refresh_knowledge_index(changes: Dict[str, set]):
+    # Sync listener: re-index the lore entries and character knowledge a data sync touched
+    knowledge_index.refresh_changes(mongo_db, changes)
+
+register_sync_listener(refresh_knowledge_index)
+
+def use_structured_output(dialogue_req_data: DialogueRequest) -> bool:
+    # The request's structured_output flag wins; otherwise DIALOGUE_OUTPUT_MODE decides
+    if dialogue_req_data.structured_output is not None:
+        return dialogue_req_data.structured_output
+    return app_config.DIALOGUE_OUTPUT_MODE == 'structured'
+
+def finalize_structured_dialogue_turn(npc_id_str: str, dialogue_req_data: DialogueRequest, structured: StructuredDialogueOutput) -> DialogueResponse:
+    # Build the response from a validated structured reply; its memory summary arrives with it, so no job is queued
+    parsed_suggestions = {
+        "dialogue": structured.dialogue.strip() or "(No dialogue response)",
+        "npc_action": structured.npc_actions,
+        "player_check": structured.player_checks,
+        "generated_topics": structured.generated_topics,
+        "new_standing": structured.suggested_new_standing,
+        "justification": structured.standing_change_justification or None
+    }
+    memory_suggestions: List[Any] = []
+    if should_summarize_interaction(dialogue_req_data, parsed_suggestions) and structured.memory_summary.strip():
+        memory_suggestions.append(structured.memory_summary.strip())
+    return build_dialogue_response(npc_id_str, dialogue_req_data, parsed_suggestions, memory_suggestions)
+
+def recall_turn_memories(npc_id_str: str, dialogue_req_data: DialogueRequest) -> List[MemoryItem]:
+    # The memories this turn's prompt lists: the most relevant to the utterance (recency-weighted), or the newest without numpy
+    npc_id_obj = ObjectId(npc_id_str)
+    if memory_recall.available:
+        memories = memory_recall.recall(mongo_db, npc_id_obj, dialogue_req_data.player_utterance or "",
+                                        dialogue_req_data.scene_context, top_k=PROMPT_RECENT_MEMORIES)
+    else:
+        memories = recent_memories(mongo_db, npc_id_obj, PROMPT_RECENT_MEMORIES)
+    return [MemoryItem(**memory) for memory in memories]
+
+def run_dialogue_turn(npc_id_str: str, npc_profile: NPCProfile, dialogue_req_data: DialogueRequest, lore_summary: str, detailed_history: str) -> DialogueResponse:
+    # Generate and parse one NPC's reply; the unit of work shared by the single-NPC and scene endpoints
+    canned_response, candidate_topics = resolve_canned_turn(npc_id_str, npc_profile, dialogue_req_data)
+    if canned_response is not None:
+        return canned_response
+    npc_profile.memories = recall_turn_memories(npc_id_str, dialogue_req_data)
+    retrieved_knowledge = retrieve_turn_knowledge(npc_profile, dialogue_req_data)
+
+    if use_structured_output(dialogue_req_data):
+        structured = ai_service_instance.generate_structured_npc_dialogue(
+            npc=npc_profile,
+            dialogue_request=dialogue_req_data,
+            world_lore_summary=lore_summary,
+            detailed_character_history=detailed_history,
+            canned_conversations=candidate_topics,
+            retrieved_knowledge=retrieved_knowledge
+        )
+        return finalize_structured_dialogue_turn(npc_id_str, dialogue_req_data, structured)
+
+    full_ai_output = ai_service_instance.generate_npc_dialogue(
+        npc=npc_profile,
+        dialogue_request=dialogue_req_data,
+        world_lore_summary=lore_summary, 
+        detailed_character_history=detailed_history,
+        canned_conversations=candidate_topics,
+        retrieved_knowledge=retrieved_knowledge
+    )
+    return finalize_dialogue_turn(npc_id_str, dialogue_req_data, full_ai_output)
+
+def summarize_memory_job(payload: Dict[str, Any], job_id: str) -> Dict[str, Any]:
+    # Job handler: summarize a dialogue exchange and attach it to the NPC as a pending memory awaiting GM review
+    memory_text = ai_service_instance.summarize_interaction_for_memory(
+        payload["player_utterance"],
+        payload["npc_dialogue"],
+        raise_on_error=True
+    )
+    pending_memory = {
+        "job_id": job_id,
+        "content": memory_text,
+        "player_utterance": payload["player_utterance"],
+        "created_at": datetime.utcnow()
+    }
+    # The job_id guard keeps a retried job from attaching the same memory twice; $slice drops the oldest
+    # suggestions beyond PENDING_MEMORIES_MAX. The UI dismisses each one once the GM adds or rejects it.
+    mongo_db.npcs.update_one(
+        {"_id": ObjectId(payload["npc_id"]), "pending_memories.job_id": {"$ne": job_id}},
+        {"$push": {"pending_memories": {"$each": [pending_memory], "$slice": -app_config.PENDING_MEMORIES_MAX}}, **version_bump()}
+    )
+    return {"npc_id": payload["npc_id"], "memory": memory_text}
+
+register_job_handler(MEMORY_SUMMARY_JOB, summarize_memory_job)
+
+def compact_memories_job(payload: Dict[str, Any], job_id: str) -> Dict[str, Any]:
+    # Job handler: roll the character's old memories into one model-written summary per period
+    npc_id_obj = ObjectId(payload["npc_id"])
+    npc_doc = mongo_db.npcs.find_one({"_id": npc_id_obj}, {"name": 1})
+    if not npc_doc:
+        return {"npc_id": payload["npc_id"], "periods": 0, "compacted": 0}
+    result = compact_memories(
+        mongo_db, npc_id_obj,
+        lambda memory_texts: ai_service_instance.summarize_memories_for_compaction(npc_doc.get("name", "The character"), memory_texts)
+    )
+    if result["compacted"]:
+        mongo_db.npcs.update_one({"_id": npc_id_obj}, version_bump())
+        memory_recall.invalidate(npc_id_obj)
+    return {"npc_id": payload["npc_id"], **result}
+
+register_job_handler(MEMORY_COMPACTION_JOB, compact_memories_job)
+
+def dedupe_memories_job(payload: Dict[str, Any], job_id: str) -> Dict[str, Any]:
+    # Job handler: collapse near-duplicate memories of one character, or of every character when npc_id is None
+    if payload.get("npc_id"):
+        npc_id_objs = [ObjectId(payload["npc_id"])]
+    else:
+        npc_id_objs = [npc_doc["_id"] for npc_doc in mongo_db.npcs.find({}, {"_id": 1})]
+    totals = {"characters": 0, "examined": 0, "removed": 0}
+    for npc_id_obj in npc_id_objs:
+        result = dedupe_memories(mongo_db, npc_id_obj)
+        totals["characters"] += 1
+        totals["examined"] += result["examined"]
+        totals["removed"] += result["removed"]
+        if result["removed"]:
+            mongo_db.npcs.update_one({"_id": npc_id_obj}, version_bump())
+            memory_recall.invalidate(npc_id_obj)
+    return totals
+
+register_job_handler(MEMORY_DEDUPE_JOB, dedupe_memories_job)
+
+# Drop cached persona prefixes (and their provider-side caches) when a synced character, history file or lore entry changes.
+register_sync_listener(ai_service_instance.persona_cache.invalidate_changes)
+
+def scene_npc_payload(scene_req: SceneDialogueRequest, npc_id_str: str) -> Dict[str, Any]:
+    # Derive one NPC's DialogueRequest payload from a scene request, swapping in that NPC's own transcript if supplied
+    npc_payload = scene_req.model_dump(exclude={'npc_ids', 'recent_dialogue_history_by_npc'})
+    if npc_id_str in scene_req.recent_dialogue_history_by_npc:
+        npc_payload['recent_dialogue_history'] = list(scene_req.recent_dialogue_history_by_npc[npc_id_str])
+    return npc_payload
+
+def build_scene_npc_contexts(npc_docs: List[Dict[str, Any]], lore_by_name: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    # Attach history content and the linked-lore summary to each loaded scene NPC, keyed by NPC id string
+    contexts: Dict[str, Dict[str, Any]] = {}
+    for npc_doc in npc_docs:
+        npc_data_with_history = load_history_content_for_npc(npc_doc)
+        contexts[str(npc_doc['_id'])] = {
+            "npc_data": npc_data_with_history,
+            "lore_summary": summarize_linked_lore(npc_data_with_history.get('linked_lore_by_name') or [], lore_by_name),
+            "detailed_history": npc_data_with_history.get('combined_history_content', '')
+        }
+    return contexts
+
+def load_scene_npc_contexts(npc_id_objs: List[ObjectId]) -> Dict[str, Dict[str, Any]]:
+    # Load every scene NPC with one `$in` query and all of their uncached linked lore with a second
+    npc_docs = list(mongo_db.npcs.find({"_id": {"$in": npc_id_objs}}))
+    linked_lore_names = sorted({lore_name for npc_doc in npc_docs for lore_name in (npc_doc.get('linked_lore_by_name') or [])})
+    lore_by_name = lore_cache.get_many(linked_lore_names, lambda lore_names: fetch_lore_by_name(mongo_db, lore_names))
+    return build_scene_npc_contexts(npc_docs, lore_by_name)
+
+def plan_scene_turns(scene_req: SceneDialogueRequest, npc_id_strs: List[str], contexts: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, Tuple[NPCProfile, DialogueRequest, Dict[str, Any]]], Dict[str, str]]:
+    # Validate every scene NPC up front; NPCs that cannot take part become failed results rather than failing the scene
+    turns: Dict[str, Tuple[NPCProfile, DialogueRequest, Dict[str, Any]]] = {}
+    failures: Dict[str, str] = {}
+    for npc_id_str in npc_id_strs:
+        context = contexts.get(npc_id_str)
+        if context is None:
+            failures[npc_id_str] = "NPC not found"
+            continue
+        try:
+            npc_profile, dialogue_req_data = prepare_dialogue_request(context["npc_data"], scene_npc_payload(scene_req, npc_id_str))
+            turns[npc_id_str] = (npc_profile, dialogue_req_data, context)
+        except ValidationError as e:
+            failures[npc_id_str] = str(e)
+    return turns, failures
+
+def scene_result_envelope(npc_id_str: str, response_model: Optional[DialogueResponse], error: Optional[str]) -> Dict[str, Any]:
+    # One NPC's entry in a scene response: a standard envelope tagged with the NPC id
+    return create_standard_response(
+        success=error is None,
+        data=response_model.model_dump(mode='json') if response_model is not None else None,
+        error=error,
+        meta={"npc_id": npc_id_str}
+    )
+
+def scene_complete_envelope(npc_count: int, failed_count: int, started_at: float) -> Dict[str, Any]:
+    # Final NDJSON line of a streamed scene, marking that every NPC has reported
+    return create_standard_response(success=True, meta={
+        "scene_complete": True,
+        "npc_count": npc_count,
+        "failed": failed_count,
+        "elapsed_ms": int((time.monotonic() - started_at) * 1000)
+    })
+
+def create_standard_response(success: bool, data: Optional[Any] = None, error: Optional[str] = None, meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     # Enforce standard structured response payloads for all API endpoints to guarantee consistent frontend consumption
     response_payload: Dict[str, Any] = {
         "success": success,
         "data": data,
         "error": error
     }
+    # Paginated endpoints describe the page (cursor, limit) alongside the data without changing its shape
+    if meta is not None:
+        response_payload["meta"] = meta
     return response_payload
 
+def parse_listing_args(summary_fields: List[str]) -> Dict[str, Any]:
+    # Translate the view/fields/limit/cursor query parameters of a listing endpoint into a Mongo projection and keyset filter
+    fields_arg = request.args.get('fields', '').strip()
+    view = request.args.get('view', 'full').strip().lower()
+    if view not in ('full', 'summary'):
+        raise ValueError("view must be 'full' or 'summary'")
+
+    projection: Optional[Dict[str, int]] = None
+    if fields_arg:
+        requested_fields = [field.strip() for field in fields_arg.split(',') if field.strip()]
+        invalid_fields = [field for field in requested_fields if not LISTING_FIELD_PATTERN.match(field)]
+        if invalid_fields:
+            raise ValueError(f"Invalid field name(s): {', '.join(invalid_fields)}")
+        projection = {field: 1 for field in requested_fields}
+    elif view == 'summary':
+        projection = {field: 1 for field in summary_fields}
+    if projection is not None:
+        # _id is always returned; it identifies the document and is the pagination key
+        projection['_id'] = 1
+
+    limit: Optional[int] = None
+    if request.args.get('limit'):
+        limit = int(request.args['limit'])
+        if limit < 1 or limit > app_config.LISTING_MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {app_config.LISTING_MAX_PAGE_SIZE}")
+
+    keyset_filter: Dict[str, Any] = {}
+    cursor_arg = request.args.get('cursor')
+    if cursor_arg:
+        try:
+            keyset_filter = {"_id": {"$gt": ObjectId(cursor_arg)}}
+        except Exception:
+            raise ValueError("Invalid cursor")
+        # A cursor implies pagination even if the client omitted the page size
+        limit = limit or app_config.LISTING_MAX_PAGE_SIZE
+
+    return {"projection": projection, "limit": limit, "filter": keyset_filter}
+
+def run_listing_query(collection, listing: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    # Execute a listing query in _id order, returning the documents and pagination meta (None when unpaginated)
+    cursor = collection.find(listing["filter"], listing["projection"]).sort("_id", 1)
+    if listing["limit"] is None:
+        return list(cursor), None
+    # Fetch one extra document to learn whether another page exists without a count query
+    documents = list(cursor.limit(listing["limit"] + 1))
+    has_more = len(documents) > listing["limit"]
+    documents = documents[:listing["limit"]]
+    next_cursor = str(documents[-1]['_id']) if has_more and documents else None
+    return documents, {"limit": listing["limit"], "next_cursor": next_cursor}
+
 # --- APP ROUTES ---
 
 @app.route('/')
@@ -239,23 +628,64 @@ def handle_live_chat_ingest() -> Any:
             break
     
     formatted_message = f"{character_name}: {content}"
-    
-    live_session_history.append(formatted_message)
-    
-    if len(live_session_history) > 50:
-        live_session_history.pop(0)
+    seq = live_chat_buffer.append(formatted_message)
         
-    return jsonify(create_standard_response(success=True, data={"status": "success", "mapped_to": character_name})), 200
+    return jsonify(create_standard_response(success=True, data={"status": "success", "mapped_to": character_name, "seq": seq})), 200
+
+def parse_live_chat_position(since_raw: Optional[str]) -> Optional[int]:
+    # The client's position in the live chat feed (?since= or Last-Event-ID); raises ValueError when malformed
+    if since_raw is None or since_raw == '':
+        return None
+    since = int(since_raw)
+    if since < 0:
+        raise ValueError("since must not be negative")
+    return since
+
+def live_chat_payload(update: LiveChatUpdate) -> Dict[str, Any]:
+    # Envelope of a live chat fetch: the new lines as data, the feed position in meta
+    return create_standard_response(success=True, data=update.lines, meta={"latest_seq": update.latest_seq, "reset": update.reset})
 
 @app.route('/api/live_chat', methods=['GET'])
 def get_live_chat() -> Any:
-    # Retrieve the active queue of live session chat lines stored in memory
-    return jsonify(create_standard_response(success=True, data=live_session_history)), 200
+    # Retrieve live session chat lines: all of them, or with ?since=<seq> only newer ones; &wait=<s> long-polls for the next line
+    try:
+        since = parse_live_chat_position(request.args.get('since'))
+        wait_seconds = min(float(request.args.get('wait') or 0), app_config.LIVE_CHAT_MAX_WAIT_SECONDS)
+    except ValueError:
+        return jsonify(create_standard_response(success=False, error="since must be a sequence number and wait a number of seconds")), 400
+    if since is not None and wait_seconds > 0:
+        update = live_chat_buffer.wait_since(since, wait_seconds)
+    else:
+        update = live_chat_buffer.since(since)
+    return jsonify(live_chat_payload(update)), 200
+
+@app.route('/api/live_chat/stream', methods=['GET'])
+def stream_live_chat() -> Any:
+    # Push live session chat lines over Server-Sent Events as they arrive; resumes from ?since= or Last-Event-ID
+    try:
+        since = parse_live_chat_position(request.headers.get('Last-Event-ID') or request.args.get('since'))
+    except ValueError:
+        return jsonify(create_standard_response(success=False, error="since must be a sequence number")), 400
+
+    def event_stream():
+        # The first event carries everything the client is missing (the whole buffer for a new client)
+        update = live_chat_buffer.since(since)
+        yield format_sse_event("lines", live_chat_payload(update), event_id=update.latest_seq)
+        position = update.latest_seq
+        while True:
+            update = live_chat_buffer.wait_since(position, app_config.LIVE_CHAT_HEARTBEAT_SECONDS)
+            if update.latest_seq == position:
+                yield b": keep-alive\n\n"
+                continue
+            yield format_sse_event("lines", live_chat_payload(update), event_id=update.latest_seq)
+            position = update.latest_seq
+
+    return Response(event_stream(), mimetype='text/event-stream', headers=SSE_HEADERS)
 
 @app.route('/api/live_chat', methods=['DELETE'])
 def clear_live_chat() -> Any:
     # Clear out the active live session history buffer completely
-    live_session_history.clear()
+    live_chat_buffer.clear()
     return jsonify(create_standard_response(success=True, data={"status": "cleared"})), 200
 
 # --- CHARACTER (NPC/PC) ENDPOINTS ---
@@ -281,15 +711,20 @@ def create_npc_api() -> Any:
         character_profile_data = NPCProfile(**data)
         characters_collection = mongo_db.npcs
         character_dict = character_profile_data.model_dump(mode='json', by_alias=True, exclude_none=True)
+        character_dict[DOC_VERSION_FIELD] = 1
+        initial_memories = character_dict.pop('memories', None)
         
         result = characters_collection.insert_one(character_dict)
+        if initial_memories:
+            import_memories(mongo_db, result.inserted_id, initial_memories)
         created_character_from_db = characters_collection.find_one({"_id": result.inserted_id})
         
         if created_character_from_db:
             created_character_from_db = load_history_content_for_npc(created_character_from_db)
+            created_character_from_db.update(memory_list_view(result.inserted_id))
             return jsonify(create_standard_response(success=True, data={
                 "message": f"{created_character_from_db.get('character_type', 'Character')} created",
-                "character": parse_json(created_character_from_db)
+                "character": created_character_from_db
             })), 201
         else:
             return jsonify(create_standard_response(success=False, error="Failed to retrieve created character from DB")), 500
@@ -301,20 +736,45 @@ def create_npc_api() -> Any:
 
 @app.route('/api/npcs', methods=['GET'])
 def get_all_npcs_api() -> Any:
-    # Retrieve a full list of all characters currently stored inside the database
+    # Retrieve characters stored inside the database; supports ?view=summary, ?fields=a,b and keyset pagination via ?limit=&cursor=
     if mongo_db is None: 
         return jsonify(create_standard_response(success=False, error="Database not available")), 503
     try:
-        characters_cursor = mongo_db.npcs.find({})
+        listing = parse_listing_args(CHARACTER_SUMMARY_FIELDS)
+    except ValueError as e:
+        return jsonify(create_standard_response(success=False, error=str(e))), 400
+    try:
+        # One query serves both the body and the ETag, so the tag always describes the documents returned;
+        # a projection gets the version field added (and stripped again) when the caller did not ask for it
+        version_requested = listing["projection"] is None or DOC_VERSION_FIELD in listing["projection"]
+        if not version_requested:
+            listing = dict(listing, projection=dict(listing["projection"], **{DOC_VERSION_FIELD: 1}))
+        characters_docs, page_meta = run_listing_query(mongo_db.npcs, listing)
+
+        # The listing ETag covers the query and the (id, version) of every matching document
+        etag = make_strong_etag(
+            request.query_string.decode('utf-8'),
+            *(f"{doc['_id']}:{doc.get(DOC_VERSION_FIELD, 0)}" for doc in characters_docs)
+        )
+        cached_response = not_modified_response(etag)
+        if cached_response is not None:
+            return cached_response
+
         characters_list: List[Dict[str, Any]] = []
-        for char_doc in characters_cursor:
+        for char_doc in characters_docs:
             char_doc['_id'] = str(char_doc['_id'])
-            char_doc.setdefault('associated_history_files', [])
-            char_doc.setdefault('linked_lore_by_name', []) 
-            char_doc.setdefault('combined_history_content', '')
-            char_doc.setdefault('pc_faction_standings', {})
+            if not version_requested:
+                char_doc.pop(DOC_VERSION_FIELD, None)
+            # Projected documents only carry the requested fields; defaults are for full documents
+            if listing["projection"] is None:
+                char_doc.setdefault('associated_history_files', [])
+                char_doc.setdefault('linked_lore_by_name', []) 
+                char_doc.setdefault('combined_history_content', '')
+                char_doc.setdefault('pc_faction_standings', {})
             characters_list.append(char_doc)
-        return jsonify(create_standard_response(success=True, data=characters_list)), 200
+        response = jsonify(create_standard_response(success=True, data=characters_list, meta=page_meta))
+        response.set_etag(etag)
+        return response, 200
     except Exception as e:
         return jsonify(create_standard_response(success=False, error=f"Could not retrieve characters: {str(e)}")), 500
 
@@ -327,13 +787,25 @@ def get_npc_api(npc_id_str: str) -> Any:
         npc_id_obj = ObjectId(npc_id_str)
     except Exception:
         return jsonify(create_standard_response(success=False, error="Invalid Character ID format")), 400
+
+    # Resolve the ETag from the version and history file stats alone, before loading the full document
+    version_doc = mongo_db.npcs.find_one({"_id": npc_id_obj}, {DOC_VERSION_FIELD: 1, "associated_history_files": 1})
+    if not version_doc:
+        return jsonify(create_standard_response(success=False, error="Character not found")), 404
+    etag = build_character_etag(version_doc)
+    cached_response = not_modified_response(etag)
+    if cached_response is not None:
+        return cached_response
         
     npc_data = mongo_db.npcs.find_one({"_id": npc_id_obj})
     if not npc_data:
         return jsonify(create_standard_response(success=False, error="Character not found")), 404
         
     npc_data_with_history = load_history_content_for_npc(npc_data)
-    return jsonify(create_standard_response(success=True, data=parse_json(npc_data_with_history))), 200
+    npc_data_with_history.update(memory_list_view(npc_id_obj))
+    response = jsonify(create_standard_response(success=True, data=npc_data_with_history))
+    response.set_etag(etag)
+    return response, 200
 
 @app.route('/api/npcs/<npc_id_str>', methods=['PUT'])
 def update_npc_api(npc_id_str: str) -> Any:
@@ -372,29 +844,35 @@ def update_npc_api(npc_id_str: str) -> Any:
                     }
                 else:
                     final_set_payload[key] = attr_value
+        # Memories are stored in their own collection and changed only through the memory endpoints
+        final_set_payload.pop('memories', None)
         
-        mongo_db.npcs.update_one({"_id": npc_id_obj}, {"$set": final_set_payload})
+        mongo_db.npcs.update_one({"_id": npc_id_obj}, {"$set": final_set_payload, **version_bump()})
         
         char_name = final_set_payload.get('name', existing_npc_data.get('name'))
+        if 'knowledge' in final_set_payload or 'name' in final_set_payload:
+            knowledge_index.update_character_knowledge(char_name, final_set_payload.get('knowledge', existing_npc_data.get('knowledge')),
+                                                       previous_name=existing_npc_data.get('name'))
         if char_name:
             updated_doc_full = mongo_db.npcs.find_one({"_id": npc_id_obj})
             if updated_doc_full:
-                file_data = parse_json(updated_doc_full)
-                file_data.pop('_id', None)
+                file_data = dict(updated_doc_full)
+                # Pending memory suggestions are review state, not part of the character sheet.
+                file_data.pop('pending_memories', None)
                 safe_filename = secure_filename(f"{char_name}.json")
                 target_path = os.path.join(PRIMARY_DATA_DIR, safe_filename)
                 try:
-                    # Safely open file using context manager
-                    with open(target_path, 'w', encoding='utf-8') as f:
-                        json.dump(file_data, f, indent=4)
+                    # Recorded in the sync manifest, so the data watcher does not re-sync the server's own write
+                    write_mirrored_file(target_path, "character", file_data)
                 except Exception as e_file:
                     print(f"Error saving updated character file: {e_file}")
         
         updated_npc_data_from_db = mongo_db.npcs.find_one({"_id": npc_id_obj})
         updated_npc_data_from_db = load_history_content_for_npc(updated_npc_data_from_db)
+        updated_npc_data_from_db.update(memory_list_view(npc_id_obj))
         return jsonify(create_standard_response(success=True, data={
             "message": "Character updated and saved", 
-            "character": parse_json(updated_npc_data_from_db)
+            "character": updated_npc_data_from_db
         })), 200
 
     except ValidationError as e:
@@ -412,9 +890,12 @@ def delete_npc_api(npc_id_str: str) -> Any:
     except Exception: 
         return jsonify(create_standard_response(success=False, error="Invalid Character ID format")), 400
     
-    result = mongo_db.npcs.delete_one({"_id": npc_id_obj})
-    if result.deleted_count == 0:
+    deleted_npc = mongo_db.npcs.find_one_and_delete({"_id": npc_id_obj}, projection={"name": 1})
+    if deleted_npc is None:
         return jsonify(create_standard_response(success=False, error="Character not found")), 404
+    knowledge_index.remove_character(deleted_npc.get('name'))
+    delete_npc_memories(mongo_db, [npc_id_obj])
+    memory_recall.invalidate(npc_id_obj)
     
     return jsonify(create_standard_response(success=True, data={"message": "Character deleted successfully"})), 200
 
@@ -453,13 +934,13 @@ def associate_history_file_with_npc_api(npc_id_str: str) -> Any:
     try:
         mongo_db.npcs.update_one(
             {"_id": npc_id_obj},
-            {"$addToSet": {"associated_history_files": history_filename}}
+            {"$addToSet": {"associated_history_files": history_filename}, **version_bump()}
         )
         npc_doc = mongo_db.npcs.find_one({"_id": npc_id_obj})
         npc_doc_with_history = load_history_content_for_npc(npc_doc)
         return jsonify(create_standard_response(success=True, data={
             "message": f"History file '{history_filename}' associated.",
-            "character": parse_json(npc_doc_with_history)
+            "character": npc_doc_with_history
         })), 200
     except Exception as e:
         return jsonify(create_standard_response(success=False, error=f"Could not associate history: {str(e)}")), 500
@@ -482,42 +963,84 @@ def dissociate_history_file_from_npc_api(npc_id_str: str) -> Any:
     try:
         mongo_db.npcs.update_one(
             {"_id": npc_id_obj},
-            {"$pull": {"associated_history_files": history_filename}}
+            {"$pull": {"associated_history_files": history_filename}, **version_bump()}
         )
         npc_doc = mongo_db.npcs.find_one({"_id": npc_id_obj})
         npc_doc_with_history = load_history_content_for_npc(npc_doc)
         return jsonify(create_standard_response(success=True, data={
             "message": f"History file '{history_filename}' dissociated.",
-            "character": parse_json(npc_doc_with_history)
+            "character": npc_doc_with_history
         })), 200
     except Exception as e:
         return jsonify(create_standard_response(success=False, error=str(e))), 500
 
 # --- MEMORY ENDPOINTS ---
 
+def memory_list_view(npc_id_obj: ObjectId) -> Dict[str, Any]:
+    # The newest page of a character's memories in chronological order (as the UI lists them), plus the total count
+    return {
+        "memories": recent_memories(mongo_db, npc_id_obj, app_config.MEMORY_PAGE_SIZE),
+        "memory_count": count_memories(mongo_db, npc_id_obj)
+    }
+
+def schedule_memory_compaction(npc_id_str: str) -> Optional[str]:
+    # Queue a compaction job once a character has too many memories, unless one is already queued or running
+    try:
+        if not needs_compaction(mongo_db, ObjectId(npc_id_str)):
+            return None
+        if mongo_db[JOBS_COLLECTION].find_one({
+            "type": MEMORY_COMPACTION_JOB,
+            "payload.npc_id": npc_id_str,
+            "status": {"$in": [JOB_STATUS_QUEUED, JOB_STATUS_RUNNING]}
+        }, {"_id": 1}):
+            return None
+        return enqueue_job(MEMORY_COMPACTION_JOB, {"npc_id": npc_id_str})
+    except PyMongoError as e:
+        print(f"[Jobs] Could not queue memory compaction for {npc_id_str}: {e}")
+        return None
+
+MEMORY_OUTCOME_MESSAGES = {
+    "added": "Memory added",
+    "reinforced": "Memory reinforced (near-duplicate of an existing memory)",
+    "merged": "Memory merged into a near-duplicate"
+}
+
 @app.route('/api/npcs/<npc_id_str>/memory', methods=['POST'])
 def add_npc_memory_api(npc_id_str: str) -> Any:
-    # Add a new memory item or historical bullet point to an NPC's memory list
+    # Add a new memory item or historical bullet point to an NPC's memory list; ?on_duplicate= overrides MEMORY_DEDUP_ACTION
     if mongo_db is None: 
         return jsonify(create_standard_response(success=False, error="Database not available")), 503
     try: 
         npc_id_obj = ObjectId(npc_id_str)
     except Exception: 
         return jsonify(create_standard_response(success=False, error="Invalid ID")), 400
+    duplicate_action = request.args.get('on_duplicate') or app_config.MEMORY_DEDUP_ACTION
+    if duplicate_action not in DUPLICATE_ACTIONS:
+        return jsonify(create_standard_response(success=False, error=f"on_duplicate must be one of: {', '.join(DUPLICATE_ACTIONS)}")), 400
     
     try:
         payload = request.get_json()
         if not payload:
             return jsonify(create_standard_response(success=False, error="Invalid JSON payload")), 400
         memory_data = MemoryItem(**payload)
-        mongo_db.npcs.update_one(
-            {"_id": npc_id_obj}, 
-            {"$push": {"memories": memory_data.model_dump(mode='json')}}
-        )
-        updated_npc = mongo_db.npcs.find_one({"_id": npc_id_obj})
+        # Bumping the character's version keeps its detail ETag honest even though the memory lives elsewhere
+        if mongo_db.npcs.update_one({"_id": npc_id_obj}, version_bump()).matched_count == 0:
+            return jsonify(create_standard_response(success=False, error="Character not found")), 404
+        result = add_memory_deduplicated(mongo_db, npc_id_obj, memory_data, duplicate_action)
+        if result["outcome"] == "rejected":
+            return jsonify(create_standard_response(success=False, error="Near-duplicate of an existing memory", data={
+                "duplicate_of": result["memory"],
+                "similarity": round(result["similarity"], 3)
+            })), 409
+        memory_recall.note_added(npc_id_obj, result["memory"])
+        memory_list = memory_list_view(npc_id_obj)
         return jsonify(create_standard_response(success=True, data={
-            "message": "Memory added", 
-            "updated_memories": parse_json(updated_npc.get("memories", []))
+            "message": MEMORY_OUTCOME_MESSAGES[result["outcome"]], 
+            "outcome": result["outcome"],
+            "memory": result["memory"],
+            "updated_memories": memory_list["memories"],
+            "memory_count": memory_list["memory_count"],
+            "compaction_job_id": schedule_memory_compaction(npc_id_str) if result["outcome"] == "added" else None
         })), 200
     except ValidationError as e: 
         return jsonify(create_standard_response(success=False, error=str(e))), 400
@@ -534,110 +1057,329 @@ def delete_npc_memory_api(npc_id_str: str, memory_id_str_path: str) -> Any:
     except Exception: 
         return jsonify(create_standard_response(success=False, error="Invalid NPC ID")), 400
     
-    result = mongo_db.npcs.update_one(
-        {"_id": npc_id_obj}, 
-        {"$pull": {"memories": {"memory_id": memory_id_str_path}}}
-    )
-    if result.modified_count == 0:
+    if not delete_memory(mongo_db, npc_id_obj, memory_id_str_path):
         return jsonify(create_standard_response(success=False, error="Memory not found")), 404
+    memory_recall.note_deleted(npc_id_obj, memory_id_str_path)
+    mongo_db.npcs.update_one({"_id": npc_id_obj}, version_bump())
         
-    updated_npc = mongo_db.npcs.find_one({"_id": npc_id_obj})
+    memory_list = memory_list_view(npc_id_obj)
     return jsonify(create_standard_response(success=True, data={
         "message": "Memory deleted", 
-        "updated_memories": parse_json(updated_npc.get("memories", []))
+        "updated_memories": memory_list["memories"],
+        "memory_count": memory_list["memory_count"]
     })), 200
 
-# --- DIALOGUE GENERATION ---
+@app.route('/api/npcs/<npc_id_str>/memories', methods=['GET'])
+def list_npc_memories_api(npc_id_str: str) -> Any:
+    # Page through a character's memories newest first; pass meta.next_cursor back as ?cursor= for older ones
+    if mongo_db is None: 
+        return jsonify(create_standard_response(success=False, error="Database not available")), 503
+    try: 
+        npc_id_obj = ObjectId(npc_id_str)
+    except Exception: 
+        return jsonify(create_standard_response(success=False, error="Invalid NPC ID")), 400
+    try:
+        limit = min(int(request.args.get('limit', app_config.MEMORY_PAGE_SIZE)), app_config.LISTING_MAX_PAGE_SIZE)
+        if limit <= 0:
+            raise ValueError
+    except ValueError:
+        return jsonify(create_standard_response(success=False, error="limit must be a positive integer")), 400
 
-@app.route('/api/npcs/<npc_id_str>/dialogue', methods=['POST'])
-def generate_dialogue_for_npc_api(npc_id_str: str) -> Any:
-    # Trigger AI dialogue generation and behavior suggestions for an NPC given a player input utterance
+    try:
+        memories, page_meta = list_memories(mongo_db, npc_id_obj, limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify(create_standard_response(success=False, error=str(e))), 400
+    return jsonify(create_standard_response(success=True, data=memories, meta=page_meta)), 200
+
+@app.route('/api/npcs/<npc_id_str>/memories/dedupe', methods=['POST'])
+def dedupe_npc_memories_api(npc_id_str: str) -> Any:
+    # Queue a bulk pass that collapses the character's existing near-duplicate memories
+    if mongo_db is None: 
+        return jsonify(create_standard_response(success=False, error="Database not available")), 503
+    try: 
+        ObjectId(npc_id_str)
+    except Exception: 
+        return jsonify(create_standard_response(success=False, error="Invalid NPC ID")), 400
+    try:
+        job_id = enqueue_job(MEMORY_DEDUPE_JOB, {"npc_id": npc_id_str})
+    except PyMongoError as e:
+        return jsonify(create_standard_response(success=False, error=str(e))), 503
+    return jsonify(create_standard_response(success=True, data={"job_id": job_id})), 202
+
+@app.route('/api/admin/memories/dedupe', methods=['POST'])
+def dedupe_all_memories_api() -> Any:
+    # Queue the near-duplicate pass over every character's memories
+    if mongo_db is None: 
+        return jsonify(create_standard_response(success=False, error="Database not available")), 503
+    try:
+        job_id = enqueue_job(MEMORY_DEDUPE_JOB, {"npc_id": None})
+    except PyMongoError as e:
+        return jsonify(create_standard_response(success=False, error=str(e))), 503
+    return jsonify(create_standard_response(success=True, data={"job_id": job_id})), 202
+
+@app.route('/api/npcs/<npc_id_str>/memories/compact', methods=['POST'])
+def compact_npc_memories_api(npc_id_str: str) -> Any:
+    # Queue a compaction of the character's old memories now, regardless of the memory count threshold
+    if mongo_db is None: 
+        return jsonify(create_standard_response(success=False, error="Database not available")), 503
+    try: 
+        ObjectId(npc_id_str)
+    except Exception: 
+        return jsonify(create_standard_response(success=False, error="Invalid NPC ID")), 400
+    try:
+        job_id = enqueue_job(MEMORY_COMPACTION_JOB, {"npc_id": npc_id_str})
+    except PyMongoError as e:
+        return jsonify(create_standard_response(success=False, error=str(e))), 503
+    return jsonify(create_standard_response(success=True, data={"job_id": job_id})), 202
+
+@app.route('/api/npcs/<npc_id_str>/pending_memories/<job_id_str>', methods=['DELETE'])
+def dismiss_pending_memory_api(npc_id_str: str, job_id_str: str) -> Any:
+    # Remove a background-generated memory suggestion from an NPC once the GM has accepted or rejected it
+    if mongo_db is None: 
+        return jsonify(create_standard_response(success=False, error="Database not available")), 503
+    try: 
+        npc_id_obj = ObjectId(npc_id_str)
+    except Exception: 
+        return jsonify(create_standard_response(success=False, error="Invalid NPC ID")), 400
+
+    # Matching on the entry itself keeps an unknown job_id from bumping the version of an unchanged document.
+    result = mongo_db.npcs.update_one(
+        {"_id": npc_id_obj, "pending_memories.job_id": job_id_str},
+        {"$pull": {"pending_memories": {"job_id": job_id_str}}, **version_bump()}
+    )
+    if result.matched_count == 0:
+        return jsonify(create_standard_response(success=False, error="Pending memory not found")), 404
+    updated_npc = mongo_db.npcs.find_one({"_id": npc_id_obj}, {"pending_memories": 1})
+    return jsonify(create_standard_response(success=True, data={
+        "message": "Pending memory dismissed",
+        "pending_memories": updated_npc.get("pending_memories", [])
+    })), 200
+
+# --- BACKGROUND JOBS ---
+
+def job_status_view(job_doc: Dict[str, Any]) -> Dict[str, Any]:
+    # Public view of a job document (the payload holds the raw exchange and stays server-side)
+    return {
+        "job_id": str(job_doc["_id"]),
+        "type": job_doc.get("type"),
+        "status": job_doc.get("status"),
+        "attempts": job_doc.get("attempts", 0),
+        "max_attempts": job_doc.get("max_attempts"),
+        "result": job_doc.get("result"),
+        "last_error": job_doc.get("last_error"),
+        "run_after": job_doc.get("run_after"),
+        "created_at": job_doc.get("created_at"),
+        "finished_at": job_doc.get("finished_at")
+    }
+
+@app.route('/api/jobs/<job_id_str>', methods=['GET'])
+def get_job_api(job_id_str: str) -> Any:
+    # Poll a background job (e.g. a dialogue's memory_job_id) for its status and, once succeeded, its result
+    if mongo_db is None: 
+        return jsonify(create_standard_response(success=False, error="Database not available")), 503
+    job_doc = get_job(job_id_str, mongo_db)
+    if not job_doc:
+        return jsonify(create_standard_response(success=False, error="Job not found")), 404
+    return jsonify(create_standard_response(success=True, data=job_status_view(job_doc))), 200
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs_api() -> Any:
+    # List recent jobs, optionally filtered by ?status= (use status=dead to inspect the dead-letter queue)
+    if mongo_db is None: 
+        return jsonify(create_standard_response(success=False, error="Database not available")), 503
+    query: Dict[str, Any] = {}
+    if request.args.get('status'):
+        query["status"] = request.args.get('status')
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), app_config.LISTING_MAX_PAGE_SIZE))
+    except ValueError:
+        return jsonify(create_standard_response(success=False, error="'limit' must be an integer")), 400
+    job_docs = mongo_db[JOBS_COLLECTION].find(query).sort("_id", -1).limit(limit)
+    return jsonify(create_standard_response(success=True, data=[job_status_view(job_doc) for job_doc in job_docs])), 200
+
+@app.route('/api/jobs/<job_id_str>/retry', methods=['POST'])
+def retry_job_api(job_id_str: str) -> Any:
+    # Requeue a dead-lettered job with a fresh attempt budget
     if mongo_db is None: 
         return jsonify(create_standard_response(success=False, error="Database not available")), 503
+    if not retry_job(job_id_str, mongo_db):
+        return jsonify(create_standard_response(success=False, error=f"No {JOB_STATUS_DEAD} job with this ID")), 404
+    return jsonify(create_standard_response(success=True, data=job_status_view(get_job(job_id_str, mongo_db)))), 200
+
+# --- DIALOGUE GENERATION ---
+
+def load_npc_dialogue_turn(npc_id_str: str) -> Tuple[Optional[Dict[str, Any]], Optional[Tuple[Any, int]]]:
+    # Validate a single-NPC dialogue request and gather its context; returns (turn inputs, None) or (None, error response)
+    if mongo_db is None: 
+        return None, (jsonify(create_standard_response(success=False, error="Database not available")), 503)
     if ai_service_instance is None or ai_service_instance.client is None:
-        return jsonify(create_standard_response(success=False, error="AI Service not available")), 503
+        return None, (jsonify(create_standard_response(success=False, error="AI Service not available")), 503)
         
     try: 
         npc_id_obj = ObjectId(npc_id_str)
     except Exception: 
-        return jsonify(create_standard_response(success=False, error="Invalid NPC ID")), 400
+        return None, (jsonify(create_standard_response(success=False, error="Invalid NPC ID")), 400)
     
     npc_data_from_db = mongo_db.npcs.find_one({"_id": npc_id_obj})
     if not npc_data_from_db: 
-        return jsonify(create_standard_response(success=False, error="NPC not found")), 404
+        return None, (jsonify(create_standard_response(success=False, error="NPC not found")), 404)
     
     npc_data_with_history = load_history_content_for_npc(npc_data_from_db)
     
     try:
-        npc_profile = NPCProfile(**parse_json(npc_data_with_history)) 
         dialogue_req_payload = request.get_json()
         if not dialogue_req_payload:
-            return jsonify(create_standard_response(success=False, error="Invalid JSON payload")), 400
-        dialogue_req_data = DialogueRequest(**dialogue_req_payload)
+            return None, (jsonify(create_standard_response(success=False, error="Invalid JSON payload")), 400)
+        npc_profile, dialogue_req_data = prepare_dialogue_request(npc_data_with_history, dialogue_req_payload)
     except ValidationError as e:
-        return jsonify(create_standard_response(success=False, error=str(e))), 400
-        
-    # Inject live session history into context
-    recent_context = list(live_session_history[-15:]) 
-    if dialogue_req_data.recent_dialogue_history:
-        dialogue_req_data.recent_dialogue_history = recent_context + dialogue_req_data.recent_dialogue_history
-    else:
-        dialogue_req_data.recent_dialogue_history = recent_context
+        return None, (jsonify(create_standard_response(success=False, error=str(e))), 400)
+
+    return {
+        "npc_profile": npc_profile,
+        "dialogue_req_data": dialogue_req_data,
+        "lore_summary": get_linked_lore_summary_for_npc(npc_data_with_history),
+        "detailed_history": npc_data_with_history.get('combined_history_content', '')
+    }, None
 
-    detailed_history = npc_data_with_history.get('combined_history_content', '')
-    lore_summary = get_linked_lore_summary_for_npc(npc_data_with_history)
+@app.route('/api/npcs/<npc_id_str>/dialogue', methods=['POST'])
+def generate_dialogue_for_npc_api(npc_id_str: str) -> Any:
+    # Trigger AI dialogue generation and behavior suggestions for an NPC given a player input utterance
+    turn, error_response = load_npc_dialogue_turn(npc_id_str)
+    if error_response is not None:
+        return error_response
     
     try:
-        full_ai_output = ai_service_instance.generate_npc_dialogue(
-            npc=npc_profile,
-            dialogue_request=dialogue_req_data,
-            world_lore_summary=lore_summary, 
-            detailed_character_history=detailed_history
-        )
-        
-        parsed_suggestions = parse_ai_suggestions(full_ai_output, dialogue_req_data.speaking_pc_id)
-        
-        memory_suggestions: List[Any] = []
-        if dialogue_req_data.player_utterance and parsed_suggestions["dialogue"]:
-            memory_suggestions.append(
-                ai_service_instance.summarize_interaction_for_memory(
-                    dialogue_req_data.player_utterance, 
-                    parsed_suggestions["dialogue"]
-                )
-            )
-            
-        response_model = DialogueResponse(
-            npc_id=npc_id_str, 
-            npc_dialogue=parsed_suggestions["dialogue"],
-            new_memory_suggestions=memory_suggestions, 
-            generated_topics=parsed_suggestions["generated_topics"],
-            suggested_npc_actions=parsed_suggestions["npc_action"],
-            suggested_player_checks=parsed_suggestions["player_check"],
-            suggested_standing_pc_id=dialogue_req_data.speaking_pc_id if parsed_suggestions["new_standing"] else None,
-            suggested_new_standing=parsed_suggestions["new_standing"],
-            standing_change_justification=parsed_suggestions["justification"]
-        )
+        response_model = run_dialogue_turn(npc_id_str, turn["npc_profile"], turn["dialogue_req_data"], turn["lore_summary"], turn["detailed_history"])
         return jsonify(create_standard_response(success=True, data=response_model.model_dump(mode='json'))), 200
         
     except Exception as e:
         traceback.print_exc()
         return jsonify(create_standard_response(success=False, error=f"AI Generation Failed: {str(e)}")), 500
 
+@app.route('/api/npcs/<npc_id_str>/dialogue/stream', methods=['POST'])
+def stream_dialogue_for_npc_api(npc_id_str: str) -> Any:
+    # Stream an NPC's reply over Server-Sent Events: dialogue tokens first, then structured suggestions, then the full parsed response
+    turn, error_response = load_npc_dialogue_turn(npc_id_str)
+    if error_response is not None:
+        return error_response
+    npc_profile = turn["npc_profile"]
+    dialogue_req_data = turn["dialogue_req_data"]
+
+    def event_stream():
+        parser = IncrementalSuggestionParser(dialogue_req_data.speaking_pc_id)
+        try:
+            canned_response, candidate_topics = resolve_canned_turn(npc_id_str, npc_profile, dialogue_req_data)
+            if canned_response is not None:
+                # A matched canned line needs no model call: send it as a single token, then the final response.
+                yield format_parser_event("token", canned_response.npc_dialogue)
+                yield format_sse_event("done", create_standard_response(success=True, data=canned_response.model_dump(mode='json')))
+                return
+
+            npc_profile.memories = recall_turn_memories(npc_id_str, dialogue_req_data)
+            text_chunks = ai_service_instance.stream_npc_dialogue(
+                npc=npc_profile,
+                dialogue_request=dialogue_req_data,
+                world_lore_summary=turn["lore_summary"],
+                detailed_character_history=turn["detailed_history"],
+                canned_conversations=candidate_topics,
+                retrieved_knowledge=retrieve_turn_knowledge(npc_profile, dialogue_req_data)
+            )
+            for text_chunk in text_chunks:
+                for event_name, event_data in parser.feed(text_chunk):
+                    yield format_parser_event(event_name, event_data)
+            for event_name, event_data in parser.finish():
+                yield format_parser_event(event_name, event_data)
+
+            # The complete reply is parsed once more by the regular parser so `done` matches the non-streaming endpoint.
+            response_model = finalize_dialogue_turn(npc_id_str, dialogue_req_data, parser.full_text)
+            yield format_sse_event("done", create_standard_response(success=True, data=response_model.model_dump(mode='json')))
+        except Exception as e:
+            traceback.print_exc()
+            yield format_sse_event("error", create_standard_response(success=False, error=f"AI Generation Failed: {str(e)}"))
+
+    return Response(event_stream(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@app.route('/api/scene/dialogue', methods=['POST'])
+def generate_scene_dialogue_api() -> Any:
+    # Generate replies from several NPCs to one utterance concurrently, streaming each NPC's result as NDJSON as soon as it finishes
+    if mongo_db is None: 
+        return jsonify(create_standard_response(success=False, error="Database not available")), 503
+    if ai_service_instance is None or ai_service_instance.client is None:
+        return jsonify(create_standard_response(success=False, error="AI Service not available")), 503
+
+    scene_req_payload = request.get_json(silent=True)
+    if not scene_req_payload:
+        return jsonify(create_standard_response(success=False, error="Invalid JSON payload")), 400
+    try:
+        scene_req = SceneDialogueRequest(**scene_req_payload)
+        npc_id_strs = list(dict.fromkeys(scene_req.npc_ids))
+        npc_id_objs = [ObjectId(npc_id_str) for npc_id_str in npc_id_strs]
+    except ValidationError as e:
+        return jsonify(create_standard_response(success=False, error=str(e))), 400
+    except Exception:
+        return jsonify(create_standard_response(success=False, error="Invalid NPC ID")), 400
+
+    contexts = load_scene_npc_contexts(npc_id_objs)
+    turns, failures = plan_scene_turns(scene_req, npc_id_strs, contexts)
+
+    def scene_results():
+        # Yields (npc_id, DialogueResponse or None, error) in completion order, at most SCENE_DIALOGUE_MAX_CONCURRENCY at a time
+        for npc_id_str, error in failures.items():
+            yield npc_id_str, None, error
+        if not turns:
+            return
+        executor = ThreadPoolExecutor(max_workers=min(app_config.SCENE_DIALOGUE_MAX_CONCURRENCY, len(turns)))
+        try:
+            futures = {
+                executor.submit(run_dialogue_turn, npc_id_str, npc_profile, dialogue_req_data,
+                                context["lore_summary"], context["detailed_history"]): npc_id_str
+                for npc_id_str, (npc_profile, dialogue_req_data, context) in turns.items()
+            }
+            for future in as_completed(futures):
+                npc_id_str = futures[future]
+                try:
+                    yield npc_id_str, future.result(), None
+                except Exception as e:
+                    traceback.print_exc()
+                    yield npc_id_str, None, f"AI Generation Failed: {str(e)}"
+        finally:
+            # If the client stops reading, queued NPCs are dropped instead of generated for nobody.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    # ?stream=false collects every result into one standard response, in the order the NPCs were requested.
+    if request.args.get('stream', 'true').lower() in ('0', 'false', 'no'):
+        results = {npc_id_str: scene_result_envelope(npc_id_str, response_model, error) for npc_id_str, response_model, error in scene_results()}
+        return jsonify(create_standard_response(success=True, data=[results[npc_id_str] for npc_id_str in npc_id_strs])), 200
+
+    def stream_scene():
+        started_at = time.monotonic()
+        failed_count = 0
+        for npc_id_str, response_model, error in scene_results():
+            failed_count += error is not None
+            yield dumps_bytes(scene_result_envelope(npc_id_str, response_model, error)) + b"\n"
+        yield dumps_bytes(scene_complete_envelope(len(npc_id_strs), failed_count, started_at)) + b"\n"
+
+    return Response(stream_scene(), mimetype='application/x-ndjson')
+
 # --- LORE ENTRY ENDPOINTS ---
 
 @app.route('/api/lore_entries', methods=['GET']) 
 def get_all_lore_entries_api() -> Any:
-    # Retrieve all campaign lore entries stored in the database collection
+    # Retrieve campaign lore entries stored in the database; supports ?view=summary, ?fields=a,b and keyset pagination via ?limit=&cursor=
     if mongo_db is None: 
         return jsonify(create_standard_response(success=False, error="Database not available")), 503
     try:
-        lore_cursor = mongo_db.lore_entries.find({})
+        listing = parse_listing_args(LORE_SUMMARY_FIELDS)
+    except ValueError as e:
+        return jsonify(create_standard_response(success=False, error=str(e))), 400
+    try:
+        lore_docs, page_meta = run_listing_query(mongo_db.lore_entries, listing)
         lore_list: List[Dict[str, Any]] = []
-        for entry in lore_cursor:
+        for entry in lore_docs:
             entry['lore_id'] = str(entry.get('lore_id', entry['_id']))
             entry.pop('_id', None)
             lore_list.append(entry)
-        return jsonify(create_standard_response(success=True, data=lore_list)), 200
+        return jsonify(create_standard_response(success=True, data=lore_list, meta=page_meta)), 200
     except Exception as e:
         return jsonify(create_standard_response(success=False, error=str(e))), 500
 
@@ -657,9 +1399,12 @@ def create_lore_entry_api() -> Any:
         mongo_db.lore_entries.update_one({"_id": result.inserted_id}, {"$set": {"lore_id": str(result.inserted_id)}})
         
         created_lore = mongo_db.lore_entries.find_one({"_id": result.inserted_id})
+        # The name may have been cached as having no entry.
+        lore_cache.invalidate([lore_entry_data.name])
+        knowledge_index.update_lore(created_lore)
         return jsonify(create_standard_response(success=True, data={
             "message": "Lore entry created", 
-            "lore_entry": parse_json(created_lore)
+            "lore_entry": created_lore
         })), 201
     except Exception as e:
         return jsonify(create_standard_response(success=False, error=str(e))), 500
@@ -673,9 +1418,14 @@ def update_lore_entry_api(lore_id_str: str) -> Any:
         data = request.get_json()
         if not data:
             return jsonify(create_standard_response(success=False, error="Invalid JSON payload")), 400
+        previous_lore = mongo_db.lore_entries.find_one({"lore_id": lore_id_str}, {"name": 1})
         mongo_db.lore_entries.update_one({"lore_id": lore_id_str}, {"$set": data})
         updated_lore = mongo_db.lore_entries.find_one({"lore_id": lore_id_str})
-        return jsonify(create_standard_response(success=True, data=parse_json(updated_lore))), 200
+        # Drop both the old and the new name, in case the entry was renamed.
+        lore_cache.invalidate([(previous_lore or {}).get('name'), (updated_lore or {}).get('name')])
+        if updated_lore:
+            knowledge_index.update_lore(updated_lore, previous_name=(previous_lore or {}).get('name'))
+        return jsonify(create_standard_response(success=True, data=updated_lore)), 200
     except Exception as e:
         return jsonify(create_standard_response(success=False, error=str(e))), 500
 
@@ -684,9 +1434,11 @@ def delete_lore_entry_api(lore_id_str: str) -> Any:
     # Delete a lore entry from the database collection completely
     if mongo_db is None: 
         return jsonify(create_standard_response(success=False, error="Database not available")), 503
-    result = mongo_db.lore_entries.delete_one({"lore_id": lore_id_str})
-    if result.deleted_count == 0:
+    deleted_lore = mongo_db.lore_entries.find_one_and_delete({"lore_id": lore_id_str}, projection={"name": 1})
+    if deleted_lore is None:
         return jsonify(create_standard_response(success=False, error="Lore entry not found")), 404
+    lore_cache.invalidate([deleted_lore.get('name')])
+    knowledge_index.remove_lore(deleted_lore.get('name'))
     return jsonify(create_standard_response(success=True, data={"message": "Lore entry deleted"})), 200
 
 # --- LORE LINKING ---
@@ -705,16 +1457,95 @@ def link_lore_to_character_api(char_id_str: str) -> Any:
         
         mongo_db.npcs.update_one(
             {"_id": char_id_obj},
-            {"$addToSet": {"linked_lore_by_name": lore_name}}
+            {"$addToSet": {"linked_lore_by_name": lore_name}, **version_bump()}
         )
         return jsonify(create_standard_response(success=True, data={"message": "Lore linked"})), 200
     except Exception as e:
         return jsonify(create_standard_response(success=False, error=str(e))), 500
 
+# --- ADMIN ENDPOINTS ---
+
+@app.route('/api/admin/prompt_cache', methods=['GET'])
+def get_prompt_cache_stats_api() -> Any:
+    # Report persona prefix cache activity: hits, misses, prefixes the backend refused and invalidations
+    persona_cache = ai_service_instance.persona_cache
+    return jsonify(create_standard_response(success=True, data={
+        "backend": type(persona_cache.backend).__name__ if persona_cache.backend is not None else None,
+        "provider_side": persona_cache.provider_side,
+        **persona_cache.snapshot()
+    })), 200
+
+@app.route('/api/admin/lore_cache', methods=['GET'])
+def get_lore_cache_stats_api() -> Any:
+    # Report linked-lore cache hits, misses and the number of `$in` queries issued
+    return jsonify(create_standard_response(success=True, data=lore_cache.snapshot())), 200
+
+@app.route('/api/admin/prompt_budget', methods=['GET'])
+def get_prompt_budget_stats_api() -> Any:
+    # Report the prompt token budget, section caps and how well the token estimator matches the model's counts
+    return jsonify(create_standard_response(success=True, data={
+        "budget": app_config.PROMPT_TOKEN_BUDGET,
+        "section_caps": section_caps(),
+        "estimator": ai_service_instance.token_estimator.snapshot()
+    })), 200
+
+@app.route('/api/admin/retrieval', methods=['GET'])
+def get_retrieval_stats_api() -> Any:
+    # Report the knowledge index size, build time and the latency of the most recent retrieval
+    return jsonify(create_standard_response(success=True, data=knowledge_index.snapshot())), 200
+
+@app.route('/api/admin/memory_recall', methods=['GET'])
+def get_memory_recall_stats_api() -> Any:
+    # Report the loaded memory recall indexes, build time and the latency of the most recent recall
+    return jsonify(create_standard_response(success=True, data=memory_recall.snapshot())), 200
+
+@app.route('/api/admin/history_cache', methods=['GET'])
+def get_history_cache_stats_api() -> Any:
+    # Report history file cache activity and its memory footprint
+    return jsonify(create_standard_response(success=True, data=history_cache.snapshot())), 200
+
+@app.route('/api/admin/response_cache', methods=['GET'])
+def get_response_cache_stats_api() -> Any:
+    # Report model response cache hits (in-process and MongoDB tiers), misses and stores
+    return jsonify(create_standard_response(success=True, data=ai_service_instance.response_cache.snapshot())), 200
+
+@app.route('/api/admin/response_cache', methods=['DELETE'])
+def clear_response_cache_api() -> Any:
+    # Drop every cached model reply, e.g. after a prompt or model change the cache key does not capture
+    try:
+        removed_count = ai_service_instance.response_cache.clear()
+    except PyMongoError as e:
+        return jsonify(create_standard_response(success=False, error=f"Database error: {e}")), 500
+    return jsonify(create_standard_response(success=True, data={"removed": removed_count})), 200
+
+@app.route('/api/admin/indexes', methods=['GET'])
+def get_index_report_api() -> Any:
+    # Report the declared indexes, the indexes that actually exist and the query plan of every hot query
+    if mongo_db is None: 
+        return jsonify(create_standard_response(success=False, error="Database not available")), 503
+    try:
+        existing_indexes = {
+            collection_name: sorted(mongo_db[collection_name].index_information().keys())
+            for collection_name in REQUIRED_INDEXES
+        }
+        declared_indexes = {
+            collection_name: [index_model.document['name'] for index_model in index_models]
+            for collection_name, index_models in REQUIRED_INDEXES.items()
+        }
+        query_plans = verify_query_plans(mongo_db)
+        return jsonify(create_standard_response(success=True, data={
+            "healthy": not any(entry["collection_scan"] or entry["error"] for entry in query_plans),
+            "declared_indexes": declared_indexes,
+            "existing_indexes": existing_indexes,
+            "query_plans": query_plans
+        })), 200
+    except Exception as e:
+        return jsonify(create_standard_response(success=False, error=str(e))), 500
+
 # --- MAIN EXECUTION ---
 
-if __name__ == '__main__':
-    # Ensure application directory structure and data paths exist prior to booting
+def run_startup_tasks(start_background: bool = True):
+    # Ensure data directories, indexes and the file sync are in place before serving; shared by app.py and asgi_app.py
     for dir_path in [PRIMARY_DATA_DIR, VTT_IMPORT_DIR, PC_IMPORT_DIR, HISTORY_DATA_DIR, LORE_DATA_DIR]:
         if not os.path.exists(dir_path):
             os.makedirs(dir_path, exist_ok=True)
@@ -726,11 +1557,31 @@ if __name__ == '__main__':
 
     # Sync local JSON and text files into the MongoDB database store on startup
     if mongo_db is not None:
+        print("[System] Ensuring MongoDB indexes...")
+        ensure_indexes(mongo_db)
+        print("[System] Moving embedded NPC memories to their own collection...")
+        migrate_embedded_memories(mongo_db)
+        backfill_lsh_bands(mongo_db)
         print("[System] Synchronizing characters and lore from local files...")
         sync_data_from_files()
+        if app_config.RETRIEVAL_ENABLED:
+            print("[System] Building the lore and knowledge retrieval index...")
+            knowledge_index.ensure_built(mongo_db)
+        print("[System] Verifying query plans of hot queries...")
+        print_query_plan_report(verify_query_plans(mongo_db))
     else:
         print("CRITICAL: MongoDB connection failed.")
 
+    # Keep watching the data folders so edits and re-exports are synced without a restart,
+    # and run queued background work (memory summaries, memory compaction), including jobs left over from before a restart.
+    if mongo_db is not None and start_background:
+        start_data_watcher()
+        start_job_workers()
+
+if __name__ == '__main__':
+    # In debug mode only the reloader's serving child runs the watcher and job workers.
+    run_startup_tasks(start_background=not app_config.DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true')
+
     print("-" * 50)
     print(f"Flask environment: {app_config.__class__.__name__}")
     print(f"Running on http://0.0.0.0:5001")
@@ -0,0 +1,544 @@
+# server/asgi_app.py
+"""
+ASGI Serving Module.
+Async serving mode for deployments with several concurrent GMs: `uvicorn asgi_app:app --port 5001`.
+The dialogue (plain, streamed and scene) and memory routes run as native coroutines on the async GenAI client and the asyncio
+MongoDB driver, so a slow model round trip no longer pins a worker thread, and an in-flight model
+call is cancelled as soon as the HTTP client disconnects. The live chat long-poll and SSE feed wait on
+the event loop, so idle subscribers hold no thread either. Every other endpoint is served unchanged
+by the Flask application mounted underneath.
+"""
+import asyncio
+import contextlib
+import time
+import traceback
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pydantic import ValidationError
+from pymongo.errors import PyMongoError
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+from config import config as app_config
+from database import get_async_db, close_async_db
+from models import MemoryItem, NPCProfile, DialogueRequest, DialogueResponse, SceneDialogueRequest
+from ai_service import ai_service_instance
+from serialization import dumps_bytes
+from http_cache import version_bump
+from lore_cache import lore_cache, LORE_SUMMARY_PROJECTION
+from retrieval import knowledge_index
+from memory_recall import memory_recall
+from live_chat import live_chat_buffer
+from memory_store import DUPLICATE_ACTIONS, MEMORIES_COLLECTION, PROMPT_RECENT_MEMORIES, aadd_memory_deduplicated, adelete_memory, alist_memories, arecent_memories
+from dialogue_stream import IncrementalSuggestionParser, format_sse_event, format_parser_event, SSE_HEADERS
+from app import (
+    app as flask_app,
+    create_standard_response,
+    load_history_content_for_npc,
+    summarize_linked_lore,
+    build_scene_npc_contexts,
+    plan_scene_turns,
+    scene_result_envelope,
+    scene_complete_envelope,
+    prepare_dialogue_request,
+    finalize_dialogue_turn,
+    finalize_structured_dialogue_turn,
+    resolve_canned_turn,
+    retrieve_turn_knowledge,
+    MEMORY_OUTCOME_MESSAGES,
+    parse_live_chat_position,
+    live_chat_payload,
+    recall_turn_memories,
+    schedule_memory_compaction,
+    use_structured_output,
+    run_startup_tasks
+)
+
+# a2wsgi is the maintained WSGI adapter; Starlette's own (deprecated) middleware is the fallback.
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+# Non-standard status (as used by nginx) recorded when the client went away before the response was ready.
+CLIENT_CLOSED_REQUEST = 499
+
+class ClientDisconnected(Exception):
+    """
+    Raised when the HTTP client disconnects while a route is still awaiting its result.
+    """
+
+def json_response(payload: Dict[str, Any], status_code: int = 200) -> Response:
+    """
+    Encodes a response payload with the same BSON-aware encoder the Flask app uses.
+    """
+    return Response(dumps_bytes(payload), status_code=status_code, media_type="application/json")
+
+async def _wait_for_disconnect(request: Request):
+    """
+    Resolves once the ASGI server reports `http.disconnect`. Only valid after the body has been read.
+    """
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+async def run_until_disconnected(request: Request, awaitable: Awaitable[Any]) -> Any:
+    """
+    Awaits `awaitable` while watching the connection. If the client disconnects first the work is
+    cancelled (aborting any in-flight model request) and ClientDisconnected is raised.
+    """
+    work = asyncio.ensure_future(awaitable)
+    disconnect_watch = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({work, disconnect_watch}, return_when=asyncio.FIRST_COMPLETED)
+        if not work.done():
+            work.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await work
+            raise ClientDisconnected()
+        return work.result()
+    finally:
+        disconnect_watch.cancel()
+        if not work.done():
+            work.cancel()
+
+async def _read_json_payload(request: Request) -> Optional[Dict[str, Any]]:
+    """
+    Returns the request body as a JSON object, or None when it is missing or malformed.
+    """
+    try:
+        payload = await request.json()
+    except Exception:
+        return None
+    return payload if isinstance(payload, dict) and payload else None
+
+async def fetch_lore_by_name_async(db, lore_names: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Async counterpart of lore_cache.fetch_lore_by_name: the projected summary fields with a single `$in` query.
+    """
+    lore_by_name: Dict[str, Dict[str, Any]] = {}
+    if not lore_names:
+        return lore_by_name
+    async for lore_entry_doc in db.lore_entries.find({"name": {"$in": lore_names}}, LORE_SUMMARY_PROJECTION):
+        lore_by_name.setdefault(lore_entry_doc.get('name'), lore_entry_doc)
+    return lore_by_name
+
+async def get_cached_lore_by_name_async(db, lore_names: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Resolves lore names through the shared lore cache; only uncached names reach the database.
+    """
+    return await lore_cache.aget_many(lore_names, lambda missing_names: fetch_lore_by_name_async(db, missing_names))
+
+async def get_linked_lore_summary_for_npc_async(db, npc_doc: Dict[str, Any]) -> str:
+    """
+    Async counterpart of app.get_linked_lore_summary_for_npc: cached names first, one `$in` query for the rest.
+    """
+    linked_names = npc_doc.get('linked_lore_by_name') or []
+    try:
+        lore_by_name = await get_cached_lore_by_name_async(db, linked_names)
+    except PyMongoError:
+        return ""
+    return summarize_linked_lore(linked_names, lore_by_name)
+
+async def aretrieve_turn_knowledge(npc_profile: NPCProfile, dialogue_req_data: DialogueRequest) -> List[str]:
+    """
+    Async counterpart of app.retrieve_turn_knowledge. A query on the built index is answered inline;
+    only the one-off index build (blocking Mongo reads) goes to a worker thread.
+    """
+    if knowledge_index.is_built:
+        return retrieve_turn_knowledge(npc_profile, dialogue_req_data)
+    return await asyncio.to_thread(retrieve_turn_knowledge, npc_profile, dialogue_req_data)
+
+async def arecall_turn_memories(npc_id_str: str, dialogue_req_data: DialogueRequest) -> List[MemoryItem]:
+    """
+    Async counterpart of app.recall_turn_memories. A recall on a loaded index is answered inline; loading
+    an index (blocking Mongo reads) goes to a worker thread, and without numpy the newest memories are
+    read with the async driver.
+    """
+    if not memory_recall.available:
+        memories = await arecent_memories(get_async_db(), ObjectId(npc_id_str), PROMPT_RECENT_MEMORIES)
+        return [MemoryItem(**memory) for memory in memories]
+    if memory_recall.is_ready(ObjectId(npc_id_str)):
+        return recall_turn_memories(npc_id_str, dialogue_req_data)
+    return await asyncio.to_thread(recall_turn_memories, npc_id_str, dialogue_req_data)
+
+async def arun_dialogue_turn(npc_id_str: str, npc_profile: NPCProfile, dialogue_req_data: DialogueRequest, lore_summary: str, detailed_history: str) -> DialogueResponse:
+    """
+    Async counterpart of app.run_dialogue_turn: awaits the dialogue model call, then parses the reply
+    and queues its memory summary in a worker thread (the job insert is a blocking Mongo write).
+    """
+    canned_response, candidate_topics = resolve_canned_turn(npc_id_str, npc_profile, dialogue_req_data)
+    if canned_response is not None:
+        return canned_response
+    npc_profile.memories = await arecall_turn_memories(npc_id_str, dialogue_req_data)
+    retrieved_knowledge = await aretrieve_turn_knowledge(npc_profile, dialogue_req_data)
+
+    if use_structured_output(dialogue_req_data):
+        structured = await ai_service_instance.agenerate_structured_npc_dialogue(
+            npc=npc_profile,
+            dialogue_request=dialogue_req_data,
+            world_lore_summary=lore_summary,
+            detailed_character_history=detailed_history,
+            canned_conversations=candidate_topics,
+            retrieved_knowledge=retrieved_knowledge
+        )
+        # Nothing left to parse or queue, so no worker thread is needed.
+        return finalize_structured_dialogue_turn(npc_id_str, dialogue_req_data, structured)
+
+    full_ai_output = await ai_service_instance.agenerate_npc_dialogue(
+        npc=npc_profile,
+        dialogue_request=dialogue_req_data,
+        world_lore_summary=lore_summary,
+        detailed_character_history=detailed_history,
+        canned_conversations=candidate_topics,
+        retrieved_knowledge=retrieved_knowledge
+    )
+    return await asyncio.to_thread(finalize_dialogue_turn, npc_id_str, dialogue_req_data, full_ai_output)
+
+# --- DIALOGUE GENERATION ---
+
+async def load_npc_dialogue_turn_async(request: Request) -> Tuple[Optional[Dict[str, Any]], Optional[Response]]:
+    """
+    Async counterpart of app.load_npc_dialogue_turn: returns (turn inputs, None) or (None, error response).
+    """
+    npc_id_str = request.path_params['npc_id_str']
+    db = get_async_db()
+    if db is None:
+        return None, json_response(create_standard_response(success=False, error="Database not available"), 503)
+    if ai_service_instance is None or ai_service_instance.client is None:
+        return None, json_response(create_standard_response(success=False, error="AI Service not available"), 503)
+
+    try:
+        npc_id_obj = ObjectId(npc_id_str)
+    except Exception:
+        return None, json_response(create_standard_response(success=False, error="Invalid NPC ID"), 400)
+
+    dialogue_req_payload = await _read_json_payload(request)
+
+    try:
+        npc_data_from_db = await db.npcs.find_one({"_id": npc_id_obj})
+    except PyMongoError as e:
+        return None, json_response(create_standard_response(success=False, error=f"Database not available: {e}"), 503)
+    if not npc_data_from_db:
+        return None, json_response(create_standard_response(success=False, error="NPC not found"), 404)
+    if not dialogue_req_payload:
+        return None, json_response(create_standard_response(success=False, error="Invalid JSON payload"), 400)
+
+    # History files are read from disk; keep that off the event loop.
+    npc_data_with_history = await asyncio.to_thread(load_history_content_for_npc, npc_data_from_db)
+
+    try:
+        npc_profile, dialogue_req_data = prepare_dialogue_request(npc_data_with_history, dialogue_req_payload)
+    except ValidationError as e:
+        return None, json_response(create_standard_response(success=False, error=str(e)), 400)
+
+    return {
+        "npc_id_str": npc_id_str,
+        "npc_profile": npc_profile,
+        "dialogue_req_data": dialogue_req_data,
+        "lore_summary": await get_linked_lore_summary_for_npc_async(db, npc_data_with_history),
+        "detailed_history": npc_data_with_history.get('combined_history_content', '')
+    }, None
+
+async def generate_dialogue_for_npc_async(request: Request) -> Response:
+    # Async variant of POST /api/npcs/<id>/dialogue; the model calls are awaited and cancelled if the client leaves
+    turn, error_response = await load_npc_dialogue_turn_async(request)
+    if error_response is not None:
+        return error_response
+    npc_id_str = turn["npc_id_str"]
+
+    try:
+        response_model = await run_until_disconnected(
+            request, arun_dialogue_turn(npc_id_str, turn["npc_profile"], turn["dialogue_req_data"], turn["lore_summary"], turn["detailed_history"])
+        )
+        return json_response(create_standard_response(success=True, data=response_model.model_dump(mode='json')))
+    except ClientDisconnected:
+        print(f"[ASGI] Client disconnected; cancelled dialogue generation for NPC {npc_id_str}.")
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    except Exception as e:
+        traceback.print_exc()
+        return json_response(create_standard_response(success=False, error=f"AI Generation Failed: {str(e)}"), 500)
+
+async def stream_dialogue_for_npc_async(request: Request) -> Response:
+    # Async variant of POST /api/npcs/<id>/dialogue/stream; Starlette stops the generator (and the model stream) on disconnect
+    turn, error_response = await load_npc_dialogue_turn_async(request)
+    if error_response is not None:
+        return error_response
+    npc_id_str = turn["npc_id_str"]
+    dialogue_req_data = turn["dialogue_req_data"]
+
+    async def event_stream():
+        parser = IncrementalSuggestionParser(dialogue_req_data.speaking_pc_id)
+        try:
+            canned_response, candidate_topics = resolve_canned_turn(npc_id_str, turn["npc_profile"], dialogue_req_data)
+            if canned_response is not None:
+                yield format_parser_event("token", canned_response.npc_dialogue)
+                yield format_sse_event("done", create_standard_response(success=True, data=canned_response.model_dump(mode='json')))
+                return
+
+            turn["npc_profile"].memories = await arecall_turn_memories(npc_id_str, dialogue_req_data)
+            text_chunks = ai_service_instance.astream_npc_dialogue(
+                npc=turn["npc_profile"],
+                dialogue_request=dialogue_req_data,
+                world_lore_summary=turn["lore_summary"],
+                detailed_character_history=turn["detailed_history"],
+                canned_conversations=candidate_topics,
+                retrieved_knowledge=await aretrieve_turn_knowledge(turn["npc_profile"], dialogue_req_data)
+            )
+            async for text_chunk in text_chunks:
+                for event_name, event_data in parser.feed(text_chunk):
+                    yield format_parser_event(event_name, event_data)
+            for event_name, event_data in parser.finish():
+                yield format_parser_event(event_name, event_data)
+
+            response_model = await asyncio.to_thread(finalize_dialogue_turn, npc_id_str, dialogue_req_data, parser.full_text)
+            yield format_sse_event("done", create_standard_response(success=True, data=response_model.model_dump(mode='json')))
+        except Exception as e:
+            traceback.print_exc()
+            yield format_sse_event("error", create_standard_response(success=False, error=f"AI Generation Failed: {str(e)}"))
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+async def generate_scene_dialogue_async(request: Request) -> Response:
+    # Async variant of POST /api/scene/dialogue: NPC turns run as tasks bounded by a semaphore and stream out as they finish
+    db = get_async_db()
+    if db is None:
+        return json_response(create_standard_response(success=False, error="Database not available"), 503)
+    if ai_service_instance is None or ai_service_instance.client is None:
+        return json_response(create_standard_response(success=False, error="AI Service not available"), 503)
+
+    scene_req_payload = await _read_json_payload(request)
+    if not scene_req_payload:
+        return json_response(create_standard_response(success=False, error="Invalid JSON payload"), 400)
+    try:
+        scene_req = SceneDialogueRequest(**scene_req_payload)
+        npc_id_strs = list(dict.fromkeys(scene_req.npc_ids))
+        npc_id_objs = [ObjectId(npc_id_str) for npc_id_str in npc_id_strs]
+    except ValidationError as e:
+        return json_response(create_standard_response(success=False, error=str(e)), 400)
+    except Exception:
+        return json_response(create_standard_response(success=False, error="Invalid NPC ID"), 400)
+
+    try:
+        npc_docs = await db.npcs.find({"_id": {"$in": npc_id_objs}}).to_list(None)
+        linked_lore_names = sorted({lore_name for npc_doc in npc_docs for lore_name in (npc_doc.get('linked_lore_by_name') or [])})
+        lore_by_name = await get_cached_lore_by_name_async(db, linked_lore_names)
+    except PyMongoError as e:
+        return json_response(create_standard_response(success=False, error=f"Database not available: {e}"), 503)
+
+    # History files are read from disk; keep that off the event loop.
+    contexts = await asyncio.to_thread(build_scene_npc_contexts, npc_docs, lore_by_name)
+    turns, failures = plan_scene_turns(scene_req, npc_id_strs, contexts)
+    concurrency_limit = asyncio.Semaphore(app_config.SCENE_DIALOGUE_MAX_CONCURRENCY)
+
+    async def bounded_turn(npc_id_str: str):
+        npc_profile, dialogue_req_data, context = turns[npc_id_str]
+        async with concurrency_limit:
+            try:
+                return npc_id_str, await arun_dialogue_turn(npc_id_str, npc_profile, dialogue_req_data,
+                                                            context["lore_summary"], context["detailed_history"]), None
+            except Exception as e:
+                traceback.print_exc()
+                return npc_id_str, None, f"AI Generation Failed: {str(e)}"
+
+    async def scene_results():
+        for npc_id_str, error in failures.items():
+            yield npc_id_str, None, error
+        tasks = [asyncio.ensure_future(bounded_turn(npc_id_str)) for npc_id_str in turns]
+        try:
+            for next_finished in asyncio.as_completed(tasks):
+                yield await next_finished
+        finally:
+            # Disconnects cancel the response generator; take every unfinished model call down with it.
+            for task in tasks:
+                task.cancel()
+
+    if request.query_params.get('stream', 'true').lower() in ('0', 'false', 'no'):
+        async def collect_results():
+            return {npc_id_str: scene_result_envelope(npc_id_str, response_model, error)
+                    async for npc_id_str, response_model, error in scene_results()}
+        try:
+            results = await run_until_disconnected(request, collect_results())
+        except ClientDisconnected:
+            return Response(status_code=CLIENT_CLOSED_REQUEST)
+        return json_response(create_standard_response(success=True, data=[results[npc_id_str] for npc_id_str in npc_id_strs]))
+
+    async def stream_scene():
+        started_at = time.monotonic()
+        failed_count = 0
+        async for npc_id_str, response_model, error in scene_results():
+            failed_count += error is not None
+            yield dumps_bytes(scene_result_envelope(npc_id_str, response_model, error)) + b"\n"
+        yield dumps_bytes(scene_complete_envelope(len(npc_id_strs), failed_count, started_at)) + b"\n"
+
+    return StreamingResponse(stream_scene(), media_type="application/x-ndjson")
+
+# --- MEMORY ENDPOINTS ---
+
+async def arecent_memory_list(db, npc_id_obj: ObjectId) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Async counterpart of app.memory_list_view: the newest page of memories in chronological order, and the total count.
+    """
+    memories = await arecent_memories(db, npc_id_obj, app_config.MEMORY_PAGE_SIZE)
+    return memories, await db[MEMORIES_COLLECTION].count_documents({"npc_id": npc_id_obj})
+
+async def add_npc_memory_async(request: Request) -> Response:
+    # Async variant of POST /api/npcs/<id>/memory using the asyncio MongoDB driver
+    db = get_async_db()
+    if db is None:
+        return json_response(create_standard_response(success=False, error="Database not available"), 503)
+    try:
+        npc_id_obj = ObjectId(request.path_params['npc_id_str'])
+    except Exception:
+        return json_response(create_standard_response(success=False, error="Invalid ID"), 400)
+    duplicate_action = request.query_params.get('on_duplicate') or app_config.MEMORY_DEDUP_ACTION
+    if duplicate_action not in DUPLICATE_ACTIONS:
+        return json_response(create_standard_response(success=False, error=f"on_duplicate must be one of: {', '.join(DUPLICATE_ACTIONS)}"), 400)
+
+    payload = await _read_json_payload(request)
+    if not payload:
+        return json_response(create_standard_response(success=False, error="Invalid JSON payload"), 400)
+    try:
+        memory_data = MemoryItem(**payload)
+    except ValidationError as e:
+        return json_response(create_standard_response(success=False, error=str(e)), 400)
+
+    try:
+        result = await db.npcs.update_one({"_id": npc_id_obj}, version_bump())
+        if result.matched_count == 0:
+            return json_response(create_standard_response(success=False, error="Character not found"), 404)
+        result = await aadd_memory_deduplicated(db, npc_id_obj, memory_data, duplicate_action)
+        if result["outcome"] == "rejected":
+            return json_response(create_standard_response(success=False, error="Near-duplicate of an existing memory", data={
+                "duplicate_of": result["memory"],
+                "similarity": round(result["similarity"], 3)
+            }), 409)
+        memory_recall.note_added(npc_id_obj, result["memory"])
+        memories, memory_count = await arecent_memory_list(db, npc_id_obj)
+    except PyMongoError as e:
+        return json_response(create_standard_response(success=False, error=str(e)), 500)
+    # Compaction checks and queues through the sync job queue; keep that off the event loop.
+    compaction_job_id = None
+    if result["outcome"] == "added":
+        compaction_job_id = await asyncio.to_thread(schedule_memory_compaction, request.path_params['npc_id_str'])
+    return json_response(create_standard_response(success=True, data={
+        "message": MEMORY_OUTCOME_MESSAGES[result["outcome"]],
+        "outcome": result["outcome"],
+        "memory": result["memory"],
+        "updated_memories": memories,
+        "memory_count": memory_count,
+        "compaction_job_id": compaction_job_id
+    }))
+
+async def delete_npc_memory_async(request: Request) -> Response:
+    # Async variant of DELETE /api/npcs/<id>/memory/<memory_id> using the asyncio MongoDB driver
+    db = get_async_db()
+    if db is None:
+        return json_response(create_standard_response(success=False, error="Database not available"), 503)
+    try:
+        npc_id_obj = ObjectId(request.path_params['npc_id_str'])
+    except Exception:
+        return json_response(create_standard_response(success=False, error="Invalid NPC ID"), 400)
+
+    try:
+        if not await adelete_memory(db, npc_id_obj, request.path_params['memory_id_str_path']):
+            return json_response(create_standard_response(success=False, error="Memory not found"), 404)
+        memory_recall.note_deleted(npc_id_obj, request.path_params['memory_id_str_path'])
+        await db.npcs.update_one({"_id": npc_id_obj}, version_bump())
+        memories, memory_count = await arecent_memory_list(db, npc_id_obj)
+    except PyMongoError as e:
+        return json_response(create_standard_response(success=False, error=str(e)), 500)
+    return json_response(create_standard_response(success=True, data={
+        "message": "Memory deleted",
+        "updated_memories": memories,
+        "memory_count": memory_count
+    }))
+
+async def list_npc_memories_async(request: Request) -> Response:
+    # Async variant of GET /api/npcs/<id>/memories: keyset pages of memories, newest first
+    db = get_async_db()
+    if db is None:
+        return json_response(create_standard_response(success=False, error="Database not available"), 503)
+    try:
+        npc_id_obj = ObjectId(request.path_params['npc_id_str'])
+    except Exception:
+        return json_response(create_standard_response(success=False, error="Invalid NPC ID"), 400)
+    try:
+        limit = min(int(request.query_params.get('limit', app_config.MEMORY_PAGE_SIZE)), app_config.LISTING_MAX_PAGE_SIZE)
+        if limit <= 0:
+            raise ValueError
+    except ValueError:
+        return json_response(create_standard_response(success=False, error="limit must be a positive integer"), 400)
+
+    try:
+        memories, page_meta = await alist_memories(db, npc_id_obj, limit, request.query_params.get('cursor'))
+    except ValueError as e:
+        return json_response(create_standard_response(success=False, error=str(e)), 400)
+    except PyMongoError as e:
+        return json_response(create_standard_response(success=False, error=str(e)), 500)
+    return json_response(create_standard_response(success=True, data=memories, meta=page_meta))
+
+# --- LIVE CHAT ENDPOINTS ---
+
+async def get_live_chat_async(request: Request) -> Response:
+    # Async variant of GET /api/live_chat: a long-poll (?since=&wait=) waits on the event loop instead of holding a thread
+    try:
+        since = parse_live_chat_position(request.query_params.get('since'))
+        wait_seconds = min(float(request.query_params.get('wait') or 0), app_config.LIVE_CHAT_MAX_WAIT_SECONDS)
+    except ValueError:
+        return json_response(create_standard_response(success=False, error="since must be a sequence number and wait a number of seconds"), 400)
+    if since is not None and wait_seconds > 0:
+        update = await live_chat_buffer.await_since(since, wait_seconds)
+    else:
+        update = live_chat_buffer.since(since)
+    return json_response(live_chat_payload(update))
+
+async def stream_live_chat_async(request: Request) -> Response:
+    # Async variant of GET /api/live_chat/stream; idle streams cost no thread, and Starlette ends the generator on disconnect
+    try:
+        since = parse_live_chat_position(request.headers.get('last-event-id') or request.query_params.get('since'))
+    except ValueError:
+        return json_response(create_standard_response(success=False, error="since must be a sequence number"), 400)
+
+    async def event_stream():
+        update = live_chat_buffer.since(since)
+        yield format_sse_event("lines", live_chat_payload(update), event_id=update.latest_seq)
+        position = update.latest_seq
+        while True:
+            update = await live_chat_buffer.await_since(position, app_config.LIVE_CHAT_HEARTBEAT_SECONDS)
+            if update.latest_seq == position:
+                yield b": keep-alive\n\n"
+                continue
+            yield format_sse_event("lines", live_chat_payload(update), event_id=update.latest_seq)
+            position = update.latest_seq
+
+    return StreamingResponse(event_stream(), media_type='text/event-stream', headers=SSE_HEADERS)
+
+# --- APPLICATION ---
+
+@contextlib.asynccontextmanager
+async def lifespan(_app: Starlette):
+    # Run the same boot sequence as `python app.py` (indexes, file sync, data watcher) off the event loop
+    await asyncio.to_thread(run_startup_tasks, True)
+    yield
+    await close_async_db()
+
+app = Starlette(
+    routes=[
+        Route('/api/npcs/{npc_id_str}/dialogue', generate_dialogue_for_npc_async, methods=['POST']),
+        Route('/api/npcs/{npc_id_str}/dialogue/stream', stream_dialogue_for_npc_async, methods=['POST']),
+        Route('/api/scene/dialogue', generate_scene_dialogue_async, methods=['POST']),
+        Route('/api/npcs/{npc_id_str}/memory', add_npc_memory_async, methods=['POST']),
+        Route('/api/npcs/{npc_id_str}/memory/{memory_id_str_path}', delete_npc_memory_async, methods=['DELETE']),
+        Route('/api/npcs/{npc_id_str}/memories', list_npc_memories_async, methods=['GET']),
+        Route('/api/live_chat', get_live_chat_async, methods=['GET']),
+        Route('/api/live_chat/stream', stream_live_chat_async, methods=['GET']),
+        # Everything else (character sheets, lore, live chat, static files) is the existing Flask app.
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan
+)
@@ -0,0 +1,251 @@
+# server/canned_matcher.py
+"""
+Canned Conversation Matcher Module.
+Matches a player's utterance against an NPC's `canned_conversations` topics locally, so a scripted
+line is answered instantly without a model call. Topic keys such as "ask_about_undermountain" are
+reduced to their content words and scored against the utterance three ways: whole-phrase keyword
+match, stemmed word coverage and fuzzy (typo-tolerant) word similarity. Each score is then weighted by
+the share of the utterance's own content words the topic accounts for, so a topic word mentioned in
+passing ("It is cold, where is the body?") is only a hint for the model, never a scripted answer.
+Matchers are built once per distinct topic set and cached.
+"""
+import difflib
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import config as app_config
+
+# Words in topic keys that describe the conversation move rather than its subject ("ask_about_X").
+TOPIC_STOPWORDS = {
+    "a", "an", "the", "of", "on", "to", "in", "at", "by", "for", "with", "and", "or", "if", "is",
+    "ask", "asked", "asking", "about", "his", "her", "their", "its", "he", "she", "what", "does", "do"
+}
+
+# Words that carry no subject of their own in an utterance ("what do you know about ..."); the remaining
+# content words are what a topic has to account for before its line is used verbatim.
+UTTERANCE_STOPWORDS = TOPIC_STOPWORDS | {
+    "i", "i'm", "im", "me", "my", "you", "your", "you're", "we", "us", "our", "it", "it's", "this", "that",
+    "these", "those", "there", "here", "are", "was", "were", "be", "been", "am", "did", "have", "has", "had",
+    "can", "could", "would", "will", "should", "may", "might", "who", "whom", "which", "where", "when", "why",
+    "how", "what's", "whats", "so", "but", "then", "any", "anything", "some", "something", "more", "tell",
+    "know", "say", "please", "again", "just", "really", "oh", "well", "now", "from", "into", "much", "many", "like"
+}
+
+# Everyday phrasings of the most common topic keys and topic words, looked up for the whole key and for each of
+# its content words ("ask_about_weather" gets the "weather" ones); each synonym counts as that word being present.
+TOPIC_SYNONYMS = {
+    "introduction": {"hello", "hi", "hey", "greetings", "introduce", "welcome", "who are you"},
+    "greeting": {"hello", "hi", "hey", "greetings", "well met"},
+    "start_conversation": {"what's going on", "whats going on", "what's new", "news"},
+    "weather": {"rain", "sunny", "cold", "warm"},
+}
+
+_WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+def light_stem(word: str) -> str:
+    """
+    Strips common English inflections ("rumors" -> "rumor", "asking" -> "ask"). Deliberately conservative:
+    stems shorter than three letters are left alone, so short names are never mangled.
+    """
+    word = word.lower().strip("'")
+    if word.endswith("'s"):
+        word = word[:-2]
+    for suffix in ("ational", "ization", "ments", "ment", "ings", "ing", "edly", "ed", "ies", "es", "ly", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            stem = word[:-len(suffix)]
+            return stem + "y" if suffix == "ies" else stem
+    return word
+
+def utterance_words(text: str) -> List[str]:
+    return _WORD_PATTERN.findall(text.lower())
+
+@dataclass
+class CannedTopic:
+    key: str
+    response: str
+    phrase: str
+    content_words: List[str]
+    content_stems: Set[str]
+    # Synonyms of the whole key (all of the topic present) and of each content word (that word present).
+    synonyms: Set[str]
+    word_synonyms: Dict[str, Set[str]]
+
+@dataclass
+class CannedMatch:
+    topic: str
+    response: str
+    score: float
+    method: str
+
+class CannedMatcher:
+    """
+    Scores every canned topic of one NPC against an utterance. Scores are in [0, 1]: a whole-phrase
+    keyword match scores 1.0, full stemmed coverage 0.9 and fuzzy matches at most 0.85, each multiplied
+    by the share of the utterance's content words the topic accounts for. Single-word topics and synonym
+    hits are capped at HINT_SCORE unless they are the whole utterance ("Hello!"), while a whole-phrase
+    keyword hit never scores below HINT_SCORE, however much else the utterance says.
+    """
+    KEYWORD_SCORE = 1.0
+    STEM_SCORE = 0.9
+    FUZZY_SCORE = 0.85
+    # Below the default CANNED_MATCH_THRESHOLD and above CANNED_HINT_THRESHOLD: offered, never answered.
+    HINT_SCORE = 0.6
+    # Utterance words shorter than this never take part in fuzzy matching ("the" ~ "them").
+    FUZZY_MIN_WORD_LENGTH = 4
+    FUZZY_MIN_RATIO = 0.8
+
+    def __init__(self, canned_conversations: Dict[str, str]):
+        self.topics: List[CannedTopic] = []
+        for topic_key, response in (canned_conversations or {}).items():
+            if not topic_key or not response:
+                continue
+            words = [word for word in re.split(r"[\s_\-]+", topic_key.lower()) if word]
+            content_words = [word for word in words if word not in TOPIC_STOPWORDS] or words
+            self.topics.append(CannedTopic(
+                key=topic_key,
+                response=response,
+                phrase=" ".join(content_words),
+                content_words=content_words,
+                content_stems={light_stem(word) for word in content_words},
+                synonyms=TOPIC_SYNONYMS.get(topic_key.lower(), set()),
+                word_synonyms={word: TOPIC_SYNONYMS[word] for word in content_words if word in TOPIC_SYNONYMS}
+            ))
+
+    @staticmethod
+    def _phrase_positions(words: List[str], phrase: str) -> Set[int]:
+        # Indexes of the utterance words covered by every occurrence of a (possibly multi-word) phrase.
+        phrase_words = phrase.split()
+        positions: Set[int] = set()
+        for start in range(len(words) - len(phrase_words) + 1):
+            if words[start:start + len(phrase_words)] == phrase_words:
+                positions.update(range(start, start + len(phrase_words)))
+        return positions
+
+    def _score_topic(self, topic: CannedTopic, words: List[str], content_indexes: Set[int]) -> Tuple[float, str]:
+        # How much of the topic the utterance mentions (keyword, synonym, stem or fuzzy), times how much of
+        # the utterance's content that mention accounts for. Synonym words count as content even when they
+        # are stopwords ("who are you").
+        keyword_hit = f" {topic.phrase} " in f" {' '.join(words)} "
+        covered: Set[int] = set()
+        present: Set[str] = set()
+        synonym_hit = False
+        for synonym in topic.synonyms:
+            positions = self._phrase_positions(words, synonym)
+            if positions:
+                covered |= positions
+                present.update(topic.content_words)
+                synonym_hit = True
+
+        fuzzy_words = [(index, word) for index, word in enumerate(words)
+                       if index in content_indexes and len(word) >= self.FUZZY_MIN_WORD_LENGTH]
+        ratios = []
+        for topic_word in topic.content_words:
+            topic_stem = light_stem(topic_word)
+            for index, word in enumerate(words):
+                if light_stem(word) == topic_stem:
+                    covered.add(index)
+                    present.add(topic_word)
+            for synonym in topic.word_synonyms.get(topic_word, ()):
+                positions = self._phrase_positions(words, synonym)
+                if positions:
+                    covered |= positions
+                    present.add(topic_word)
+                    synonym_hit = True
+            best_ratio = 0.0
+            for index, word in fuzzy_words:
+                ratio = difflib.SequenceMatcher(None, topic_word, word).ratio()
+                if ratio >= self.FUZZY_MIN_RATIO:
+                    covered.add(index)
+                    best_ratio = max(best_ratio, ratio)
+            ratios.append(best_ratio)
+
+        content = content_indexes | covered
+        if not covered or not content:
+            return 0.0, "none"
+        share = len(covered & content) / len(content)
+
+        if keyword_hit:
+            best_score, best_method = self.KEYWORD_SCORE, "keyword"
+        elif synonym_hit and len(present) == len(topic.content_words):
+            best_score, best_method = self.KEYWORD_SCORE, "synonym"
+        else:
+            best_score = self.STEM_SCORE * len(present) / len(topic.content_words)
+            best_method = "synonym" if synonym_hit else "stem"
+            fuzzy_score = self.FUZZY_SCORE * sum(ratios) / len(ratios)
+            if fuzzy_score > best_score:
+                best_score, best_method = fuzzy_score, "fuzzy"
+        best_score *= share
+        # A lone topic word or a synonym inside a longer utterance only suggests the topic...
+        if share < 1.0 and (len(topic.content_words) == 1 or synonym_hit):
+            best_score = min(best_score, self.HINT_SCORE)
+        # ...but naming the topic outright always at least offers it to the model.
+        if keyword_hit:
+            best_score = max(best_score, self.HINT_SCORE)
+        return best_score, best_method
+
+    def score(self, utterance: str, addressee: Optional[str] = None) -> List[CannedMatch]:
+        """
+        Returns every topic with a non-zero score, best first. Words of the addressee's name ("Hi Durnan")
+        are ignored, so addressing the NPC does not dilute the match.
+        """
+        name_words = set(utterance_words(addressee or ""))
+        words = [word for word in utterance_words(utterance) if word not in name_words]
+        if not words or not self.topics:
+            return []
+        content_indexes = {index for index, word in enumerate(words) if word not in UTTERANCE_STOPWORDS}
+        matches = []
+        for topic in self.topics:
+            topic_score, method = self._score_topic(topic, words, content_indexes)
+            if topic_score > 0:
+                matches.append(CannedMatch(topic.key, topic.response, round(topic_score, 3), method))
+        matches.sort(key=lambda match: match.score, reverse=True)
+        return matches
+
+    def resolve(self, utterance: str, threshold: Optional[float] = None,
+                hint_threshold: Optional[float] = None, addressee: Optional[str] = None) -> Tuple[Optional[CannedMatch], Dict[str, str]]:
+        """
+        Returns (confident match, undecided topics). A match is confident when it reaches the threshold and
+        clearly beats the runner-up; otherwise topics scoring at least hint_threshold (and any topic named
+        outright) are returned so the model can decide between them. Topics that plainly do not apply are
+        dropped from both.
+        """
+        threshold = app_config.CANNED_MATCH_THRESHOLD if threshold is None else threshold
+        hint_threshold = app_config.CANNED_HINT_THRESHOLD if hint_threshold is None else hint_threshold
+        matches = self.score(utterance, addressee)
+        if matches and matches[0].score >= threshold:
+            runner_up_score = matches[1].score if len(matches) > 1 else 0.0
+            if matches[0].score - runner_up_score >= 0.1:
+                return matches[0], {}
+        return None, {match.topic: match.response for match in matches
+                      if match.score >= hint_threshold or match.method == "keyword"}
+
+class CannedMatcherCache:
+    """
+    Small LRU of matchers keyed by the content of the topic dictionary, so editing an NPC's canned
+    conversations naturally builds a fresh matcher.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._matchers: "OrderedDict[str, CannedMatcher]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, canned_conversations: Dict[str, str]) -> CannedMatcher:
+        fingerprint = hashlib.sha1(repr(sorted(canned_conversations.items())).encode('utf-8')).hexdigest()
+        with self._lock:
+            matcher = self._matchers.get(fingerprint)
+            if matcher is not None:
+                self._matchers.move_to_end(fingerprint)
+                return matcher
+        matcher = CannedMatcher(canned_conversations)
+        with self._lock:
+            self._matchers[fingerprint] = matcher
+            while len(self._matchers) > self.max_entries:
+                self._matchers.popitem(last=False)
+        return matcher
+
+canned_matcher_cache = CannedMatcherCache()
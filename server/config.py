@@ -42,6 +42,134 @@ class Config:
     HISTORY_DATA_DIR = os.path.join(UPLOAD_FOLDER, 'history')
     LORE_DATA_DIR = os.path.join(UPLOAD_FOLDER, 'lore')
 
+    # Number of upserts sent per bulk_write during the file-to-database sync, and whether each batch
+    # stops at the first failed write (ordered) or attempts every operation (unordered).
+    SYNC_BATCH_SIZE = int(os.environ.get('SYNC_BATCH_SIZE') or 100)
+    SYNC_ORDERED_WRITES = os.environ.get('SYNC_ORDERED_WRITES', 'false').lower() in ('1', 'true', 'yes')
+
+    # Processes used to parse and validate changed files during sync. 1 keeps parsing serial, 0 uses one per CPU core.
+    SYNC_WORKERS = int(os.environ.get('SYNC_WORKERS') or 1)
+
+    # Character files at least this large are hashed in chunks and parsed incrementally instead of loaded whole.
+    SYNC_STREAM_THRESHOLD_BYTES = int(os.environ.get('SYNC_STREAM_THRESHOLD_BYTES') or 256 * 1024)
+
+    # Largest page a listing endpoint (/api/npcs, /api/lore_entries) returns when paginated with ?limit=/?cursor=.
+    LISTING_MAX_PAGE_SIZE = int(os.environ.get('LISTING_MAX_PAGE_SIZE') or 200)
+
+    # Response compression: bodies smaller than the minimum are sent as-is; levels trade CPU for size.
+    COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES') or 1024)
+    GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL') or 6)
+    BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY') or 5)
+
+    # Live data watcher: re-syncs changed data files while the server runs instead of only on boot.
+    # Events for a file are debounced until it has been quiet for the given number of seconds;
+    # the poll interval only applies when watchdog (inotify) is unavailable.
+    DATA_WATCHER_ENABLED = os.environ.get('DATA_WATCHER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    DATA_WATCHER_DEBOUNCE_SECONDS = float(os.environ.get('DATA_WATCHER_DEBOUNCE_SECONDS') or 1.0)
+    DATA_WATCHER_POLL_SECONDS = float(os.environ.get('DATA_WATCHER_POLL_SECONDS') or 2.0)
+
+    # Dialogue output format: 'text' asks for the free-text suggestion block parsed by parse_ai_suggestions
+    # (plus a second call for the memory summary); 'structured' asks for one schema-constrained JSON reply
+    # that already contains the suggestions and the memory summary. Requests may override it per call.
+    DIALOGUE_OUTPUT_MODE = (os.environ.get('DIALOGUE_OUTPUT_MODE') or 'text').lower()
+
+    # In-memory cache of parsed history files and combined per-character history, bounded by total size.
+    HISTORY_CACHE_MAX_BYTES = int(os.environ.get('HISTORY_CACHE_MAX_BYTES') or 32 * 1024 * 1024)
+
+    # In-process cache of linked lore summaries. Local edits and syncs invalidate it immediately; the TTL
+    # bounds staleness when another process edits lore.
+    LORE_CACHE_TTL_SECONDS = int(os.environ.get('LORE_CACHE_TTL_SECONDS') or 300)
+
+    # Persona prefix caching: the static part of each NPC prompt is registered once with a context cache
+    # ('gemini' = the provider's explicit cache, 'local' = in-process stand-in that still sends full prompts,
+    # 'off'). The Gemini API rejects small prefixes, so shorter ones are sent inline.
+    CONTEXT_CACHE_BACKEND = (os.environ.get('CONTEXT_CACHE_BACKEND') or 'gemini').lower()
+    CONTEXT_CACHE_TTL_SECONDS = int(os.environ.get('CONTEXT_CACHE_TTL_SECONDS') or 3600)
+    CONTEXT_CACHE_MAX_ENTRIES = int(os.environ.get('CONTEXT_CACHE_MAX_ENTRIES') or 64)
+    CONTEXT_CACHE_MIN_PREFIX_CHARS = int(os.environ.get('CONTEXT_CACHE_MIN_PREFIX_CHARS') or 4096)
+
+    # Model response cache: identical prompts (same model, config and normalized text) reuse the stored reply.
+    # The in-process LRU holds RESPONSE_CACHE_MAX_ENTRIES replies; the MongoDB tier is shared and expires via TTL.
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    RESPONSE_CACHE_PERSISTENT = os.environ.get('RESPONSE_CACHE_PERSISTENT', 'true').lower() in ('1', 'true', 'yes')
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES') or 512)
+    RESPONSE_CACHE_TTL_SECONDS = int(os.environ.get('RESPONSE_CACHE_TTL_SECONDS') or 24 * 3600)
+
+    # Canned conversations: utterances matching a topic with at least CANNED_MATCH_THRESHOLD confidence are
+    # answered locally without a model call; topics scoring at least CANNED_HINT_THRESHOLD (but not matched)
+    # are offered to the model, and the rest are left out of the prompt.
+    CANNED_MATCH_ENABLED = os.environ.get('CANNED_MATCH_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    CANNED_MATCH_THRESHOLD = float(os.environ.get('CANNED_MATCH_THRESHOLD') or 0.8)
+    CANNED_HINT_THRESHOLD = float(os.environ.get('CANNED_HINT_THRESHOLD') or 0.4)
+
+    # Knowledge retrieval: each dialogue turn adds the RETRIEVAL_TOP_K lore/knowledge passages most relevant to
+    # the utterance and scene (BM25 over an in-process index); descriptions are split into passages of at most
+    # RETRIEVAL_MAX_PASSAGE_CHARS characters.
+    RETRIEVAL_ENABLED = os.environ.get('RETRIEVAL_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    RETRIEVAL_TOP_K = int(os.environ.get('RETRIEVAL_TOP_K') or 5)
+    RETRIEVAL_MAX_PASSAGE_CHARS = int(os.environ.get('RETRIEVAL_MAX_PASSAGE_CHARS') or 400)
+
+    # Prompt token budget: dialogue prompts are fitted into PROMPT_TOKEN_BUDGET tokens (0 = no overall limit) by
+    # trimming sections to their caps and then by priority (see token_budget.py). PROMPT_SECTION_CAPS overrides
+    # individual caps ("history=4000,lore=1000"). TOKEN_ESTIMATOR is 'approximate' or 'sentencepiece' (needs the
+    # optional sentencepiece package; falls back to the approximation).
+    PROMPT_TOKEN_BUDGET = int(os.environ.get('PROMPT_TOKEN_BUDGET') or 16000)
+    PROMPT_SECTION_CAPS = os.environ.get('PROMPT_SECTION_CAPS') or ''
+    TOKEN_ESTIMATOR = (os.environ.get('TOKEN_ESTIMATOR') or 'approximate').lower()
+
+    # NPC memories (own collection, see memory_store.py): detail views embed the newest MEMORY_PAGE_SIZE memories.
+    # Once a character has more than MEMORY_COMPACTION_THRESHOLD memories (summaries not counted), a background job keeps the newest
+    # MEMORY_COMPACTION_KEEP_RECENT verbatim and rolls older ones into one summary per MEMORY_COMPACTION_PERIOD_DAYS.
+    MEMORY_PAGE_SIZE = int(os.environ.get('MEMORY_PAGE_SIZE') or 50)
+    MEMORY_COMPACTION_THRESHOLD = int(os.environ.get('MEMORY_COMPACTION_THRESHOLD') or 200)
+    MEMORY_COMPACTION_KEEP_RECENT = int(os.environ.get('MEMORY_COMPACTION_KEEP_RECENT') or 100)
+    MEMORY_COMPACTION_PERIOD_DAYS = int(os.environ.get('MEMORY_COMPACTION_PERIOD_DAYS') or 7)
+
+    # Near-duplicate memories (see memory_dedup.py): a new memory whose content words overlap an existing one's by
+    # at least MEMORY_DEDUP_THRESHOLD (Jaccard) is handled by MEMORY_DEDUP_ACTION: 'reinforce' (count it on the
+    # existing memory), 'merge' (also keep the more detailed wording), 'reject' or 'keep' (store it anyway).
+    MEMORY_DEDUP_ACTION = (os.environ.get('MEMORY_DEDUP_ACTION') or 'reinforce').lower()
+    MEMORY_DEDUP_THRESHOLD = float(os.environ.get('MEMORY_DEDUP_THRESHOLD') or 0.7)
+
+    # Memory recall (needs the optional numpy package; without it prompts use the most recent memories): each
+    # turn's prompt gets the memories whose hashed embeddings (MEMORY_RECALL_DIMENSIONS wide) best match the
+    # utterance, blended with a recency score that halves every MEMORY_RECALL_HALF_LIFE_DAYS. Indexes of up to
+    # MEMORY_RECALL_MAX_CHARACTERS characters stay in memory and are re-checked against the database after
+    # MEMORY_RECALL_TTL_SECONDS.
+    MEMORY_RECALL_ENABLED = os.environ.get('MEMORY_RECALL_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    MEMORY_RECALL_DIMENSIONS = int(os.environ.get('MEMORY_RECALL_DIMENSIONS') or 256)
+    MEMORY_RECALL_RECENCY_WEIGHT = float(os.environ.get('MEMORY_RECALL_RECENCY_WEIGHT') or 0.3)
+    MEMORY_RECALL_HALF_LIFE_DAYS = float(os.environ.get('MEMORY_RECALL_HALF_LIFE_DAYS') or 30)
+    MEMORY_RECALL_MAX_CHARACTERS = int(os.environ.get('MEMORY_RECALL_MAX_CHARACTERS') or 64)
+    MEMORY_RECALL_TTL_SECONDS = int(os.environ.get('MEMORY_RECALL_TTL_SECONDS') or 300)
+
+    # Live session chat (Discord bot ingest): the newest LIVE_CHAT_MAX_LINES lines are kept. Long-poll requests
+    # wait at most LIVE_CHAT_MAX_WAIT_SECONDS for a new line; idle SSE streams send a keep-alive comment every
+    # LIVE_CHAT_HEARTBEAT_SECONDS so proxies do not close them.
+    LIVE_CHAT_MAX_LINES = int(os.environ.get('LIVE_CHAT_MAX_LINES') or 50)
+    LIVE_CHAT_MAX_WAIT_SECONDS = float(os.environ.get('LIVE_CHAT_MAX_WAIT_SECONDS') or 25)
+    LIVE_CHAT_HEARTBEAT_SECONDS = float(os.environ.get('LIVE_CHAT_HEARTBEAT_SECONDS') or 15)
+
+    # Scene dialogue (one utterance, several NPCs): how many NPC generations may run at the same time.
+    SCENE_DIALOGUE_MAX_CONCURRENCY = int(os.environ.get('SCENE_DIALOGUE_MAX_CONCURRENCY') or 4)
+
+    # Background job queue (memory summarization and other off-request work), persisted in MongoDB.
+    # Failed jobs retry with exponential backoff starting at JOB_RETRY_BASE_SECONDS; after JOB_MAX_ATTEMPTS
+    # they are dead-lettered. A running job's lease is renewed every JOB_LEASE_SECONDS / 3; a job whose worker died
+    # is reclaimed once its lease lapses, or dead-lettered if that was its last attempt.
+    # Finished jobs are removed by a TTL index after JOB_RETENTION_SECONDS.
+    JOB_WORKERS_ENABLED = os.environ.get('JOB_WORKERS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 2)
+    JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS') or 2.0)
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS') or 120)
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS') or 5)
+    JOB_RETRY_BASE_SECONDS = float(os.environ.get('JOB_RETRY_BASE_SECONDS') or 5.0)
+    JOB_RETRY_MAX_SECONDS = float(os.environ.get('JOB_RETRY_MAX_SECONDS') or 300.0)
+    JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_SECONDS') or 7 * 24 * 3600)
+    # Background memory summaries wait on the character for GM review; only the newest PENDING_MEMORIES_MAX
+    # are kept, so suggestions the GM never acts on cannot pile up.
+    PENDING_MEMORIES_MAX = int(os.environ.get('PENDING_MEMORIES_MAX') or 10)
+
     @classmethod
     def ensure_dirs(cls):
         """
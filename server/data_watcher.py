@@ -0,0 +1,214 @@
+# server/data_watcher.py
+"""
+Live Data Directory Watcher Module.
+Watches the character, lore, history and VTT import folders while the server runs and re-syncs only
+the files that changed, so re-exported Foundry actors or edited lore reach MongoDB without a restart.
+Uses watchdog (inotify on Linux) when it is installed and falls back to periodic stat polling otherwise.
+"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import config as app_config
+from database import sync_data_from_files, notify_sync_listeners
+
+# watchdog is optional: without it the watcher polls file stats on an interval.
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+WATCHED_EXTENSIONS = ('.json', '.txt')
+
+class _WatchdogEventHandler(FileSystemEventHandler):
+    """
+    Forwards every file-level watchdog event (create, modify, delete, move) to the watcher.
+    """
+
+    def __init__(self, watcher: "DataDirectoryWatcher"):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        self.watcher.record_event(event.src_path)
+        dest_path = getattr(event, 'dest_path', None)
+        if dest_path:
+            self.watcher.record_event(dest_path)
+
+class DataDirectoryWatcher:
+    """
+    Background watcher that debounces file events and re-syncs each affected file once it goes quiet.
+    JSON files are handed to sync_data_from_files(paths=...); history .txt files are not stored in
+    MongoDB, so their changes are only broadcast to the sync listeners for cache invalidation.
+    """
+
+    def __init__(self, directories: Optional[List[str]] = None, debounce_seconds: Optional[float] = None,
+                 poll_interval: Optional[float] = None):
+        candidate_dirs = directories or [
+            app_config.PRIMARY_DATA_DIR,
+            app_config.LORE_DATA_DIR,
+            app_config.HISTORY_DATA_DIR,
+            app_config.PC_IMPORT_DIR
+        ]
+        self.directories = self._collapse_nested_dirs(candidate_dirs)
+        self.debounce_seconds = app_config.DATA_WATCHER_DEBOUNCE_SECONDS if debounce_seconds is None else debounce_seconds
+        self.poll_interval = app_config.DATA_WATCHER_POLL_SECONDS if poll_interval is None else poll_interval
+        self.backend = "inotify" if Observer is not None else "polling"
+
+        self._pending: Dict[str, float] = {}
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._observer = None
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+
+    @staticmethod
+    def _collapse_nested_dirs(directories: List[str]) -> List[str]:
+        """
+        Drops directories already covered by a recursive watch on one of their parents.
+        """
+        abs_dirs = sorted({os.path.abspath(directory) for directory in directories})
+        collapsed: List[str] = []
+        for directory in abs_dirs:
+            if not any(directory == parent or directory.startswith(parent + os.sep) for parent in collapsed):
+                collapsed.append(directory)
+        return collapsed
+
+    def start(self):
+        """
+        Starts the event source (watchdog observer or polling thread) and the debounce worker.
+        """
+        if self._threads:
+            return
+        self._stop_event.clear()
+        if self.backend == "inotify":
+            self._observer = Observer()
+            handler = _WatchdogEventHandler(self)
+            for directory in self.directories:
+                if os.path.isdir(directory):
+                    self._observer.schedule(handler, directory, recursive=True)
+            self._observer.daemon = True
+            self._observer.start()
+        else:
+            self._snapshot = self._scan()
+            self._spawn(self._poll_loop, "data-watcher-poll")
+        self._spawn(self._debounce_loop, "data-watcher-sync")
+        print(f"[Data Watcher] Watching {', '.join(self.directories)} ({self.backend}, debounce {self.debounce_seconds}s)")
+
+    def stop(self):
+        """
+        Stops the event source and worker threads, discarding any events still waiting for debounce.
+        """
+        self._stop_event.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+            self._observer = None
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def _spawn(self, target, name: str):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def record_event(self, path: str):
+        """
+        Registers a change to `path`; the sync for it runs once no further events arrive within the debounce window.
+        """
+        if not path.endswith(WATCHED_EXTENSIONS):
+            return
+        with self._condition:
+            self._pending[os.path.abspath(path)] = time.monotonic()
+            self._condition.notify_all()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Collects (size, mtime_ns) for every watched file; used by the polling backend.
+        """
+        snapshot: Dict[str, Tuple[int, int]] = {}
+        for directory in self.directories:
+            for root, _, files in os.walk(directory):
+                for file_name in files:
+                    if not file_name.endswith(WATCHED_EXTENSIONS):
+                        continue
+                    file_path = os.path.join(root, file_name)
+                    try:
+                        stat_result = os.stat(file_path)
+                    except OSError:
+                        continue
+                    snapshot[file_path] = (stat_result.st_size, stat_result.st_mtime_ns)
+        return snapshot
+
+    def _poll_loop(self):
+        while not self._stop_event.wait(self.poll_interval):
+            current = self._scan()
+            for path in set(current) | set(self._snapshot):
+                if current.get(path) != self._snapshot.get(path):
+                    self.record_event(path)
+            self._snapshot = current
+
+    def _debounce_loop(self):
+        while not self._stop_event.is_set():
+            with self._condition:
+                if not self._pending:
+                    self._condition.wait()
+                    continue
+                now = time.monotonic()
+                settled = [path for path, last_seen in self._pending.items() if now - last_seen >= self.debounce_seconds]
+                if not settled:
+                    wait_for = min(self.debounce_seconds - (now - last_seen) for last_seen in self._pending.values())
+                    self._condition.wait(timeout=max(wait_for, 0.01))
+                    continue
+                for path in settled:
+                    del self._pending[path]
+            self._process(settled)
+
+    def _process(self, paths: List[str]):
+        """
+        Re-syncs settled JSON files and broadcasts history file changes to the cache listeners.
+        """
+        abs_history_dir = os.path.abspath(app_config.HISTORY_DATA_DIR)
+        json_paths = [path for path in paths if path.endswith('.json')]
+        history_names: Set[str] = {
+            os.path.basename(path) for path in paths
+            if path.endswith('.txt') and os.path.dirname(path) == abs_history_dir
+        }
+        try:
+            if json_paths:
+                print(f"[Data Watcher] Re-syncing {len(json_paths)} changed file(s)...")
+                sync_data_from_files(paths=json_paths)
+            if history_names:
+                print(f"[Data Watcher] History files changed: {', '.join(sorted(history_names))}")
+                notify_sync_listeners({"history": history_names})
+        except Exception as e:
+            print(f"[Data Watcher] Failed to process changes: {e}")
+
+# Module-level watcher shared by the Flask app.
+data_watcher: Optional[DataDirectoryWatcher] = None
+
+def start_data_watcher() -> Optional[DataDirectoryWatcher]:
+    """
+    Starts the shared watcher if DATA_WATCHER_ENABLED is set. Safe to call more than once.
+    """
+    global data_watcher
+    if not app_config.DATA_WATCHER_ENABLED:
+        return None
+    if data_watcher is None:
+        data_watcher = DataDirectoryWatcher()
+        data_watcher.start()
+    return data_watcher
+
+def is_data_watcher_running() -> bool:
+    """
+    True while the shared watcher is active, meaning disk changes are pushed to the sync listeners.
+    """
+    return data_watcher is not None and bool(data_watcher._threads)
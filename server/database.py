@@ -4,16 +4,29 @@ Database Synchronization Module.
 Manages the PyMongo client as a Singleton, preventing connection pool exhaustion.
 Additionally handles the one-way syncing of static VTT JSON dumps and Lore files into MongoDB.
 """
-import os
 import json
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
-from bson import ObjectId, json_util
+import os
+import time
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure
+from bson import ObjectId
 from pydantic import ValidationError
 import traceback
 
 from config import config as app_config
 from models import NPCProfile, LoreEntry, LoreEntryType
+from sync_parsing import hash_file, iter_parsed_files
+from serialization import bson_default, to_json_compatible
+from memory_store import delete_npc_memories, import_memories
+
+# The asyncio driver ships with PyMongo 4.9+; older installs simply have no async serving mode.
+try:
+    from pymongo import AsyncMongoClient
+except ImportError:
+    AsyncMongoClient = None
 
 class Database:
     """
@@ -55,152 +68,483 @@ class Database:
 # Expose a globally accessible instance of the connector
 db_connector = Database()
 
+# Lazily created asyncio client for the ASGI request path (see asgi_app.py).
+_async_client = None
+
+def get_async_db():
+    """
+    Retrieves the asyncio database reference used by the async dialogue and memory routes.
+    The client is created on first use so it binds to the running event loop; returns None
+    when the installed PyMongo has no asyncio driver.
+    """
+    global _async_client
+    if AsyncMongoClient is None:
+        return None
+    if _async_client is None:
+        _async_client = AsyncMongoClient(app_config.MONGO_URI)
+    return _async_client[app_config.DB_NAME]
+
+async def close_async_db():
+    """
+    Closes the asyncio client, if one was created. Called on ASGI shutdown.
+    """
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
 def parse_json(data):
     """
-    Utility function leveraging BSON's json_util to safely convert MongoDB documents
-    (which contain complex types like ObjectId and datetime) into standard serializable JSON dicts.
+    Utility function converting MongoDB documents (which contain complex types like ObjectId and
+    datetime) into standard serializable JSON dicts, via the single-pass encoder in serialization.py.
+    """
+    return to_json_compatible(data)
+
+# Hardcoded set of target PC filenames to restrict ingestion strictly to active players.
+ACTIVE_PC_FILES = {
+    "fvtt-Actor-garrett-xLalnoX86KWFZTJu.json",
+    "fvtt-Actor-xander-vyltryn-FV69X8W1jSCi6BZU.json",
+    "fvtt-Actor-sel'zen-daer'maer-the-shadow-bound-i7qpKNa6HrRxBt3l.json",
+    "fvtt-Actor-vilis,-the-black-hand-lKM50j9uy4EOutz7.json",
+    "fvtt-Actor-sudara-pzch3aBRuiQSqnv8.json",
+    "fvtt-Actor-moriah-kiah-9vGd8Fwm6cEFUaos.json"
+}
+
+# Collection persisting one fingerprint entry per synced file so unchanged files can be skipped on boot.
+SYNC_MANIFEST_COLLECTION = 'sync_manifest'
+
+# Serializes syncs so the boot-time sync and the live data watcher never interleave their writes.
+_sync_lock = threading.Lock()
+
+# Callbacks notified with {kind: {names}} whenever synced documents (or watched files) change.
+_sync_listeners: List[Callable[[Dict[str, Set[str]]], None]] = []
+
+def register_sync_listener(callback: Callable[[Dict[str, Set[str]]], None]):
+    """
+    Registers a callback invoked after every sync that changed something. The callback receives a dict
+    mapping a kind ("lore", "character" or "history") to the set of affected names, and is the hook
+    in-process caches use to drop stale entries.
     """
-    return json.loads(json_util.dumps(data))
+    if callback not in _sync_listeners:
+        _sync_listeners.append(callback)
 
-def sync_data_from_files():
+def notify_sync_listeners(changes: Dict[str, Set[str]]):
     """
-    Performs a disk-to-database synchronization process on application startup.
-    Scans specified directories for .json files, validates them using Pydantic models,
-    and upserts them into MongoDB based on their name identifier.
+    Delivers a change set to every registered listener. A failing listener never aborts the others.
     """
-    db = db_connector.get_db()
-    if db is None:
-        print("Database not available for data sync.")
+    changes = {kind: names for kind, names in changes.items() if names}
+    if not changes:
         return
+    for callback in list(_sync_listeners):
+        try:
+            callback(changes)
+        except Exception as e:
+            print(f"[Data Sync] Sync listener {getattr(callback, '__name__', callback)} failed: {e}")
 
-    npcs_collection = db.npcs
-    lore_collection = db.lore_entries
+def _manifest_key(file_path: str) -> str:
+    """
+    Builds the manifest key for a file: its path relative to the data folder, using forward slashes
+    so the manifest stays valid if the data folder is moved or shared between operating systems.
+    """
+    rel_path = os.path.relpath(os.path.abspath(file_path), os.path.abspath(app_config.UPLOAD_FOLDER))
+    return rel_path.replace(os.sep, '/')
 
-    # --- 1. Sync Lore ---
-    print("[Data Sync] Syncing lore data...")
+def write_mirrored_file(file_path: str, kind: str, document: Dict[str, Any]):
+    """
+    Writes a document the server itself changed back to its data file and records that file in the sync
+    manifest (size, mtime, SHA-256 and the document it holds), so the live data watcher and the next
+    startup sync recognise the write as already synced instead of re-importing it.
+    """
+    file_data = dict(document)
+    doc_id = file_data.pop('_id', None)
+    with _sync_lock:
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(file_data, f, indent=4, default=bson_default)
+        db = db_connector.get_db()
+        if db is None or doc_id is None:
+            return
+        stat_result = os.stat(file_path)
+        db[SYNC_MANIFEST_COLLECTION].update_one({"path": _manifest_key(file_path)}, {"$set": {
+            "kind": kind,
+            "size": stat_result.st_size,
+            "mtime_ns": stat_result.st_mtime_ns,
+            "sha256": hash_file(file_path),
+            "synced_at": datetime.utcnow(),
+            "documents": [{"_id": doc_id, "name": file_data.get('name')}]
+        }}, upsert=True)
+
+def _discover_lore_files() -> List[str]:
+    """
+    Recursively collects every .json file beneath the lore directory.
+    """
     lore_dir = os.path.abspath(app_config.LORE_DATA_DIR)
-    
-    # Recursively traverse the lore directory
-    if os.path.exists(lore_dir):
-        for root, _, files in os.walk(lore_dir):
-            for file_name in files:
-                if file_name.endswith('.json'):
-                    try:
-                        # Open and read the raw lore file
-                        with open(os.path.join(root, file_name), 'r', encoding='utf-8') as f:
-                            raw_data = json.load(f)
-                        
-                        # Normalize single object files vs array dumps
-                        lore_list = raw_data if isinstance(raw_data, list) else [raw_data]
-                        
-                        for lore_data in lore_list:
-                            # Skip invalid structural blocks
-                            if not isinstance(lore_data, dict) or 'name' not in lore_data:
-                                continue
-                            
-                            # Provision a unique ID if the document lacks one natively
-                            if 'lore_id' not in lore_data:
-                                lore_data['lore_id'] = str(ObjectId())
-                            
-                            # Route through Pydantic to ensure the schema matches expectations
-                            validated_lore = LoreEntry(**lore_data)
-                            
-                            # Upsert: Update if a lore entry with this exact name exists, otherwise Insert
-                            lore_collection.update_one(
-                                {"name": validated_lore.name},
-                                {"$set": validated_lore.model_dump(by_alias=True, exclude={'lore_id'})},
-                                upsert=True
-                            )
-                    except Exception as e:
-                        print(f"[Data Sync] Lore Error in {file_name}: {e}")
-
-    # --- 2. Sync Characters ---
-    print("[Data Sync] Syncing character data...")
-    
-    # Hardcoded set of target PC filenames to restrict ingestion strictly to active players.
-    active_pc_files = {
-        "fvtt-Actor-garrett-xLalnoX86KWFZTJu.json",
-        "fvtt-Actor-xander-vyltryn-FV69X8W1jSCi6BZU.json",
-        "fvtt-Actor-sel'zen-daer'maer-the-shadow-bound-i7qpKNa6HrRxBt3l.json",
-        "fvtt-Actor-vilis,-the-black-hand-lKM50j9uy4EOutz7.json",
-        "fvtt-Actor-sudara-pzch3aBRuiQSqnv8.json",
-        "fvtt-Actor-moriah-kiah-9vGd8Fwm6cEFUaos.json"
-    }
+    lore_files: List[str] = []
+    if not os.path.exists(lore_dir):
+        return lore_files
+    for root, _, files in os.walk(lore_dir):
+        for file_name in sorted(files):
+            if file_name.endswith('.json'):
+                lore_files.append(os.path.join(root, file_name))
+    return lore_files
 
+def _discover_character_files() -> List[Tuple[str, bool]]:
+    """
+    Collects every character .json file as a (path, is_pc_folder) tuple.
+    Lore files are excluded and the strict PC folder is restricted to the active player list.
+    """
     # Define paths holding character data. Includes general imports and specific PC imports.
     character_dirs = [
-        os.path.abspath(app_config.PRIMARY_DATA_DIR), 
+        os.path.abspath(app_config.PRIMARY_DATA_DIR),
         os.path.abspath(app_config.PC_IMPORT_DIR)
     ]
-    
-    processed_files = set()
-    pc_count = 0
+    abs_lore_dir = os.path.abspath(app_config.LORE_DATA_DIR)
+    abs_pc_dir = os.path.abspath(app_config.PC_IMPORT_DIR)
 
+    seen_paths = set()
+    character_files: List[Tuple[str, bool]] = []
     for directory in character_dirs:
         if not os.path.exists(directory): continue
-        
+
         # Traverse character directories
         for root, _, files in os.walk(directory):
             # Guard clause: Do not attempt to process lore JSON files as character files
-            if os.path.abspath(app_config.LORE_DATA_DIR) in os.path.abspath(root): continue
-            
+            if abs_lore_dir in os.path.abspath(root): continue
+
             # Identify if we are currently traversing the strict PC directory
-            is_pc_folder = os.path.abspath(app_config.PC_IMPORT_DIR) in os.path.abspath(root)
-            
-            for file_name in files:
+            is_pc_folder = abs_pc_dir in os.path.abspath(root)
+
+            for file_name in sorted(files):
                 if not file_name.endswith('.json'): continue
-                
+
                 file_path = os.path.join(root, file_name)
-                
+
                 # Deduplication logic to avoid processing the same file multiple times
-                if file_path in processed_files: continue
-                
+                if file_path in seen_paths: continue
+
                 # If checking a PC folder, ensure the file matches the active list
-                if is_pc_folder and file_name not in active_pc_files: continue
-
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        char_data = json.load(f)
-                    
-                    if not isinstance(char_data, dict) or 'name' not in char_data: continue
-
-                    # Normalization Step: Consolidate naming conventions for "Player Character"
-                    # distinguishing it definitively from "NPC".
-                    if char_data.get('type') == 'character' or is_pc_folder:
-                        char_data['character_type'] = 'Player Character'
-                        pc_count += 1
-                    else:
-                        char_data['character_type'] = 'NPC'
-
-                    # Supply a fallback description to pass Pydantic validation if missing
-                    if not char_data.get('description'):
-                        char_data['description'] = "..."
-
-                    # Flatten MongoDB BSON ObjectIds structured as dicts `{"$oid": "..."}` 
-                    # into raw string IDs.
-                    if '_id' in char_data and isinstance(char_data['_id'], dict):
-                        char_data['_id'] = char_data['_id'].get('$oid', str(ObjectId()))
-
-                    # Pass standard and VTT data through the rigorous Pydantic NPC model.
-                    validated_char = NPCProfile(**char_data)
-                    
-                    # Convert the validated class back into a dictionary for DB insertion.
-                    char_dump = validated_char.model_dump(by_alias=True)
-                    
-                    # Drop the `_id` field from the dictionary before upserting by `name`
-                    # to prevent Mongo immutable _id conflict errors.
-                    if '_id' in char_dump: del char_dump['_id']
-
-                    # Perform Upsert based on character name.
-                    npcs_collection.update_one(
-                        {"name": validated_char.name},
-                        {"$set": char_dump},
-                        upsert=True
-                    )
-                    processed_files.add(file_path)
-                    print(f"   [VTT LOAD] {'PC' if char_data['character_type'] == 'Player Character' else 'NPC'} Loaded: {validated_char.name}")
-
-                except Exception as e:
-                    print(f"   [VTT ERROR] Failed to load {file_name}: {e}")
-
-    print(f"[Data Sync] Finished. Total Processed: {len(processed_files)} | Total PCs Found: {pc_count}")
\ No newline at end of file
+                if is_pc_folder and file_name not in ACTIVE_PC_FILES: continue
+
+                seen_paths.add(file_path)
+                character_files.append((file_path, is_pc_folder))
+    return character_files
+
+class SyncBatchWriter:
+    """
+    Accumulates keyed upserts during a sync and flushes them through `bulk_write` in fixed-size batches,
+    replacing one network round trip per document with one per batch.
+    Each operation is tagged with the manifest key of its source file so failures can be traced back.
+    """
+
+    def __init__(self, collection, label: str, key_field: str = "name", batch_size: Optional[int] = None,
+                 ordered: Optional[bool] = None, resolve_ids: bool = True, version_field: Optional[str] = None):
+        self.collection = collection
+        self.label = label
+        self.key_field = key_field
+        self.batch_size = max(1, batch_size or app_config.SYNC_BATCH_SIZE)
+        self.ordered = app_config.SYNC_ORDERED_WRITES if ordered is None else ordered
+        self.resolve_ids = resolve_ids
+        # When set, every upsert also increments this field so cached representations (ETags) are invalidated.
+        self.version_field = version_field
+
+        self._pending: List[Tuple[UpdateOne, Any, str]] = []
+        self._refs_by_source: Dict[str, List[Dict[str, Any]]] = {}
+        self.failed_sources = set()
+        self.batch_count = 0
+        self.totals = {"upserted": 0, "matched": 0, "modified": 0, "failed": 0}
+
+    def add(self, document: Dict[str, Any], source: str):
+        """
+        Queues an upsert of `document` keyed by `key_field`, flushing automatically when the batch is full.
+        """
+        key_value = document[self.key_field]
+        update: Dict[str, Any] = {"$set": document}
+        if self.version_field:
+            update["$inc"] = {self.version_field: 1}
+        self._pending.append((UpdateOne({self.key_field: key_value}, update, upsert=True), key_value, source))
+        self._refs_by_source.setdefault(source, [])
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def refs_for(self, source: str) -> List[Dict[str, Any]]:
+        """
+        Returns the `{"_id", "name"}` references of the documents written for a source file.
+        """
+        return self._refs_by_source.get(source, [])
+
+    def flush(self):
+        """
+        Sends the pending operations as one bulk write and records per-batch timing and counts.
+        """
+        if not self._pending:
+            return
+        batch = self._pending
+        self._pending = []
+        self.batch_count += 1
+
+        failed_indexes = set()
+        started = time.perf_counter()
+        try:
+            result = self.collection.bulk_write([op for op, _, _ in batch], ordered=self.ordered)
+            details = result.bulk_api_result
+        except BulkWriteError as bwe:
+            details = bwe.details
+            write_errors = details.get('writeErrors', [])
+            failed_indexes = {err['index'] for err in write_errors}
+            # An ordered bulk write stops at the first error, so everything after it never ran either.
+            if self.ordered and write_errors:
+                failed_indexes.update(range(min(failed_indexes), len(batch)))
+            for err in write_errors:
+                print(f"   [SYNC ERROR] {self.label} '{batch[err['index']][1]}': {err.get('errmsg')}")
+        except Exception as e:
+            details = {}
+            failed_indexes = set(range(len(batch)))
+            print(f"   [SYNC ERROR] {self.label} batch #{self.batch_count} failed: {e}")
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        upserted_ids = {item['index']: item['_id'] for item in details.get('upserted', [])}
+        batch_stats = {
+            "upserted": details.get('nUpserted', 0),
+            "matched": details.get('nMatched', 0),
+            "modified": details.get('nModified', 0),
+            "failed": len(failed_indexes)
+        }
+        for stat_name, value in batch_stats.items():
+            self.totals[stat_name] += value
+        print(f"   [SYNC BATCH] {self.label} #{self.batch_count}: {len(batch)} ops in {elapsed_ms:.1f} ms | "
+              f"upserted {batch_stats['upserted']} | modified {batch_stats['modified']} | failed {batch_stats['failed']}")
+
+        for index, (_, _, source) in enumerate(batch):
+            if index in failed_indexes:
+                self.failed_sources.add(source)
+        if not self.resolve_ids:
+            return
+
+        # Upserts report their new ids directly; matched documents are resolved with one projected query.
+        ids_by_key: Dict[Any, Any] = {}
+        for index, doc_id in upserted_ids.items():
+            ids_by_key[batch[index][1]] = doc_id
+        unresolved_keys = list({key_value for index, (_, key_value, _) in enumerate(batch)
+                                if index not in failed_indexes and key_value not in ids_by_key})
+        if unresolved_keys:
+            for doc in self.collection.find({self.key_field: {"$in": unresolved_keys}}, {"_id": 1, self.key_field: 1}):
+                ids_by_key.setdefault(doc[self.key_field], doc['_id'])
+
+        for index, (_, key_value, source) in enumerate(batch):
+            if index in failed_indexes or key_value not in ids_by_key:
+                continue
+            self._refs_by_source[source].append({"_id": ids_by_key[key_value], "name": key_value})
+
+    def close(self) -> Dict[str, int]:
+        """
+        Flushes any remaining operations and returns the accumulated totals.
+        """
+        self.flush()
+        return dict(self.totals, batches=self.batch_count)
+
+def sync_data_from_files(force: bool = False, workers: Optional[int] = None, paths: Optional[Iterable[str]] = None):
+    """
+    Performs a disk-to-database synchronization process on application startup.
+    Scans specified directories for .json files, validates them using Pydantic models,
+    and upserts them into MongoDB based on their name identifier.
+
+    A persisted manifest records the size, mtime and SHA-256 of every synced file together with
+    the documents it produced. Files whose fingerprint is unchanged are skipped without being
+    parsed, and documents belonging to deleted files (or entries removed from a file) are deleted.
+    Pass force=True to ignore the manifest and re-sync everything.
+
+    Validated documents are written through SyncBatchWriter (see SYNC_BATCH_SIZE and
+    SYNC_ORDERED_WRITES) and a summary of the run is returned. Changed files are parsed and validated
+    by sync_parsing.iter_parsed_files, fanned out to `workers` processes (SYNC_WORKERS by default).
+
+    When `paths` is given only those files are considered, which is how the live data watcher re-syncs
+    (or reconciles the deletion of) just the files it saw change.
+    """
+    with _sync_lock:
+        return _sync_data_from_files_locked(force, workers, paths)
+
+def _sync_data_from_files_locked(force: bool, workers: Optional[int], paths: Optional[Iterable[str]]):
+    """
+    Body of sync_data_from_files, run while holding the sync lock.
+    """
+    db = db_connector.get_db()
+    if db is None:
+        print("Database not available for data sync.")
+        return
+
+    npcs_collection = db.npcs
+    lore_collection = db.lore_entries
+    manifest_collection = db[SYNC_MANIFEST_COLLECTION]
+    collections_by_kind = {"lore": lore_collection, "character": npcs_collection}
+
+    # Load the previous manifest into memory, keyed by relative file path.
+    manifest: Dict[str, Dict[str, Any]] = {}
+    for entry in manifest_collection.find({}):
+        manifest[entry['path']] = entry
+
+    discovered: List[Tuple[str, str, bool]] = []
+    discovered.extend(("lore", path, False) for path in _discover_lore_files())
+    discovered.extend(("character", path, is_pc) for path, is_pc in _discover_character_files())
+
+    # A targeted sync only looks at the requested files; everything else in the manifest is left alone.
+    target_keys: Optional[Set[str]] = None
+    if paths is not None:
+        target_keys = {_manifest_key(path) for path in paths}
+        discovered = [item for item in discovered if _manifest_key(item[1]) in target_keys]
+
+    writers = {
+        "lore": SyncBatchWriter(lore_collection, "Lore"),
+        "character": SyncBatchWriter(npcs_collection, "Characters", version_field="doc_version")
+    }
+    manifest_writer = SyncBatchWriter(manifest_collection, "Manifest", key_field="path", resolve_ids=False)
+
+    # Files parsed this run, waiting for their bulk writes to land before the manifest is updated.
+    pending_entries: List[Tuple[str, str, Dict[str, Any]]] = []
+    # Memories found in character files, by file and character name; they go to the memories collection, not the document.
+    file_memories: Dict[str, Dict[str, List[Any]]] = {}
+    seen_keys = set()
+    skipped_count = 0
+    pc_count = 0
+
+    print("[Data Sync] Syncing lore and character data...")
+    work_items: List[Tuple[str, str, bool, Optional[str]]] = []
+    for kind, file_path, is_pc_folder in discovered:
+        key = _manifest_key(file_path)
+        seen_keys.add(key)
+        previous = manifest.get(key)
+
+        try:
+            stat_result = os.stat(file_path)
+        except OSError as e:
+            print(f"[Data Sync] Could not stat {os.path.basename(file_path)}: {e}")
+            continue
+
+        # Fast path: identical size and mtime means the file was not touched since the last sync.
+        if (not force and previous is not None and previous.get('kind') == kind
+                and previous.get('size') == stat_result.st_size
+                and previous.get('mtime_ns') == stat_result.st_mtime_ns):
+            skipped_count += 1
+            continue
+
+        previous_hash = previous.get('sha256') if (not force and previous is not None and previous.get('kind') == kind) else None
+        work_items.append((kind, file_path, is_pc_folder, previous_hash))
+
+    worker_count = app_config.SYNC_WORKERS if workers is None else workers
+    if worker_count <= 0:
+        worker_count = os.cpu_count() or 1
+    if work_items:
+        print(f"[Data Sync] Parsing {len(work_items)} changed file(s) with {min(worker_count, len(work_items))} worker(s)...")
+
+    # Parsed results stream back here as they complete; this loop is the only writer.
+    for parsed in iter_parsed_files(work_items, worker_count):
+        kind = parsed['kind']
+        file_name = os.path.basename(parsed['file_path'])
+        key = _manifest_key(parsed['file_path'])
+        previous = manifest.get(key)
+
+        if parsed['error']:
+            if kind == "lore":
+                print(f"[Data Sync] Lore Error in {file_name}: {parsed['error']}")
+            else:
+                print(f"   [VTT ERROR] Failed to load {file_name}: {parsed['error']}")
+            continue
+
+        fingerprint = {
+            "kind": kind,
+            "size": parsed['size'],
+            "mtime_ns": parsed['mtime_ns'],
+            "sha256": parsed['sha256'],
+            "synced_at": datetime.utcnow()
+        }
+
+        # The file was touched but its content is identical: refresh the stat fields only.
+        if parsed['unchanged']:
+            manifest_writer.add({"path": key, **fingerprint}, key)
+            previous.update(fingerprint)
+            skipped_count += 1
+            continue
+
+        documents = parsed['documents']
+        if kind == "character" and documents:
+            is_pc = documents[0]['character_type'] == 'Player Character'
+            if is_pc: pc_count += 1
+            print(f"   [VTT LOAD] {'PC' if is_pc else 'NPC'} Loaded: {documents[0]['name']}")
+
+        for document in documents:
+            if kind == "character":
+                memories = document.pop('memories', None)
+                if memories:
+                    file_memories.setdefault(key, {})[document['name']] = memories
+            writers[kind].add(document, key)
+        pending_entries.append((kind, key, fingerprint))
+
+    write_totals = {kind: writer.close() for kind, writer in writers.items()}
+
+    # Document ids that may have lost their source file, checked against the final manifest at the end.
+    orphan_candidates: Dict[str, Dict[Any, str]] = {"lore": {}, "character": {}}
+    changed_names: Dict[str, Set[str]] = {"lore": set(), "character": set()}
+    synced_count = 0
+    failed_files = 0
+    for kind, key, fingerprint in pending_entries:
+        # Leave the previous manifest entry in place so a failed file is retried on the next sync.
+        if key in writers[kind].failed_sources:
+            failed_files += 1
+            continue
+        document_refs = writers[kind].refs_for(key)
+        previous = manifest.get(key)
+        changed_names[kind].update(ref['name'] for ref in document_refs)
+        # Importing is keyed by memory_id, so memories added in play are kept and re-syncing a file adds nothing twice.
+        for ref in document_refs:
+            if ref['name'] in file_memories.get(key, {}):
+                import_memories(db, ref['_id'], file_memories[key][ref['name']])
+
+        # Anything the file produced last time but not this time may now be orphaned.
+        if previous is not None:
+            previous_kind = previous.get('kind', kind)
+            new_ids = {ref['_id'] for ref in document_refs}
+            for ref in previous.get('documents', []):
+                if ref['_id'] not in new_ids:
+                    orphan_candidates.setdefault(previous_kind, {})[ref['_id']] = ref.get('name')
+
+        entry = {"path": key, "documents": document_refs, **fingerprint}
+        manifest_writer.add(entry, key)
+        manifest[key] = entry
+        synced_count += 1
+
+    # --- Reconcile deleted files ---
+    removed_keys = [k for k in manifest if k not in seen_keys and (target_keys is None or k in target_keys)]
+    for key in removed_keys:
+        entry = manifest.pop(key)
+        for ref in entry.get('documents', []):
+            orphan_candidates.setdefault(entry.get('kind', 'character'), {})[ref['_id']] = ref.get('name')
+    manifest_writer.close()
+    if removed_keys:
+        manifest_collection.delete_many({"path": {"$in": removed_keys}})
+
+    # Only delete documents that no remaining manifest entry still claims (e.g. lore moved between files).
+    claimed_ids = {ref['_id'] for entry in manifest.values() for ref in entry.get('documents', [])}
+    for kind, candidates in orphan_candidates.items():
+        stale_ids = [doc_id for doc_id in candidates if doc_id not in claimed_ids]
+        if not stale_ids:
+            continue
+        result = collections_by_kind[kind].delete_many({"_id": {"$in": stale_ids}})
+        if kind == "character":
+            delete_npc_memories(db, stale_ids)
+        for doc_id in stale_ids:
+            print(f"   [SYNC REMOVE] {kind.title()} no longer on disk: {candidates[doc_id]}")
+            if candidates[doc_id]:
+                changed_names[kind].add(candidates[doc_id])
+        print(f"[Data Sync] Removed {result.deleted_count} {kind} document(s) without a source file.")
+
+    for kind, totals in write_totals.items():
+        print(f"[Data Sync] {kind.title()} writes: {totals['batches']} batch(es) | upserted {totals['upserted']} | "
+              f"modified {totals['modified']} | failed {totals['failed']}")
+    print(f"[Data Sync] Finished. Synced: {synced_count} | Unchanged: {skipped_count} | Failed: {failed_files} | "
+          f"Files Removed: {len(removed_keys)} | PCs Loaded: {pc_count}")
+    notify_sync_listeners(changed_names)
+    return {
+        "synced": synced_count,
+        "unchanged": skipped_count,
+        "failed": failed_files,
+        "removed": len(removed_keys),
+        "writes": write_totals
+    }
@@ -0,0 +1,153 @@
+# server/dialogue_stream.py
+"""
+Dialogue Streaming Module.
+Splits a streamed model reply into what the table sees first and what the GM tools need: dialogue
+text is forwarded token by token, and once the NPC_ACTION / PLAYER_CHECK / GENERATED_TOPICS /
+STANDING_CHANGE_SUGGESTION_FOR_ / JUSTIFICATION block begins, each completed line is emitted as a
+structured suggestion. Also owns the line-level suggestion grammar shared with app.parse_ai_suggestions.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from serialization import dumps_bytes
+
+def suggestion_keywords(suggestion_pc_key: str) -> List[str]:
+    """
+    The line prefixes that start the suggestion block, in the order the prompt requests them.
+    """
+    return [
+        "NPC_ACTION:",
+        "PLAYER_CHECK:",
+        "GENERATED_TOPICS:",
+        f"STANDING_CHANGE_SUGGESTION_FOR_{suggestion_pc_key}:",
+        "JUSTIFICATION:"
+    ]
+
+def suggestion_pc_key(speaking_pc_id: Optional[str]) -> str:
+    """
+    The PC id the standing suggestion is keyed on; 'PLAYER' when nobody in particular is speaking.
+    """
+    return speaking_pc_id if speaking_pc_id and speaking_pc_id.strip() != "" else "PLAYER"
+
+def _split_list(value: str) -> List[str]:
+    if value.lower() == 'none':
+        return []
+    return [part.strip() for part in value.split(';') if part.strip()]
+
+def parse_suggestion_line(stripped_line: str, suggestion_pc_key_for_parsing: str) -> Optional[Tuple[str, Any]]:
+    """
+    Parses one stripped line of the suggestion block into (field, value), or None for other lines.
+    Fields: npc_action, player_check, generated_topics (lists), new_standing, justification (strings).
+    """
+    standing_keyword = f"STANDING_CHANGE_SUGGESTION_FOR_{suggestion_pc_key_for_parsing}:"
+    if stripped_line.startswith("NPC_ACTION:"):
+        return "npc_action", _split_list(stripped_line.replace("NPC_ACTION:", "").strip())
+    if stripped_line.startswith("PLAYER_CHECK:"):
+        return "player_check", _split_list(stripped_line.replace("PLAYER_CHECK:", "").strip())
+    if stripped_line.startswith("GENERATED_TOPICS:"):
+        return "generated_topics", _split_list(stripped_line.replace("GENERATED_TOPICS:", "").strip())
+    if stripped_line.startswith(standing_keyword):
+        raw_standing_val = stripped_line.replace(standing_keyword, "").strip()
+        return "new_standing", raw_standing_val.replace('[', '').replace(']', '').replace('"', '').replace("'", "").strip()
+    if stripped_line.startswith("JUSTIFICATION:"):
+        return "justification", stripped_line.replace("JUSTIFICATION:", "").strip()
+    return None
+
+class IncrementalSuggestionParser:
+    """
+    Consumes model output chunk by chunk and returns ("token", text) and ("suggestion", {...}) events.
+    Dialogue text is released as soon as it cannot be the beginning of a suggestion keyword, so only
+    a few characters at the start of a line are ever held back.
+    """
+
+    def __init__(self, speaking_pc_id: Optional[str]):
+        self.pc_key = suggestion_pc_key(speaking_pc_id)
+        self.keywords = suggestion_keywords(self.pc_key)
+        self.in_suggestions = False
+        self.full_text_parts: List[str] = []
+        self._line = ""
+
+    @property
+    def full_text(self) -> str:
+        return "".join(self.full_text_parts)
+
+    def _could_start_keyword(self, partial_line: str) -> bool:
+        stripped = partial_line.lstrip()
+        return any(keyword.startswith(stripped) or stripped.startswith(keyword) for keyword in self.keywords)
+
+    def _starts_keyword(self, line: str) -> bool:
+        stripped = line.strip()
+        return any(stripped.startswith(keyword) for keyword in self.keywords)
+
+    def _suggestion_event(self, line: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        parsed = parse_suggestion_line(line.strip(), self.pc_key)
+        if parsed is None:
+            return None
+        return "suggestion", {"field": parsed[0], "value": parsed[1]}
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Adds a chunk of model output and returns the events it completes.
+        """
+        events: List[Tuple[str, Any]] = []
+        if not chunk:
+            return events
+        self.full_text_parts.append(chunk)
+        self._line += chunk
+
+        while True:
+            newline_index = self._line.find("\n")
+            if newline_index == -1:
+                break
+            line, self._line = self._line[:newline_index], self._line[newline_index + 1:]
+            if not self.in_suggestions and self._starts_keyword(line):
+                self.in_suggestions = True
+            if self.in_suggestions:
+                event = self._suggestion_event(line)
+                if event:
+                    events.append(event)
+            else:
+                events.append(("token", line + "\n"))
+
+        # Release the unfinished dialogue line unless it might still turn into a keyword.
+        if not self.in_suggestions and self._line and not self._could_start_keyword(self._line):
+            events.append(("token", self._line))
+            self._line = ""
+        return events
+
+    def finish(self) -> List[Tuple[str, Any]]:
+        """
+        Flushes whatever is left once the model stream ends.
+        """
+        events: List[Tuple[str, Any]] = []
+        line, self._line = self._line, ""
+        if not line:
+            return events
+        if not self.in_suggestions and self._starts_keyword(line):
+            self.in_suggestions = True
+        if self.in_suggestions:
+            event = self._suggestion_event(line)
+            if event:
+                events.append(event)
+        else:
+            events.append(("token", line))
+        return events
+
+def format_sse_event(event: str, data: Any, event_id: Optional[Any] = None) -> bytes:
+    """
+    Encodes one Server-Sent Event. The payload is single-line JSON, so one `data:` field suffices.
+    An event_id is sent back by a reconnecting EventSource as the Last-Event-ID header.
+    """
+    id_field = b"id: " + str(event_id).encode('utf-8') + b"\n" if event_id is not None else b""
+    return id_field + b"event: " + event.encode('utf-8') + b"\ndata: " + dumps_bytes(data) + b"\n\n"
+
+def format_parser_event(event_name: str, event_data: Any) -> bytes:
+    """
+    Encodes an IncrementalSuggestionParser event as SSE: tokens as {"text": ...}, suggestions as {"field", "value"}.
+    """
+    return format_sse_event(event_name, {"text": event_data} if event_name == "token" else event_data)
+
+# Headers that keep proxies and browsers from buffering or caching an event stream.
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"
+}
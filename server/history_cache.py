@@ -0,0 +1,175 @@
+# server/history_cache.py
+"""
+History File Cache Module.
+Keeps the parsed content of character history files (including the Scriptly transcript parse) and
+each character's combined history string in memory, so detail views and dialogue turns do not reread
+and reparse the files. File entries are keyed by the file's on-disk name (the basename of the
+resolved path, which is what the data watcher reports) and validated by (path, mtime, size). While
+the live data watcher is running its change notifications are trusted and a cache hit touches the
+disk not at all; without the watcher every hit is revalidated with a single os.stat. Entries are
+evicted least recently used first once their total size exceeds HISTORY_CACHE_MAX_BYTES.
+"""
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from config import config as app_config
+from data_watcher import is_data_watcher_running
+
+# Placeholder contents recorded for files that cannot be used, matching what the character views show.
+HISTORY_FILE_MISSING = "[File not found]"
+HISTORY_FILE_UNREADABLE = "[Error loading content]"
+
+@dataclass
+class HistoryFileEntry:
+    path: str
+    mtime_ns: Optional[int]
+    size: Optional[int]
+    # None when the file is missing or could not be read (see `placeholder`).
+    content: Optional[str]
+    placeholder: Optional[str]
+    generation: int
+    nbytes: int
+
+@dataclass
+class CombinedHistoryEntry:
+    # (filename, generation) of every file the combined string was built from.
+    sources: Tuple[Tuple[str, int], ...]
+    contents_loaded: Dict[str, str]
+    combined: str
+    nbytes: int
+
+def _file_signature(path: str) -> Tuple[Optional[int], Optional[int]]:
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None, None
+    if not os.path.isfile(path):
+        return None, None
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+class HistoryCache:
+    """
+    Byte-bounded LRU of history file contents and combined per-character history strings.
+    `loader(path)` reads and parses one file; it is only called on a miss.
+    """
+
+    def __init__(self, loader: Callable[[str], str], max_bytes: Optional[int] = None):
+        self.loader = loader
+        self.max_bytes = app_config.HISTORY_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._entries: "OrderedDict[Tuple[str, object], object]" = OrderedDict()
+        self._total_bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.stats = {"file_hits": 0, "file_loads": 0, "combined_hits": 0, "combined_builds": 0, "evictions": 0, "invalidated": 0}
+
+    def _store(self, key: Tuple[str, object], entry):
+        # Caller holds the lock.
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._total_bytes -= previous.nbytes
+        self._entries[key] = entry
+        self._total_bytes += entry.nbytes
+        # The newest entry is always kept, even if it alone exceeds the budget.
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._total_bytes -= evicted.nbytes
+            self.stats["evictions"] += 1
+
+    def _discard(self, key: Tuple[str, object]) -> bool:
+        # Caller holds the lock.
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._total_bytes -= entry.nbytes
+        return True
+
+    def _is_fresh(self, entry: HistoryFileEntry) -> bool:
+        if is_data_watcher_running():
+            return True
+        return _file_signature(entry.path) == (entry.mtime_ns, entry.size)
+
+    def get_file(self, filename: str, path: str) -> HistoryFileEntry:
+        """
+        Returns the cached entry for one history file, loading (and parsing) it on a miss or after it changed.
+        `filename` is the name the character lists; the entry is keyed by the name of the file actually read.
+        """
+        key = ("file", os.path.basename(path))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.path == path:
+                self._entries.move_to_end(key)
+        if entry is not None and entry.path == path and self._is_fresh(entry):
+            with self._lock:
+                self.stats["file_hits"] += 1
+            return entry
+
+        mtime_ns, size = _file_signature(path)
+        content, placeholder = None, None
+        if mtime_ns is None:
+            placeholder = HISTORY_FILE_MISSING
+        else:
+            try:
+                content = self.loader(path)
+            except Exception as e:
+                print(f"[History Cache] Could not load {filename}: {e}")
+                placeholder = HISTORY_FILE_UNREADABLE
+        with self._lock:
+            self._generation += 1
+            entry = HistoryFileEntry(path, mtime_ns, size, content, placeholder, self._generation,
+                                     len(content.encode('utf-8')) if content else 0)
+            self.stats["file_loads"] += 1
+            self._store(key, entry)
+        return entry
+
+    def load(self, filenames: List[str], resolve_path: Callable[[str], str]) -> Tuple[Dict[str, str], str]:
+        """
+        Returns ({filename: content or placeholder}, combined history string) for a character's history files.
+        The combined string is reused as long as none of its files changed.
+        """
+        file_entries = [(filename, self.get_file(filename, resolve_path(filename))) for filename in filenames]
+        sources = tuple((filename, entry.generation) for filename, entry in file_entries)
+        combined_key = ("combined", tuple(filenames))
+        with self._lock:
+            cached = self._entries.get(combined_key)
+            if cached is not None and cached.sources == sources:
+                self._entries.move_to_end(combined_key)
+                self.stats["combined_hits"] += 1
+                return dict(cached.contents_loaded), cached.combined
+
+        contents_loaded: Dict[str, str] = {}
+        combined_parts: List[str] = []
+        for filename, entry in file_entries:
+            if entry.content is None:
+                contents_loaded[filename] = entry.placeholder
+                continue
+            contents_loaded[filename] = entry.content
+            combined_parts.append(f"--- From History File: {filename} ---\n{entry.content}\n")
+        combined = "\n".join(combined_parts).strip() if combined_parts else "No history content."
+        with self._lock:
+            self.stats["combined_builds"] += 1
+            # The per-file contents are shared with the file entries; only the combined string adds bytes.
+            self._store(combined_key, CombinedHistoryEntry(sources, contents_loaded, combined, len(combined.encode('utf-8'))))
+        return dict(contents_loaded), combined
+
+    def invalidate_changes(self, changes: Dict[str, Set[str]]):
+        """
+        Sync listener: drops the entries of history files the data watcher reported as changed (by on-disk name).
+        Combined strings built from them are rebuilt on next use (their source generations no longer match).
+        """
+        changed_files = changes.get("history") or set()
+        with self._lock:
+            for filename in changed_files:
+                if self._discard(("file", filename)):
+                    self.stats["invalidated"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), total_bytes=self._total_bytes, max_bytes=self.max_bytes)
@@ -0,0 +1,86 @@
+# server/http_cache.py
+"""
+HTTP Caching & Compression Module.
+Provides strong ETags derived from document versions, `304 Not Modified` handling for `If-None-Match`,
+and per-request gzip/brotli compression of large responses so refreshing unchanged character sheets
+costs almost no bandwidth or serialization work.
+"""
+import gzip
+import hashlib
+from typing import Any, Optional
+
+from flask import Response, request
+
+from config import config as app_config
+
+# brotli is optional: without it responses are only ever gzip-compressed.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Field incremented on every write to a character document; the basis of its ETag.
+DOC_VERSION_FIELD = 'doc_version'
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/javascript', 'text/html', 'text/css', 'text/plain'}
+
+def version_bump() -> dict:
+    """
+    Update fragment that advances a document's version. Merge it into every update of a versioned document.
+    """
+    return {"$inc": {DOC_VERSION_FIELD: 1}}
+
+def make_strong_etag(*parts: Any) -> str:
+    """
+    Builds a strong entity tag (without quotes) from the values that determine a response body.
+    """
+    return hashlib.sha1("|".join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+def not_modified_response(etag: str) -> Optional[Response]:
+    """
+    Returns an empty 304 response when the request's If-None-Match already names this ETag
+    (in its identity form or any of its compressed variants), otherwise None.
+    """
+    candidates = [etag] + [f"{etag}-{encoding}" for encoding in ('gzip', 'br')]
+    if any(request.if_none_match.contains(candidate) for candidate in candidates):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+    return None
+
+def _negotiate_encoding() -> Optional[str]:
+    """
+    Picks the best supported content coding from Accept-Encoding, honouring q-values (q=0 refuses a coding).
+    """
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+def compress_response(response: Response) -> Response:
+    """
+    `after_request` hook: compresses eligible responses with the negotiated coding.
+    Streams, already-encoded bodies, non-text types and payloads under COMPRESSION_MIN_BYTES are left alone.
+    """
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    body = response.get_data()
+    if len(body) < app_config.COMPRESSION_MIN_BYTES:
+        return response
+
+    encoding = _negotiate_encoding()
+    if encoding is None:
+        return response
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=app_config.BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(body, compresslevel=app_config.GZIP_LEVEL)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    # A strong ETag must differ per representation, so tag the compressed variant with its coding.
+    etag, is_weak = response.get_etag()
+    if etag and not is_weak:
+        response.set_etag(f"{etag}-{encoding}")
+    return response
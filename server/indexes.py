@@ -0,0 +1,160 @@
+# server/indexes.py
+"""
+Index Management Module.
+Declares the MongoDB indexes the application's hot queries depend on, creates them at startup and
+verifies with `explain()` that each hot query is served by an index rather than a collection scan.
+Can also be run directly: `python indexes.py` creates the indexes and prints the query-plan report.
+"""
+import sys
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+from config import config as app_config
+from database import db_connector, SYNC_MANIFEST_COLLECTION
+from job_queue import JOBS_COLLECTION
+from memory_store import MEMORIES_COLLECTION
+from response_cache import RESPONSE_CACHE_COLLECTION
+
+# Indexes required per collection. Names are explicit so the report and drops stay stable.
+REQUIRED_INDEXES: Dict[str, List[IndexModel]] = {
+    "npcs": [
+        # Sync upserts and linked-character lookups match on the character name.
+        IndexModel([("name", ASCENDING)], name="name_1"),
+    ],
+    MEMORIES_COLLECTION: [
+        # Memory pages and dialogue prompts read a character's memories newest first.
+        IndexModel([("npc_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="npc_id_1_timestamp_-1__id_-1"),
+        # Deletes and imports address one memory of a character; imports upsert on it, so it must be unique.
+        IndexModel([("npc_id", ASCENDING), ("memory_id", ASCENDING)], name="npc_id_1_memory_id_1", unique=True),
+        # Near-duplicate checks look up a character's memories sharing an LSH band with the new one (multikey).
+        IndexModel([("npc_id", ASCENDING), ("lsh_bands", ASCENDING)], name="npc_id_1_lsh_bands_1"),
+    ],
+    "lore_entries": [
+        # Sync upserts and linked-lore summaries match on the lore name.
+        IndexModel([("name", ASCENDING)], name="name_1"),
+        # The lore update and delete endpoints address entries by lore_id.
+        IndexModel([("lore_id", ASCENDING)], name="lore_id_1"),
+    ],
+    SYNC_MANIFEST_COLLECTION: [
+        IndexModel([("path", ASCENDING)], name="path_1", unique=True),
+    ],
+    JOBS_COLLECTION: [
+        # Workers claim the oldest runnable job, and reclaim running jobs whose lease expired.
+        IndexModel([("status", ASCENDING), ("run_after", ASCENDING)], name="status_1_run_after_1"),
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)], name="status_1_lease_expires_at_1"),
+        # Succeeded and dead jobs expire after the retention period; unfinished jobs have no finished_at and are kept.
+        IndexModel([("finished_at", ASCENDING)], name="finished_at_ttl", expireAfterSeconds=app_config.JOB_RETENTION_SECONDS),
+    ],
+    RESPONSE_CACHE_COLLECTION: [
+        # Each cached reply carries its own expiry time; the TTL monitor removes it once that passes.
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+# Representative shapes of every hot query. Probe values never match real documents; only the plan matters.
+HOT_QUERIES: List[Dict[str, Any]] = [
+    {"name": "sync upsert character by name", "collection": "npcs", "filter": {"name": "__index_probe__"}},
+    {"name": "recent memories by character", "collection": MEMORIES_COLLECTION, "filter": {"npc_id": "__index_probe__"}},
+    {"name": "near-duplicate memory candidates", "collection": MEMORIES_COLLECTION, "filter": {"npc_id": "__index_probe__", "lsh_bands": {"$in": [1, 2]}}},
+    {"name": "delete memory by memory_id", "collection": MEMORIES_COLLECTION, "filter": {"npc_id": "__index_probe__", "memory_id": "__index_probe__"}},
+    {"name": "sync upsert lore by name", "collection": "lore_entries", "filter": {"name": "__index_probe__"}},
+    {"name": "linked lore summary by names", "collection": "lore_entries", "filter": {"name": {"$in": ["__index_probe__", "__index_probe_2__"]}}},
+    {"name": "lore endpoints by lore_id", "collection": "lore_entries", "filter": {"lore_id": "__index_probe__"}},
+    {"name": "sync manifest by path", "collection": SYNC_MANIFEST_COLLECTION, "filter": {"path": "__index_probe__"}},
+    {"name": "job worker claim", "collection": JOBS_COLLECTION, "filter": {"$or": [
+        {"status": "queued", "run_after": {"$lte": "__index_probe__"}},
+        {"status": "running", "lease_expires_at": {"$lte": "__index_probe__"}}
+    ]}},
+]
+
+def ensure_indexes(db=None) -> Dict[str, List[str]]:
+    """
+    Creates every index in REQUIRED_INDEXES that does not exist yet (create_indexes is idempotent).
+    Returns the index names created or confirmed per collection.
+    """
+    db = db if db is not None else db_connector.get_db()
+    if db is None:
+        print("[Indexes] Database not available; skipping index creation.")
+        return {}
+
+    created: Dict[str, List[str]] = {}
+    for collection_name, index_models in REQUIRED_INDEXES.items():
+        try:
+            created[collection_name] = db[collection_name].create_indexes(index_models)
+        except PyMongoError as e:
+            print(f"[Indexes] Could not create indexes on '{collection_name}': {e}")
+            created[collection_name] = []
+    return created
+
+def _collect_plan_stages(plan: Any, stages: List[Dict[str, Any]]):
+    """
+    Walks a (possibly nested) explain plan and collects every stage dict it contains.
+    """
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan)
+        for value in plan.values():
+            _collect_plan_stages(value, stages)
+    elif isinstance(plan, list):
+        for value in plan:
+            _collect_plan_stages(value, stages)
+
+def verify_query_plans(db=None) -> List[Dict[str, Any]]:
+    """
+    Explains each query in HOT_QUERIES and reports the winning plan's stages and index.
+    Entries with `collection_scan` set to True are regressions to a full collection scan.
+    """
+    db = db if db is not None else db_connector.get_db()
+    if db is None:
+        return []
+
+    report: List[Dict[str, Any]] = []
+    for query in HOT_QUERIES:
+        entry: Dict[str, Any] = {
+            "query": query["name"],
+            "collection": query["collection"],
+            "filter": query["filter"],
+            "stages": [],
+            "index_names": [],
+            "collection_scan": None,
+            "error": None
+        }
+        try:
+            explanation = db[query["collection"]].find(query["filter"]).explain()
+            winning_plan = explanation.get('queryPlanner', {}).get('winningPlan', {})
+            stages: List[Dict[str, Any]] = []
+            _collect_plan_stages(winning_plan, stages)
+            entry["stages"] = [stage['stage'] for stage in stages]
+            entry["index_names"] = sorted({stage['indexName'] for stage in stages if stage.get('indexName')})
+            entry["collection_scan"] = 'COLLSCAN' in entry["stages"]
+        except Exception as e:
+            entry["error"] = str(e)
+        report.append(entry)
+    return report
+
+def print_query_plan_report(report: List[Dict[str, Any]]) -> bool:
+    """
+    Prints a one-line summary per hot query. Returns True when no query regressed to a collection scan.
+    """
+    healthy = True
+    for entry in report:
+        if entry["error"]:
+            healthy = False
+            print(f"   [INDEX ERROR] {entry['query']} ({entry['collection']}): {entry['error']}")
+        elif entry["collection_scan"]:
+            healthy = False
+            print(f"   [INDEX WARNING] {entry['query']} ({entry['collection']}) is a COLLECTION SCAN: {' -> '.join(entry['stages'])}")
+        else:
+            print(f"   [INDEX OK] {entry['query']} ({entry['collection']}): {', '.join(entry['index_names']) or ' -> '.join(entry['stages'])}")
+    return healthy
+
+if __name__ == '__main__':
+    # CLI: create the declared indexes, then print the query-plan report. Exit code 1 flags a regression.
+    if db_connector.get_db() is None:
+        print("CRITICAL: MongoDB connection failed.")
+        sys.exit(2)
+    for collection_name, index_names in ensure_indexes().items():
+        print(f"[Indexes] {collection_name}: {', '.join(index_names) or 'none'}")
+    sys.exit(0 if print_query_plan_report(verify_query_plans()) else 1)
@@ -0,0 +1,319 @@
+# server/job_queue.py
+"""
+Background Job Queue Module.
+A small MongoDB-backed work queue for tasks that should not hold up an HTTP response (such as
+summarizing a dialogue exchange into an NPC memory). Jobs are persisted, so queued work survives
+a restart. Workers claim jobs with a lease that a heartbeat renews while the handler runs, so only a
+crashed worker's job is picked up again; a job whose worker keeps dying is dead-lettered once its
+lease expires with its attempts used up. Failed
+jobs are retried with exponential backoff, and jobs that exhaust their attempts are parked with
+status 'dead' (the dead-letter state) for inspection or a manual retry.
+"""
+import os
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from config import config as app_config
+from database import db_connector
+
+JOBS_COLLECTION = 'jobs'
+
+# Job lifecycle: queued -> running -> succeeded, or back to queued (retry) until max_attempts, then dead.
+JOB_STATUS_QUEUED = 'queued'
+JOB_STATUS_RUNNING = 'running'
+JOB_STATUS_SUCCEEDED = 'succeeded'
+JOB_STATUS_DEAD = 'dead'
+
+# Registered handlers: job type -> callable(payload, job_id) returning the job's result document.
+_job_handlers: Dict[str, Callable[[Dict[str, Any], str], Any]] = {}
+
+def register_job_handler(job_type: str, handler: Callable[[Dict[str, Any], str], Any]):
+    """
+    Registers the function that executes jobs of `job_type`. Raising from the handler marks the attempt as failed.
+    """
+    _job_handlers[job_type] = handler
+
+def _jobs_collection(db=None):
+    db = db if db is not None else db_connector.get_db()
+    return db[JOBS_COLLECTION] if db is not None else None
+
+def enqueue_job(job_type: str, payload: Dict[str, Any], max_attempts: Optional[int] = None, db=None) -> str:
+    """
+    Persists a new job and wakes the workers. Returns the job id as a string.
+    Raises PyMongoError if the job could not be stored.
+    """
+    collection = _jobs_collection(db)
+    if collection is None:
+        raise PyMongoError("Database not available")
+    now = datetime.utcnow()
+    job_doc = {
+        "type": job_type,
+        "payload": payload,
+        "status": JOB_STATUS_QUEUED,
+        "attempts": 0,
+        "max_attempts": max_attempts or app_config.JOB_MAX_ATTEMPTS,
+        "run_after": now,
+        "lease_expires_at": None,
+        "worker_id": None,
+        "last_error": None,
+        "result": None,
+        "created_at": now,
+        "updated_at": now,
+        "finished_at": None
+    }
+    job_id = collection.insert_one(job_doc).inserted_id
+    if job_worker_pool is not None:
+        job_worker_pool.wake()
+    return str(job_id)
+
+def get_job(job_id_str: str, db=None) -> Optional[Dict[str, Any]]:
+    """
+    Fetches a job document by id, or None if the id is invalid or unknown.
+    """
+    collection = _jobs_collection(db)
+    if collection is None:
+        return None
+    try:
+        job_id = ObjectId(job_id_str)
+    except Exception:
+        return None
+    return collection.find_one({"_id": job_id})
+
+def retry_job(job_id_str: str, db=None) -> bool:
+    """
+    Moves a dead-lettered job back to the queue with a fresh attempt budget. Returns True if a job was requeued.
+    """
+    collection = _jobs_collection(db)
+    if collection is None:
+        return False
+    try:
+        job_id = ObjectId(job_id_str)
+    except Exception:
+        return False
+    now = datetime.utcnow()
+    result = collection.update_one(
+        {"_id": job_id, "status": JOB_STATUS_DEAD},
+        {"$set": {"status": JOB_STATUS_QUEUED, "attempts": 0, "run_after": now, "updated_at": now, "finished_at": None}}
+    )
+    if result.modified_count and job_worker_pool is not None:
+        job_worker_pool.wake()
+    return bool(result.modified_count)
+
+def retry_delay_seconds(attempts: int) -> float:
+    """
+    Exponential backoff before the next attempt: base, 2x base, 4x base, ... capped at JOB_RETRY_MAX_SECONDS.
+    """
+    return min(app_config.JOB_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0)), app_config.JOB_RETRY_MAX_SECONDS)
+
+def dead_letter_expired_jobs(db=None) -> int:
+    """
+    Dead-letters running jobs whose lease expired after their last allowed attempt: their worker died
+    (killed, out of memory) on every attempt, so handing them out again would never end.
+    Returns the number of jobs parked.
+    """
+    collection = _jobs_collection(db)
+    if collection is None:
+        return 0
+    now = datetime.utcnow()
+    result = collection.update_many(
+        {"status": JOB_STATUS_RUNNING, "lease_expires_at": {"$lte": now},
+         "$expr": {"$gte": ["$attempts", "$max_attempts"]}},
+        {"$set": {"status": JOB_STATUS_DEAD, "last_error": "Lease expired: the worker stopped during the last attempt",
+                  "lease_expires_at": None, "updated_at": now, "finished_at": now}}
+    )
+    return result.modified_count
+
+def claim_next_job(worker_id: str, db=None) -> Optional[Dict[str, Any]]:
+    """
+    Atomically claims the oldest runnable job: a queued job whose retry delay has passed, or a running
+    job whose lease expired because its worker died and which has attempts left. The claim takes a
+    lease and counts an attempt.
+    """
+    collection = _jobs_collection(db)
+    if collection is None:
+        return None
+    dead_letter_expired_jobs(db)
+    now = datetime.utcnow()
+    return collection.find_one_and_update(
+        {"$or": [
+            {"status": JOB_STATUS_QUEUED, "run_after": {"$lte": now}},
+            {"status": JOB_STATUS_RUNNING, "lease_expires_at": {"$lte": now},
+             "$expr": {"$lt": ["$attempts", "$max_attempts"]}}
+        ]},
+        {
+            "$set": {
+                "status": JOB_STATUS_RUNNING,
+                "worker_id": worker_id,
+                "lease_expires_at": now + timedelta(seconds=app_config.JOB_LEASE_SECONDS),
+                "updated_at": now
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("run_after", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+def renew_job_lease(job: Dict[str, Any], db=None) -> bool:
+    """
+    Extends the lease of a job this worker still holds. Returns False once the job is no longer its own.
+    """
+    now = datetime.utcnow()
+    result = _jobs_collection(db).update_one(
+        {"_id": job["_id"], "worker_id": job["worker_id"], "status": JOB_STATUS_RUNNING},
+        {"$set": {"lease_expires_at": now + timedelta(seconds=app_config.JOB_LEASE_SECONDS), "updated_at": now}}
+    )
+    return bool(result.matched_count)
+
+class JobLeaseHeartbeat:
+    """
+    Renews a claimed job's lease every third of JOB_LEASE_SECONDS while its handler runs, so a long job
+    (compaction, a dedupe pass over every character) is never reclaimed by another worker mid-run.
+    """
+
+    def __init__(self, job: Dict[str, Any], db=None, interval: Optional[float] = None):
+        self.job = job
+        self.db = db
+        self.interval = app_config.JOB_LEASE_SECONDS / 3 if interval is None else interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._beat, name=f"job-lease-{self.job['_id']}", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop_event.set()
+        self._thread.join(timeout=5)
+        return False
+
+    def _beat(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                if not renew_job_lease(self.job, self.db):
+                    return
+            except PyMongoError as e:
+                # Keep trying; the lease only lapses if renewals keep failing for JOB_LEASE_SECONDS.
+                print(f"[Jobs] Could not renew the lease of job {self.job['_id']}: {e}")
+
+def complete_job(job: Dict[str, Any], result: Any, db=None):
+    """
+    Records a successful run. The worker id guard ignores a late finish after the lease moved to another worker.
+    """
+    now = datetime.utcnow()
+    _jobs_collection(db).update_one(
+        {"_id": job["_id"], "worker_id": job["worker_id"], "status": JOB_STATUS_RUNNING},
+        {"$set": {"status": JOB_STATUS_SUCCEEDED, "result": result, "last_error": None,
+                  "lease_expires_at": None, "updated_at": now, "finished_at": now}}
+    )
+
+def fail_job(job: Dict[str, Any], error: str, db=None) -> str:
+    """
+    Records a failed attempt: requeues the job with backoff, or dead-letters it once max_attempts is reached.
+    Returns the job's new status.
+    """
+    now = datetime.utcnow()
+    if job["attempts"] >= job.get("max_attempts", app_config.JOB_MAX_ATTEMPTS):
+        update = {"status": JOB_STATUS_DEAD, "last_error": error, "lease_expires_at": None,
+                  "updated_at": now, "finished_at": now}
+    else:
+        update = {"status": JOB_STATUS_QUEUED, "last_error": error, "lease_expires_at": None, "updated_at": now,
+                  "run_after": now + timedelta(seconds=retry_delay_seconds(job["attempts"]))}
+    _jobs_collection(db).update_one(
+        {"_id": job["_id"], "worker_id": job["worker_id"], "status": JOB_STATUS_RUNNING},
+        {"$set": update}
+    )
+    return update["status"]
+
+def run_job(job: Dict[str, Any], db=None) -> str:
+    """
+    Executes one claimed job with its registered handler and records the outcome. Returns the resulting status.
+    """
+    handler = _job_handlers.get(job["type"])
+    if handler is None:
+        # No retry can fix an unknown job type; dead-letter it straight away.
+        job = dict(job, attempts=job.get("max_attempts", app_config.JOB_MAX_ATTEMPTS))
+        return fail_job(job, f"No handler registered for job type '{job['type']}'", db)
+    try:
+        with JobLeaseHeartbeat(job, db):
+            result = handler(job.get("payload") or {}, str(job["_id"]))
+    except Exception as e:
+        traceback.print_exc()
+        status = fail_job(job, f"{type(e).__name__}: {e}", db)
+        print(f"[Jobs] {job['type']} job {job['_id']} failed (attempt {job['attempts']}): {e} -> {status}")
+        return status
+    complete_job(job, result, db)
+    return JOB_STATUS_SUCCEEDED
+
+class JobWorkerPool:
+    """
+    Background threads that claim and run jobs. Workers sleep until a job is enqueued or the poll
+    interval elapses (the poll picks up retries whose backoff expired and leases that timed out).
+    """
+
+    def __init__(self, worker_count: Optional[int] = None, poll_interval: Optional[float] = None):
+        self.worker_count = max(1, app_config.JOB_WORKERS if worker_count is None else worker_count)
+        self.poll_interval = app_config.JOB_POLL_SECONDS if poll_interval is None else poll_interval
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop_event.clear()
+        for index in range(self.worker_count):
+            thread = threading.Thread(target=self._work_loop, args=(f"{self._worker_prefix}:{index}",), name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"[Jobs] Started {self.worker_count} worker(s) (poll {self.poll_interval}s, handlers: {', '.join(sorted(_job_handlers)) or 'none'})")
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake_event.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def wake(self):
+        self._wake_event.set()
+
+    def _work_loop(self, worker_id: str):
+        while not self._stop_event.is_set():
+            try:
+                job = claim_next_job(worker_id)
+            except PyMongoError as e:
+                print(f"[Jobs] Could not claim a job: {e}")
+                job = None
+            if job is not None:
+                try:
+                    run_job(job)
+                except PyMongoError as e:
+                    # The outcome could not be recorded; the lease expiry hands the job to a worker again.
+                    print(f"[Jobs] Could not record the outcome of job {job['_id']}: {e}")
+                continue
+            self._wake_event.wait(self.poll_interval)
+            self._wake_event.clear()
+
+# Module-level pool shared by the Flask and ASGI apps.
+job_worker_pool: Optional[JobWorkerPool] = None
+
+def start_job_workers() -> Optional[JobWorkerPool]:
+    """
+    Starts the shared worker pool if JOB_WORKERS_ENABLED is set. Safe to call more than once.
+    """
+    global job_worker_pool
+    if not app_config.JOB_WORKERS_ENABLED:
+        return None
+    if job_worker_pool is None:
+        job_worker_pool = JobWorkerPool()
+    job_worker_pool.start()
+    return job_worker_pool
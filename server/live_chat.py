@@ -0,0 +1,121 @@
+# server/live_chat.py
+"""
+Live Chat Buffer Module.
+Holds the most recent live session chat lines (ingested from the Discord bot) in a bounded ring
+buffer. Every line gets a sequence number, so clients fetch only the lines after the last one they
+have (`since`) instead of the whole buffer, and waiters (long-poll requests, SSE streams, and their
+async counterparts) sleep until a line arrives rather than re-polling.
+
+Sequence numbers keep increasing across clears. A client whose position predates a clear, points past
+the newest line (the server restarted) or fell behind lines the ring already dropped is told to
+`reset` and receives the whole buffer instead; so is a client without a position (a first fetch).
+"""
+import asyncio
+import threading
+from collections import deque
+from dataclasses import dataclass
+from itertools import islice
+from typing import List, Optional, Set, Tuple
+
+from config import config as app_config
+
+@dataclass
+class LiveChatUpdate:
+    # Lines after the client's position, the newest sequence number, and whether the client must
+    # discard what it shows and replace it with these lines.
+    lines: List[str]
+    latest_seq: int
+    reset: bool
+
+class LiveChatBuffer:
+    """
+    A deque of (seq, line) bounded to max_lines, appended under a Condition that wakes blocked
+    waiters; async waiters register an asyncio.Event that is set from the appending thread.
+    """
+
+    def __init__(self, max_lines: Optional[int] = None):
+        self._lines: deque = deque(maxlen=app_config.LIVE_CHAT_MAX_LINES if max_lines is None else max_lines)
+        self._latest_seq = 0
+        self._cleared_through = 0
+        self._condition = threading.Condition()
+        self._async_waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    @property
+    def latest_seq(self) -> int:
+        return self._latest_seq
+
+    def append(self, line: str) -> int:
+        """
+        Adds a line (the oldest falls out once the buffer is full) and wakes every waiter. Returns its seq.
+        """
+        with self._condition:
+            self._latest_seq += 1
+            self._lines.append((self._latest_seq, line))
+            self._condition.notify_all()
+            waiters = list(self._async_waiters)
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+        return self._latest_seq
+
+    def clear(self):
+        # A clear takes a sequence number of its own, so every client positioned before it is told to reset.
+        with self._condition:
+            self._lines.clear()
+            self._latest_seq += 1
+            self._cleared_through = self._latest_seq
+            self._condition.notify_all()
+            waiters = list(self._async_waiters)
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def recent(self, count: int) -> List[str]:
+        # The newest `count` lines, oldest first (the dialogue prompt's live transcript).
+        with self._condition:
+            return [line for _, line in islice(self._lines, max(0, len(self._lines) - count), None)]
+
+    def _update_since(self, since: Optional[int]) -> LiveChatUpdate:
+        # Caller holds the lock. Lines are stored in seq order, so the first wanted line is found by offset.
+        oldest_seq = self._lines[0][0] if self._lines else self._latest_seq + 1
+        reset = since is None or since < self._cleared_through or since > self._latest_seq or since + 1 < oldest_seq
+        start = 0 if reset else since + 1 - oldest_seq
+        return LiveChatUpdate([line for _, line in islice(self._lines, start, None)], self._latest_seq, reset)
+
+    def _has_news(self, since: Optional[int]) -> bool:
+        # Caller holds the lock. Anything a client at `since` should be told about (new lines or a reset).
+        return since is None or since != self._latest_seq
+
+    def since(self, since: Optional[int] = None) -> LiveChatUpdate:
+        """
+        The lines after seq `since` (every line when since is None) without waiting.
+        """
+        with self._condition:
+            return self._update_since(since)
+
+    def wait_since(self, since: Optional[int], timeout: float) -> LiveChatUpdate:
+        """
+        Like `since`, but blocks up to `timeout` seconds for something new when the client is up to date.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._has_news(since), timeout=timeout)
+            return self._update_since(since)
+
+    async def await_since(self, since: Optional[int], timeout: float) -> LiveChatUpdate:
+        """
+        Async variant of wait_since: waits on an asyncio.Event, so no thread is held while idle.
+        """
+        event = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), event)
+        with self._condition:
+            if self._has_news(since):
+                return self._update_since(since)
+            self._async_waiters.add(waiter)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._condition:
+                self._async_waiters.discard(waiter)
+        return self.since(since)
+
+live_chat_buffer = LiveChatBuffer()
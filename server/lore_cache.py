@@ -0,0 +1,108 @@
+# server/lore_cache.py
+"""
+Linked Lore Cache Module.
+Resolves the lore entries a character links by name to the fields the dialogue prompt needs (name
+and description). Entries live in an in-process cache; names not cached yet are fetched together
+with one projected `$in` query, and names with no lore entry are remembered as absent too. The lore
+create/update/delete endpoints and data syncs invalidate the affected names, and a TTL bounds how
+long another process's edits can go unnoticed.
+"""
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+from config import config as app_config
+
+# The only lore fields the linked-lore summary uses.
+LORE_SUMMARY_PROJECTION = {"_id": 0, "name": 1, "description": 1}
+
+def fetch_lore_by_name(db, lore_names: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetches the projected summary fields of every named lore entry with a single `$in` query.
+    """
+    lore_by_name: Dict[str, Dict[str, Any]] = {}
+    if not lore_names:
+        return lore_by_name
+    for lore_entry_doc in db.lore_entries.find({"name": {"$in": lore_names}}, LORE_SUMMARY_PROJECTION):
+        lore_by_name.setdefault(lore_entry_doc.get('name'), lore_entry_doc)
+    return lore_by_name
+
+class LoreCache:
+    """
+    Name -> projected lore document (or None for a name with no entry), each with an expiry time.
+    """
+
+    def __init__(self, ttl_seconds: Optional[int] = None):
+        self.ttl_seconds = app_config.LORE_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "queries": 0, "invalidated": 0}
+
+    def _split(self, lore_names: Iterable[str]):
+        # Returns (cached docs by name, names that must be fetched).
+        now = time.monotonic()
+        found: Dict[str, Dict[str, Any]] = {}
+        missing: List[str] = []
+        with self._lock:
+            for lore_name in dict.fromkeys(lore_names):
+                entry = self._entries.get(lore_name)
+                if entry is None or entry[1] <= now:
+                    missing.append(lore_name)
+                    continue
+                if entry[0] is not None:
+                    found[lore_name] = entry[0]
+            self.stats["hits"] += len(found)
+            self.stats["misses"] += len(missing)
+        return found, missing
+
+    def _remember(self, missing: List[str], fetched: Dict[str, Dict[str, Any]]):
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self.stats["queries"] += 1
+            for lore_name in missing:
+                self._entries[lore_name] = (fetched.get(lore_name), expires_at)
+
+    def get_many(self, lore_names: Iterable[str], fetch: Callable[[List[str]], Dict[str, Dict[str, Any]]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns {name: lore doc} for the names that have an entry. Uncached names are fetched with one call
+        to `fetch`; a fully cached lookup makes no database round trip.
+        """
+        found, missing = self._split(lore_names)
+        if missing:
+            fetched = fetch(missing)
+            self._remember(missing, fetched)
+            found.update({lore_name: fetched[lore_name] for lore_name in missing if lore_name in fetched})
+        return found
+
+    async def aget_many(self, lore_names: Iterable[str], fetch: Callable[[List[str]], Awaitable[Dict[str, Dict[str, Any]]]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Async variant of get_many for the async driver.
+        """
+        found, missing = self._split(lore_names)
+        if missing:
+            fetched = await fetch(missing)
+            self._remember(missing, fetched)
+            found.update({lore_name: fetched[lore_name] for lore_name in missing if lore_name in fetched})
+        return found
+
+    def invalidate(self, lore_names: Iterable[Optional[str]]):
+        with self._lock:
+            for lore_name in lore_names:
+                if lore_name and self._entries.pop(lore_name, None) is not None:
+                    self.stats["invalidated"] += 1
+
+    def invalidate_changes(self, changes: Dict[str, Set[str]]):
+        """
+        Sync listener: drops the lore entries a sync created, changed or removed.
+        """
+        self.invalidate(changes.get("lore") or set())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries))
+
+lore_cache = LoreCache()
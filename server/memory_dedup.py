@@ -0,0 +1,148 @@
+# server/memory_dedup.py
+"""
+Near-Duplicate Memory Detection Module.
+Repeated conversations keep producing the same memory in slightly different words ("Learned that Floon
+is missing", "Learned Floon is missing"). Each memory is reduced to shingles of its own tokenizer: the
+stemmed content words plus every adjacent pair of them, with a negation folded into the word it negates.
+Word order and polarity therefore count ("The party killed the dragon" and "The dragon killed the
+party", or "Trusts Volo" and "Does not trust Volo", are different facts), and a MinHash signature of
+that set is split into LSH bands. Every stored memory carries its band keys (`lsh_bands`, indexed), so
+the candidates for a new memory are the few memories sharing at least one band with it, found with one
+indexed query; only those are compared exactly (Jaccard similarity of the shingle sets). The same
+banding groups existing memories for the bulk dedupe pass.
+
+With LSH_BANDS bands of LSH_ROWS rows, a pair with similarity s becomes a candidate with probability
+1 - (1 - s^LSH_ROWS)^LSH_BANDS: about 99% at 0.7 and 64% at 0.5, so thresholds from about 0.6 up are
+reliably caught while unrelated memories are almost never compared.
+"""
+import random
+import struct
+import zlib
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from canned_matcher import light_stem, utterance_words
+
+# 16 bands x 4 rows = 64 MinHash values per memory.
+LSH_BANDS = 16
+LSH_ROWS = 4
+MINHASH_PERMUTATIONS = LSH_BANDS * LSH_ROWS
+
+# Bumped whenever shingling changes; stored memories with another version get new band keys at startup.
+SHINGLE_VERSION = 2
+
+# Function words that never change what a memory says. Unlike retrieval's stopwords this keeps negations
+# and pronouns, which decide who did what and whether it happened at all.
+DEDUP_STOPWORDS = {
+    "a", "an", "the", "of", "on", "to", "in", "at", "by", "for", "with", "and", "or", "but", "if", "as",
+    "from", "so", "that", "this", "these", "those", "is", "are", "was", "were", "be", "been", "being",
+    "am", "do", "does", "did", "have", "has", "had", "very", "just", "really", "about"
+}
+
+# Words that flip the meaning of the next content word; "n't" contractions are recognised by their suffix.
+NEGATION_WORDS = {"not", "no", "never", "nor", "none", "nobody", "nothing", "without", "cannot"}
+
+# Universal hash family h(x) = (a*x + b) mod p over the crc32 of each word; fixed seed so band keys
+# written by one process match those computed by any other.
+_MERSENNE_PRIME = (1 << 61) - 1
+_permutation_rng = random.Random(0x5EED)
+_PERMUTATIONS = [(_permutation_rng.randrange(1, _MERSENNE_PRIME), _permutation_rng.randrange(0, _MERSENNE_PRIME))
+                 for _ in range(MINHASH_PERMUTATIONS)]
+
+def memory_tokens(text: str) -> List[str]:
+    """
+    Stemmed content words in order, each negated word prefixed with "!" ("does not trust Volo" ->
+    ["!trust", "volo"]). A negation with nothing after it is kept as a word of its own.
+    """
+    tokens: List[str] = []
+    negated = False
+    for word in utterance_words(text or ""):
+        if word in NEGATION_WORDS or word.endswith("n't"):
+            negated = True
+            continue
+        if word in DEDUP_STOPWORDS:
+            continue
+        tokens.append(("!" if negated else "") + light_stem(word))
+        negated = False
+    if negated:
+        tokens.append("!")
+    return tokens
+
+def memory_shingles(text: str) -> FrozenSet[str]:
+    """
+    The set a memory is compared by: its tokens and every adjacent pair of them.
+    """
+    tokens = memory_tokens(text)
+    return frozenset(tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])])
+
+def jaccard(first: FrozenSet[str], second: FrozenSet[str]) -> float:
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+def minhash_signature(shingles: Iterable[str]) -> List[int]:
+    """
+    The minimum of every permutation's hash over the shingles; two sets agree on a position with
+    probability equal to their Jaccard similarity.
+    """
+    hashed = [zlib.crc32(shingle.encode('utf-8')) for shingle in shingles]
+    if not hashed:
+        return []
+    return [min((a * value + b) % _MERSENNE_PRIME for value in hashed) for a, b in _PERMUTATIONS]
+
+def lsh_fields(text: str) -> Dict[str, Any]:
+    # The stored dedupe fields of a memory's text: its band keys and the shingling they were computed with.
+    return {"lsh_bands": lsh_band_keys(text), "lsh_version": SHINGLE_VERSION}
+
+def lsh_band_keys(text: str) -> List[int]:
+    """
+    One integer per band: the band number in the high bits and a hash of the band's rows in the low 32.
+    Empty for a text without content words (such memories are never deduplicated).
+    """
+    signature = minhash_signature(memory_shingles(text))
+    if not signature:
+        return []
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        keys.append((band << 32) | zlib.crc32(struct.pack(f"<{LSH_ROWS}Q", *rows)))
+    return keys
+
+def best_duplicate(content: str, candidates: Iterable[Dict[str, Any]], threshold: float) -> Tuple[Optional[Dict[str, Any]], float]:
+    """
+    The candidate memory most similar to `content`, if its similarity reaches the threshold.
+    Returns (memory document or None, similarity).
+    """
+    shingles = memory_shingles(content)
+    best_doc, best_similarity = None, 0.0
+    for candidate in candidates:
+        similarity = jaccard(shingles, memory_shingles(candidate.get('content', '')))
+        if similarity > best_similarity:
+            best_doc, best_similarity = candidate, similarity
+    if best_doc is None or best_similarity < threshold:
+        return None, best_similarity
+    return best_doc, best_similarity
+
+def plan_dedupe(memory_docs: List[Dict[str, Any]], threshold: float) -> List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+    """
+    Groups near-duplicates among memories given oldest first. Each memory is compared with the kept
+    memories it shares a band with; a match joins that memory's group, anything else is kept.
+    Returns [(kept memory, [its duplicates, oldest first])] for every group that has duplicates.
+    """
+    buckets: Dict[int, List[int]] = {}
+    kept: List[Tuple[Dict[str, Any], FrozenSet[str], List[Dict[str, Any]]]] = []
+    for memory_doc in memory_docs:
+        shingles = memory_shingles(memory_doc.get('content', ''))
+        stored_keys = memory_doc.get('lsh_bands') if memory_doc.get('lsh_version') == SHINGLE_VERSION else None
+        band_keys = stored_keys or lsh_band_keys(memory_doc.get('content', ''))
+        best_index, best_similarity = None, 0.0
+        for kept_index in {kept_index for band_key in band_keys for kept_index in buckets.get(band_key, ())}:
+            similarity = jaccard(shingles, kept[kept_index][1])
+            if similarity > best_similarity:
+                best_index, best_similarity = kept_index, similarity
+        if best_index is not None and best_similarity >= threshold:
+            kept[best_index][2].append(memory_doc)
+            continue
+        for band_key in band_keys:
+            buckets.setdefault(band_key, []).append(len(kept))
+        kept.append((memory_doc, shingles, []))
+    return [(kept_doc, duplicates) for kept_doc, _, duplicates in kept if duplicates]
@@ -0,0 +1,296 @@
+# server/memory_recall.py
+"""
+Memory Recall Module.
+Picks the memories a dialogue prompt includes by relevance to the player's utterance instead of taking
+the newest five. Each character's memories are embedded once into the columns of a contiguous NumPy
+matrix (one row per embedding dimension); a turn embeds the utterance, and one vectorized product over
+the utterance's few non-zero dimensions scores every memory at once. The similarity is blended with an
+exponential recency decay, so a relevant old memory can win over an irrelevant new one while, with
+nothing relevant said, the newest memories still come first.
+
+The embedder is pluggable: anything with `dimensions` and `embed(text) -> {dimension: weight}` works.
+The default hashes stemmed words into a fixed number of signed dimensions, so it needs no model, no
+vocabulary and no network. NumPy is optional: without it `memory_recall.available` is False and callers
+fall back to the most recent memories.
+"""
+import math
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from config import config as app_config
+from memory_store import MEMORIES_COLLECTION
+from retrieval import index_terms
+
+# numpy is optional: without it prompts use the most recent memories instead of recalled ones.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# The memory fields recall reads and returns (the API form, without the owner id or LSH band keys).
+RECALL_MEMORY_PROJECTION = {"npc_id": 0, "lsh_bands": 0}
+
+# Scene words help disambiguate but must not outrank what the player actually said.
+CONTEXT_TERM_WEIGHT = 0.5
+
+class HashingEmbedder:
+    """
+    Feature-hashing embedder: every stemmed content word lands on one of `dimensions` dimensions with a
+    sign taken from its hash (so collisions cancel out on average), weighted by 1 + log(term frequency),
+    and the vector is L2-normalized. Stable across processes and restarts (crc32, not Python's hash).
+    """
+
+    def __init__(self, dimensions: Optional[int] = None):
+        self.dimensions = app_config.MEMORY_RECALL_DIMENSIONS if dimensions is None else dimensions
+
+    def embed(self, text: str) -> Dict[int, float]:
+        vector: Dict[int, float] = {}
+        for term, count in Counter(index_terms(text)).items():
+            term_hash = zlib.crc32(term.encode('utf-8'))
+            dimension = term_hash % self.dimensions
+            sign = 1.0 if (term_hash >> 31) & 1 else -1.0
+            vector[dimension] = vector.get(dimension, 0.0) + sign * (1.0 + math.log(count))
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        return {dimension: weight / norm for dimension, weight in vector.items() if weight} if norm else {}
+
+def _epoch_seconds(value: Any) -> float:
+    # Memory timestamps are naive UTC datetimes.
+    if isinstance(value, datetime):
+        return (value - datetime(1970, 1, 1)).total_seconds() if value.tzinfo is None else value.timestamp()
+    return time.time()
+
+class MemoryVectorIndex:
+    """
+    One character's memories. Column i of the (dimensions x capacity) matrix is the embedding of
+    memories[i]; capacity doubles as memories are added, and a removed memory's column is filled with
+    the last column so the used columns always stay contiguous.
+
+    Recency is stored as 2^((timestamp - anchor) / half_life) per memory, so scoring a turn only scales
+    it by 2^((anchor - now) / half_life) instead of exponentiating every memory's age again.
+    """
+
+    def __init__(self, dimensions: int, half_life_seconds: float, capacity: int = 64):
+        self.dimensions = dimensions
+        self.half_life_seconds = half_life_seconds
+        self._vectors = np.zeros((dimensions, capacity), dtype=np.float32)
+        self._recency = np.zeros(capacity, dtype=np.float64)
+        self._anchor = time.time()
+        self.memories: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.memories)
+
+    def __contains__(self, memory_id: str) -> bool:
+        return memory_id in self._positions
+
+    def _grow(self):
+        capacity = self._vectors.shape[1] * 2
+        vectors = np.zeros((self.dimensions, capacity), dtype=np.float32)
+        vectors[:, :len(self.memories)] = self._vectors[:, :len(self.memories)]
+        recency = np.zeros(capacity, dtype=np.float64)
+        recency[:len(self.memories)] = self._recency[:len(self.memories)]
+        self._vectors, self._recency = vectors, recency
+
+    def add(self, memory: Dict[str, Any], vector: Dict[int, float]):
+        """
+        Adds (or replaces) a memory with its sparse embedding.
+        """
+        if memory['memory_id'] in self._positions:
+            self.remove(memory['memory_id'])
+        if len(self.memories) == self._vectors.shape[1]:
+            self._grow()
+        position = len(self.memories)
+        if vector:
+            self._vectors[list(vector.keys()), position] = list(vector.values())
+        # Capped so a memory dated far in the future cannot overflow.
+        exponent = min(60.0, (_epoch_seconds(memory.get('timestamp')) - self._anchor) / self.half_life_seconds)
+        self._recency[position] = 2.0 ** exponent
+        self.memories.append(memory)
+        self._positions[memory['memory_id']] = position
+
+    def add_many(self, memories: List[Dict[str, Any]], vectors: List[Dict[str, float]]):
+        """
+        Bulk add of memories not in the index yet (an index build): one scatter into the matrix
+        instead of one column write per memory.
+        """
+        start = len(self.memories)
+        while start + len(memories) > self._vectors.shape[1]:
+            self._grow()
+        columns = [start + offset for offset, vector in enumerate(vectors) for _ in vector]
+        rows = [dimension for vector in vectors for dimension in vector]
+        weights = [weight for vector in vectors for weight in vector.values()]
+        if columns:
+            self._vectors[rows, columns] = weights
+        timestamps = np.fromiter((_epoch_seconds(memory.get('timestamp')) for memory in memories), dtype=np.float64, count=len(memories))
+        self._recency[start:start + len(memories)] = np.exp2(np.minimum(60.0, (timestamps - self._anchor) / self.half_life_seconds))
+        for offset, memory in enumerate(memories):
+            self._positions[memory['memory_id']] = start + offset
+        self.memories.extend(memories)
+
+    def remove(self, memory_id: str) -> bool:
+        position = self._positions.pop(memory_id, None)
+        if position is None:
+            return False
+        last = len(self.memories) - 1
+        if position != last:
+            self._vectors[:, position] = self._vectors[:, last]
+            self._recency[position] = self._recency[last]
+            self.memories[position] = self.memories[last]
+            self._positions[self.memories[position]['memory_id']] = position
+        self._vectors[:, last] = 0.0
+        self.memories.pop()
+        return True
+
+    def query(self, vector: Dict[int, float], top_k: int, recency_weight: float, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        The top_k memories by (1 - recency_weight) * cosine similarity + recency_weight * recency,
+        returned oldest first (the order the prompt lists them in).
+        """
+        count = len(self.memories)
+        if count == 0 or top_k <= 0:
+            return []
+        now = time.time() if now is None else now
+        scores = self._recency[:count] * (recency_weight * 2.0 ** ((self._anchor - now) / self.half_life_seconds))
+        if vector:
+            # Only the utterance's non-zero dimensions contribute, so only those rows are read.
+            weights = np.fromiter(vector.values(), dtype=np.float32, count=len(vector))
+            similarity = weights @ self._vectors[list(vector.keys()), :count]
+            scores += (1.0 - recency_weight) * similarity
+        if count > top_k:
+            best = np.argpartition(scores, count - top_k)[count - top_k:]
+        else:
+            best = np.arange(count)
+        # Recency values grow with the timestamp, so sorting by them is chronological.
+        return [self.memories[position] for position in sorted(best.tolist(), key=lambda position: self._recency[position])]
+
+class MemoryRecall:
+    """
+    Per-character MemoryVectorIndex instances, least recently used evicted first. The memory endpoints
+    keep a loaded index current; after the TTL an index is checked against the database (count and newest
+    memory) and rebuilt only if another process changed that character's memories.
+    """
+
+    def __init__(self, embedder=None, max_characters: Optional[int] = None, ttl_seconds: Optional[int] = None):
+        self.embedder = embedder or HashingEmbedder()
+        self.max_characters = app_config.MEMORY_RECALL_MAX_CHARACTERS if max_characters is None else max_characters
+        self.ttl_seconds = app_config.MEMORY_RECALL_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._indexes: "OrderedDict[str, Tuple[MemoryVectorIndex, float]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = {"builds": 0, "revalidations": 0, "queries": 0, "evictions": 0, "last_query_ms": 0.0, "last_build_ms": 0.0}
+
+    @property
+    def available(self) -> bool:
+        return np is not None and app_config.MEMORY_RECALL_ENABLED
+
+    def _fresh_index(self, npc_key: str) -> Optional[MemoryVectorIndex]:
+        # Caller holds the lock. The index if loaded and within its TTL, marked most recently used.
+        entry = self._indexes.get(npc_key)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        self._indexes.move_to_end(npc_key)
+        return entry[0]
+
+    def is_ready(self, npc_id_obj: ObjectId) -> bool:
+        # True when a recall for this character needs no database access.
+        with self._lock:
+            return self._fresh_index(str(npc_id_obj)) is not None
+
+    def _store(self, npc_key: str, index: MemoryVectorIndex):
+        with self._lock:
+            self._indexes[npc_key] = (index, time.monotonic() + self.ttl_seconds)
+            self._indexes.move_to_end(npc_key)
+            while len(self._indexes) > self.max_characters:
+                self._indexes.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def _still_current(self, db, npc_id_obj: ObjectId, index: MemoryVectorIndex) -> bool:
+        # Two indexed reads instead of a rebuild: same number of memories and the newest one is indexed.
+        collection = db[MEMORIES_COLLECTION]
+        if collection.count_documents({"npc_id": npc_id_obj}) != len(index):
+            return False
+        newest = collection.find_one({"npc_id": npc_id_obj}, {"memory_id": 1}, sort=[("timestamp", -1), ("_id", -1)])
+        return newest is None or newest['memory_id'] in index
+
+    def _build(self, db, npc_id_obj: ObjectId) -> MemoryVectorIndex:
+        started = time.perf_counter()
+        index = MemoryVectorIndex(self.embedder.dimensions, app_config.MEMORY_RECALL_HALF_LIFE_DAYS * 86400.0)
+        memories = list(db[MEMORIES_COLLECTION].find({"npc_id": npc_id_obj}, RECALL_MEMORY_PROJECTION))
+        for memory in memories:
+            memory.pop('_id', None)
+        index.add_many(memories, [self.embedder.embed(memory.get('content', '')) for memory in memories])
+        self.stats["builds"] += 1
+        self.stats["last_build_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return index
+
+    def get_index(self, db, npc_id_obj: ObjectId) -> MemoryVectorIndex:
+        """
+        The character's index, loading (or revalidating) it from the database when needed.
+        """
+        npc_key = str(npc_id_obj)
+        with self._lock:
+            index = self._fresh_index(npc_key)
+            stale_entry = self._indexes.get(npc_key)
+        if index is not None:
+            return index
+        if stale_entry is not None and self._still_current(db, npc_id_obj, stale_entry[0]):
+            self.stats["revalidations"] += 1
+            index = stale_entry[0]
+        else:
+            index = self._build(db, npc_id_obj)
+        self._store(npc_key, index)
+        return index
+
+    def recall(self, db, npc_id_obj: ObjectId, utterance: str, context_text: str = "", top_k: int = 5,
+               now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        The top_k memories (API form, oldest first) most relevant to the utterance, scene words counting
+        CONTEXT_TERM_WEIGHT as much. Requires `available`.
+        """
+        index = self.get_index(db, npc_id_obj)
+        vector = dict(self.embedder.embed(utterance))
+        for dimension, weight in self.embedder.embed(context_text).items():
+            vector[dimension] = vector.get(dimension, 0.0) + CONTEXT_TERM_WEIGHT * weight
+        started = time.perf_counter()
+        with self._lock:
+            memories = index.query(vector, top_k, app_config.MEMORY_RECALL_RECENCY_WEIGHT, now)
+            self.stats["queries"] += 1
+            self.stats["last_query_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return memories
+
+    def note_added(self, npc_id_obj: ObjectId, memory: Dict[str, Any]):
+        """
+        Adds a newly stored memory to the character's index, if it is loaded.
+        """
+        if np is None:
+            return
+        vector = self.embedder.embed(memory.get('content', ''))
+        with self._lock:
+            entry = self._indexes.get(str(npc_id_obj))
+            if entry is not None:
+                entry[0].add(memory, vector)
+
+    def note_deleted(self, npc_id_obj: ObjectId, memory_id: str):
+        with self._lock:
+            entry = self._indexes.get(str(npc_id_obj))
+            if entry is not None:
+                entry[0].remove(memory_id)
+
+    def invalidate(self, npc_id_obj: ObjectId):
+        # Drops a character's index (after compaction rewrote its memories, or when it is deleted).
+        with self._lock:
+            self._indexes.pop(str(npc_id_obj), None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, available=self.available, characters=len(self._indexes),
+                        memories=sum(len(entry[0]) for entry in self._indexes.values()),
+                        dimensions=self.embedder.dimensions)
+
+memory_recall = MemoryRecall()
@@ -0,0 +1,382 @@
+# server/memory_store.py
+"""
+NPC Memory Store Module.
+Memories live in their own collection, one document per memory keyed by (npc_id, memory_id) and
+read newest first through an (npc_id, timestamp) index, instead of growing an embedded `memories`
+array on the character document forever. Character documents therefore stay the same size however
+long a campaign runs: detail views and dialogue prompts load only the most recent page, older pages
+are read with keyset pagination, and a background compaction job rolls old memories into one summary
+memory per period.
+
+Memories found embedded in character documents (or in character JSON files) are moved here by
+`migrate_embedded_memories` and `import_memories`. New memories are checked for near-duplicates first
+(see memory_dedup.py): a repeat reinforces or merges into the memory it repeats, or is rejected.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+
+from config import config as app_config
+from memory_dedup import SHINGLE_VERSION, best_duplicate, lsh_band_keys, lsh_fields, plan_dedupe
+from models import MemoryItem
+
+MEMORIES_COLLECTION = 'npc_memories'
+
+# Memory type and source of the summaries written by compaction; summaries are never compacted again.
+SUMMARY_MEMORY_TYPE = 'summary'
+SUMMARY_MEMORY_SOURCE = 'compaction'
+
+# How many recent memories dialogue prompts include (the turn suffix lists the last five).
+PROMPT_RECENT_MEMORIES = 5
+
+# What POST /memory does with a near-duplicate: store it anyway, reinforce the existing memory, merge the
+# new wording into it (the more detailed text wins), or reject it.
+DUPLICATE_ACTIONS = ('keep', 'reinforce', 'merge', 'reject')
+
+# At most this many band-sharing candidates are compared exactly per new memory.
+DUPLICATE_MAX_CANDIDATES = 50
+
+# Newest first; _id breaks ties between memories with the same timestamp so pages never overlap.
+NEWEST_FIRST = [("timestamp", -1), ("_id", -1)]
+
+def _as_datetime(value: Any) -> datetime:
+    # Embedded memories were stored in JSON mode, so older timestamps are ISO strings.
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+        except ValueError:
+            pass
+    return datetime.utcnow()
+
+def memory_document(npc_id_obj: ObjectId, memory: MemoryItem) -> Dict[str, Any]:
+    """
+    The stored form of a memory: the MemoryItem fields, the owning character's id and its LSH band keys.
+    """
+    return {"npc_id": npc_id_obj, **memory.model_dump(), **lsh_fields(memory.content)}
+
+def memory_view(memory_doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The API form of a stored memory (the MemoryItem fields, plus the period of a compaction summary).
+    """
+    return {key: value for key, value in memory_doc.items() if key not in ("_id", "npc_id", "lsh_bands", "lsh_version")}
+
+def encode_memory_cursor(memory_doc: Dict[str, Any]) -> str:
+    return f"{memory_doc['timestamp'].isoformat()}|{memory_doc['_id']}"
+
+def memory_page_filter(npc_id_obj: ObjectId, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Filter for one page of a character's memories, newest first, continuing after `cursor`.
+    Raises ValueError for a malformed cursor.
+    """
+    if not cursor:
+        return {"npc_id": npc_id_obj}
+    try:
+        timestamp_str, _, id_str = cursor.partition("|")
+        timestamp, doc_id = datetime.fromisoformat(timestamp_str), ObjectId(id_str)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return {"npc_id": npc_id_obj, "$or": [
+        {"timestamp": {"$lt": timestamp}},
+        {"timestamp": timestamp, "_id": {"$lt": doc_id}}
+    ]}
+
+def page_result(memory_docs: List[Dict[str, Any]], limit: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Splits a limit+1 fetch into (memories, page meta) in the shape the listing endpoints use.
+    """
+    has_more = len(memory_docs) > limit
+    memory_docs = memory_docs[:limit]
+    next_cursor = encode_memory_cursor(memory_docs[-1]) if has_more and memory_docs else None
+    return [memory_view(memory_doc) for memory_doc in memory_docs], {"limit": limit, "next_cursor": next_cursor}
+
+def list_memories(db, npc_id_obj: ObjectId, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    One page of a character's memories, newest first, with the cursor of the next page.
+    """
+    memory_docs = list(db[MEMORIES_COLLECTION].find(memory_page_filter(npc_id_obj, cursor)).sort(NEWEST_FIRST).limit(limit + 1))
+    return page_result(memory_docs, limit)
+
+async def alist_memories(db, npc_id_obj: ObjectId, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Async variant of list_memories for the async driver.
+    """
+    memory_cursor = db[MEMORIES_COLLECTION].find(memory_page_filter(npc_id_obj, cursor)).sort(NEWEST_FIRST).limit(limit + 1)
+    return page_result(await memory_cursor.to_list(limit + 1), limit)
+
+def recent_memories(db, npc_id_obj: ObjectId, limit: int) -> List[Dict[str, Any]]:
+    """
+    The `limit` most recent memories in chronological order (oldest first), as the prompt lists them.
+    """
+    memory_docs = list(db[MEMORIES_COLLECTION].find({"npc_id": npc_id_obj}).sort(NEWEST_FIRST).limit(limit))
+    return [memory_view(memory_doc) for memory_doc in reversed(memory_docs)]
+
+async def arecent_memories(db, npc_id_obj: ObjectId, limit: int) -> List[Dict[str, Any]]:
+    """
+    Async variant of recent_memories for the async driver.
+    """
+    memory_docs = await db[MEMORIES_COLLECTION].find({"npc_id": npc_id_obj}).sort(NEWEST_FIRST).limit(limit).to_list(limit)
+    return [memory_view(memory_doc) for memory_doc in reversed(memory_docs)]
+
+def count_memories(db, npc_id_obj: ObjectId) -> int:
+    return db[MEMORIES_COLLECTION].count_documents({"npc_id": npc_id_obj})
+
+def add_memory(db, npc_id_obj: ObjectId, memory: MemoryItem) -> Dict[str, Any]:
+    """
+    Stores a memory and returns its API form.
+    """
+    memory_doc = memory_document(npc_id_obj, memory)
+    db[MEMORIES_COLLECTION].insert_one(memory_doc)
+    return memory_view(memory_doc)
+
+async def aadd_memory(db, npc_id_obj: ObjectId, memory: MemoryItem) -> Dict[str, Any]:
+    """
+    Async variant of add_memory for the async driver.
+    """
+    memory_doc = memory_document(npc_id_obj, memory)
+    await db[MEMORIES_COLLECTION].insert_one(memory_doc)
+    return memory_view(memory_doc)
+
+def duplicate_candidates_filter(npc_id_obj: ObjectId, band_keys: List[int]) -> Dict[str, Any]:
+    # Memories of the character sharing a band with the new one; compaction summaries are never matched.
+    return {"npc_id": npc_id_obj, "lsh_bands": {"$in": band_keys}, "type": {"$ne": SUMMARY_MEMORY_TYPE}}
+
+def reinforcement_update(duplicate_doc: Dict[str, Any], memory: MemoryItem, merge: bool) -> Dict[str, Any]:
+    """
+    Update applied to the memory a new one repeats: it counts the repetition and moves to the newer
+    timestamp; a merge also takes the new wording when that is the more detailed text.
+    """
+    fields: Dict[str, Any] = {"timestamp": max(duplicate_doc['timestamp'], memory.timestamp)}
+    if merge and len(memory.content) > len(duplicate_doc.get('content', '')):
+        fields.update(content=memory.content, **lsh_fields(memory.content))
+    return {"$set": fields, "$inc": {"reinforced_count": 1}}
+
+def add_memory_deduplicated(db, npc_id_obj: ObjectId, memory: MemoryItem, action: Optional[str] = None,
+                            threshold: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Stores a memory unless it is a near-duplicate of an existing one, in which case `action` decides.
+    Returns {"outcome": 'added' | 'reinforced' | 'merged' | 'rejected', "memory": the stored or matched
+    memory (API form), "similarity": similarity to the matched memory or None}.
+    """
+    action = action or app_config.MEMORY_DEDUP_ACTION
+    threshold = app_config.MEMORY_DEDUP_THRESHOLD if threshold is None else threshold
+    band_keys = lsh_band_keys(memory.content)
+    if action != 'keep' and band_keys:
+        candidates = db[MEMORIES_COLLECTION].find(duplicate_candidates_filter(npc_id_obj, band_keys)).limit(DUPLICATE_MAX_CANDIDATES)
+        duplicate_doc, similarity = best_duplicate(memory.content, candidates, threshold)
+        if duplicate_doc is not None:
+            if action == 'reject':
+                return {"outcome": "rejected", "memory": memory_view(duplicate_doc), "similarity": similarity}
+            updated_doc = db[MEMORIES_COLLECTION].find_one_and_update(
+                {"_id": duplicate_doc['_id']}, reinforcement_update(duplicate_doc, memory, action == 'merge'),
+                return_document=ReturnDocument.AFTER
+            )
+            if updated_doc is not None:
+                outcome = "merged" if updated_doc.get('content') != duplicate_doc.get('content') else "reinforced"
+                return {"outcome": outcome, "memory": memory_view(updated_doc), "similarity": similarity}
+    return {"outcome": "added", "memory": add_memory(db, npc_id_obj, memory), "similarity": None}
+
+async def aadd_memory_deduplicated(db, npc_id_obj: ObjectId, memory: MemoryItem, action: Optional[str] = None,
+                                   threshold: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Async variant of add_memory_deduplicated for the async driver.
+    """
+    action = action or app_config.MEMORY_DEDUP_ACTION
+    threshold = app_config.MEMORY_DEDUP_THRESHOLD if threshold is None else threshold
+    band_keys = lsh_band_keys(memory.content)
+    if action != 'keep' and band_keys:
+        candidate_cursor = db[MEMORIES_COLLECTION].find(duplicate_candidates_filter(npc_id_obj, band_keys)).limit(DUPLICATE_MAX_CANDIDATES)
+        candidates = await candidate_cursor.to_list(DUPLICATE_MAX_CANDIDATES)
+        duplicate_doc, similarity = best_duplicate(memory.content, candidates, threshold)
+        if duplicate_doc is not None:
+            if action == 'reject':
+                return {"outcome": "rejected", "memory": memory_view(duplicate_doc), "similarity": similarity}
+            updated_doc = await db[MEMORIES_COLLECTION].find_one_and_update(
+                {"_id": duplicate_doc['_id']}, reinforcement_update(duplicate_doc, memory, action == 'merge'),
+                return_document=ReturnDocument.AFTER
+            )
+            if updated_doc is not None:
+                outcome = "merged" if updated_doc.get('content') != duplicate_doc.get('content') else "reinforced"
+                return {"outcome": outcome, "memory": memory_view(updated_doc), "similarity": similarity}
+    return {"outcome": "added", "memory": await aadd_memory(db, npc_id_obj, memory), "similarity": None}
+
+def delete_memory(db, npc_id_obj: ObjectId, memory_id: str) -> bool:
+    return db[MEMORIES_COLLECTION].delete_one({"npc_id": npc_id_obj, "memory_id": memory_id}).deleted_count > 0
+
+async def adelete_memory(db, npc_id_obj: ObjectId, memory_id: str) -> bool:
+    result = await db[MEMORIES_COLLECTION].delete_one({"npc_id": npc_id_obj, "memory_id": memory_id})
+    return result.deleted_count > 0
+
+def delete_npc_memories(db, npc_id_objs: Iterable[ObjectId]) -> int:
+    """
+    Removes every memory of the given characters (used when the characters themselves are deleted).
+    """
+    npc_id_objs = list(npc_id_objs)
+    if not npc_id_objs:
+        return 0
+    return db[MEMORIES_COLLECTION].delete_many({"npc_id": {"$in": npc_id_objs}}).deleted_count
+
+def import_memories(db, npc_id_obj: ObjectId, raw_memories: Iterable[Any]) -> int:
+    """
+    Upserts embedded-style memories (dicts from a character document or file) by memory_id, so importing
+    the same memories again never duplicates them. Invalid entries are skipped. Returns the number stored.
+    """
+    operations = []
+    for raw_memory in raw_memories or []:
+        if not isinstance(raw_memory, dict) or not raw_memory.get('content'):
+            continue
+        try:
+            memory = MemoryItem(**{**raw_memory, "timestamp": _as_datetime(raw_memory.get('timestamp'))})
+        except Exception as e:
+            print(f"[Memories] Skipping invalid memory for {npc_id_obj}: {e}")
+            continue
+        memory_doc = memory_document(npc_id_obj, memory)
+        operations.append(UpdateOne({"npc_id": npc_id_obj, "memory_id": memory.memory_id}, {"$setOnInsert": memory_doc}, upsert=True))
+    if operations:
+        db[MEMORIES_COLLECTION].bulk_write(operations, ordered=False)
+    return len(operations)
+
+def migrate_embedded_memories(db) -> int:
+    """
+    Moves every character's embedded `memories` array into the memories collection, then removes the array.
+    Safe to run on every startup: characters without an embedded array are not touched.
+    """
+    migrated_characters = 0
+    for npc_doc in db.npcs.find({"memories": {"$exists": True}}, {"_id": 1, "name": 1, "memories": 1}):
+        moved_count = import_memories(db, npc_doc['_id'], npc_doc.get('memories') or [])
+        db.npcs.update_one({"_id": npc_doc['_id']}, {"$unset": {"memories": ""}})
+        migrated_characters += 1
+        if moved_count:
+            print(f"[Memories] Moved {moved_count} embedded memories of {npc_doc.get('name')} to '{MEMORIES_COLLECTION}'.")
+    return migrated_characters
+
+def backfill_lsh_bands(db) -> int:
+    """
+    Adds band keys to memories stored before near-duplicate detection existed, and recomputes those
+    written with an older shingling. Returns the number updated.
+    """
+    operations = [
+        UpdateOne({"_id": memory_doc['_id']}, {"$set": lsh_fields(memory_doc.get('content', ''))})
+        for memory_doc in db[MEMORIES_COLLECTION].find({"lsh_version": {"$ne": SHINGLE_VERSION}}, {"content": 1})
+    ]
+    if operations:
+        db[MEMORIES_COLLECTION].bulk_write(operations, ordered=False)
+    return len(operations)
+
+def dedupe_memories(db, npc_id_obj: ObjectId, threshold: Optional[float] = None) -> Dict[str, int]:
+    """
+    Bulk pass over a character's existing memories: each group of near-duplicates collapses into its
+    oldest memory, which takes the most detailed wording, the newest timestamp and the group's
+    repetitions as its reinforced_count. Compaction summaries are left alone.
+    """
+    threshold = app_config.MEMORY_DEDUP_THRESHOLD if threshold is None else threshold
+    collection = db[MEMORIES_COLLECTION]
+    memory_docs = list(collection.find({"npc_id": npc_id_obj, "type": {"$ne": SUMMARY_MEMORY_TYPE}}).sort([("timestamp", 1), ("_id", 1)]))
+    removed_count = 0
+    for kept_doc, duplicate_docs in plan_dedupe(memory_docs, threshold):
+        group = [kept_doc] + duplicate_docs
+        content = max((memory_doc.get('content', '') for memory_doc in group), key=len)
+        collection.update_one({"_id": kept_doc['_id']}, {"$set": {
+            "content": content,
+            **lsh_fields(content),
+            "timestamp": max(memory_doc['timestamp'] for memory_doc in group),
+            "reinforced_count": sum(memory_doc.get('reinforced_count', 0) + 1 for memory_doc in group) - 1
+        }})
+        # The kept memory is updated before its duplicates go, so an interrupted pass loses nothing.
+        collection.delete_many({"_id": {"$in": [memory_doc['_id'] for memory_doc in duplicate_docs]}})
+        removed_count += len(duplicate_docs)
+    return {"examined": len(memory_docs), "removed": removed_count}
+
+def compaction_period_start(timestamp: datetime, period_days: int) -> datetime:
+    # Periods are aligned to whole multiples of period_days since the Unix epoch, so they never shift.
+    days_since_epoch = (timestamp - datetime(1970, 1, 1)).days
+    return datetime(1970, 1, 1) + timedelta(days=days_since_epoch - days_since_epoch % period_days)
+
+def compactable_filter(db, npc_id_obj: ObjectId, keep_recent: int) -> Optional[Dict[str, Any]]:
+    """
+    Filter for the memories compaction may roll up: those that are not summaries and come at or before
+    the newest memory beyond the `keep_recent` newest (which marks the cut-off). Like memory_page_filter
+    it orders on (timestamp, _id), so memories sharing the cut-off's timestamp (imports, reinforcements)
+    are split exactly and precisely `keep_recent` stay verbatim. None when nothing lies beyond the cut-off.
+    """
+    boundary = list(db[MEMORIES_COLLECTION].find({"npc_id": npc_id_obj}, {"timestamp": 1}).sort(NEWEST_FIRST).skip(keep_recent).limit(1))
+    if not boundary:
+        return None
+    boundary_timestamp, boundary_id = boundary[0]['timestamp'], boundary[0]['_id']
+    return {"npc_id": npc_id_obj, "type": {"$ne": SUMMARY_MEMORY_TYPE}, "$or": [
+        {"timestamp": {"$lt": boundary_timestamp}},
+        {"timestamp": boundary_timestamp, "_id": {"$lte": boundary_id}}
+    ]}
+
+def needs_compaction(db, npc_id_obj: ObjectId) -> bool:
+    """
+    True once the memories compaction can roll up, plus the MEMORY_COMPACTION_KEEP_RECENT kept verbatim,
+    exceed MEMORY_COMPACTION_THRESHOLD and at least one period holds two of them. Summaries and periods
+    with a single memory are left as they are by compaction, so they alone never trigger it.
+    """
+    keep_recent = app_config.MEMORY_COMPACTION_KEEP_RECENT
+    old_filter = compactable_filter(db, npc_id_obj, keep_recent)
+    if old_filter is None:
+        return False
+    collection = db[MEMORIES_COLLECTION]
+    allowed_old = max(0, app_config.MEMORY_COMPACTION_THRESHOLD - keep_recent)
+    if collection.count_documents(old_filter, limit=allowed_old + 1) <= allowed_old:
+        return False
+    seen_periods: Set[datetime] = set()
+    for memory_doc in collection.find(old_filter, {"_id": 0, "timestamp": 1}):
+        period_start = compaction_period_start(memory_doc['timestamp'], app_config.MEMORY_COMPACTION_PERIOD_DAYS)
+        if period_start in seen_periods:
+            return True
+        seen_periods.add(period_start)
+    return False
+
+def compact_memories(db, npc_id_obj: ObjectId, summarize: Callable[[List[str]], str],
+                     keep_recent: Optional[int] = None, period_days: Optional[int] = None) -> Dict[str, int]:
+    """
+    Rolls every memory older than the `keep_recent` newest into one summary memory per period of
+    `period_days`. Each summary is written (upserted under a deterministic id) before its source memories
+    are deleted, so a retried job neither loses memories nor writes the same summary twice.
+    `summarize` turns a period's memory texts into one summary and may raise to fail the job.
+    """
+    keep_recent = app_config.MEMORY_COMPACTION_KEEP_RECENT if keep_recent is None else keep_recent
+    period_days = app_config.MEMORY_COMPACTION_PERIOD_DAYS if period_days is None else period_days
+    collection = db[MEMORIES_COLLECTION]
+
+    old_filter = compactable_filter(db, npc_id_obj, keep_recent)
+    if old_filter is None:
+        return {"periods": 0, "compacted": 0}
+
+    periods: Dict[datetime, List[Dict[str, Any]]] = {}
+    for memory_doc in collection.find(old_filter).sort([("timestamp", 1), ("_id", 1)]):
+        periods.setdefault(compaction_period_start(memory_doc['timestamp'], period_days), []).append(memory_doc)
+
+    compacted_count = 0
+    summary_count = 0
+    for period_start, memory_docs in sorted(periods.items()):
+        if len(memory_docs) < 2:
+            continue
+        summary_text = summarize([memory_doc['content'] for memory_doc in memory_docs])
+        summary = MemoryItem(
+            memory_id=f"summary-{period_start:%Y%m%d}-{memory_docs[0]['memory_id']}",
+            timestamp=memory_docs[-1]['timestamp'],
+            content=summary_text,
+            type=SUMMARY_MEMORY_TYPE,
+            source=SUMMARY_MEMORY_SOURCE
+        )
+        collection.update_one(
+            {"npc_id": npc_id_obj, "memory_id": summary.memory_id},
+            {"$set": {
+                **memory_document(npc_id_obj, summary),
+                "period_start": period_start,
+                "period_end": period_start + timedelta(days=period_days),
+                "summarized_count": len(memory_docs)
+            }},
+            upsert=True
+        )
+        collection.delete_many({"_id": {"$in": [memory_doc['_id'] for memory_doc in memory_docs]}})
+        compacted_count += len(memory_docs)
+        summary_count += 1
+    return {"periods": summary_count, "compacted": compacted_count}
@@ -182,6 +182,17 @@ class DialogueRequest(BaseModel):
     active_pcs: List[str] = Field(default_factory=list, description="Names of player characters present in the scene.")
     speaking_pc_id: Optional[str] = Field(default=None, description="The ID of the PC who is speaking or initiating.")
     recent_dialogue_history: List[str] = Field(default_factory=list, description="Last few lines of conversation.")
+    structured_output: Optional[bool] = Field(default=None, description="Overrides DIALOGUE_OUTPUT_MODE: true for one schema-constrained JSON reply, false for free text.")
+    bypass_cache: bool = Field(default=False, description="Always call the model, ignoring (and not refreshing) cached replies.")
+    bypass_canned: bool = Field(default=False, description="Skip the local canned-conversation matcher and always generate a reply.")
+
+class SceneDialogueRequest(DialogueRequest):
+    """
+    Schema payload for a scene-level dialogue event: one utterance heard by several NPCs at once.
+    `recent_dialogue_history_by_npc` carries each NPC's own transcript and overrides the shared history for that NPC.
+    """
+    npc_ids: List[str] = Field(..., min_length=1, description="IDs of the NPCs in the scene who should respond.")
+    recent_dialogue_history_by_npc: Dict[str, List[str]] = Field(default_factory=dict, description="Per-NPC conversation history, keyed by NPC ID.")
 
 class DialogueResponse(BaseModel):
     """
@@ -197,6 +208,22 @@ class DialogueResponse(BaseModel):
     suggested_standing_pc_id: Optional[str] = None
     suggested_new_standing: Optional[FactionStandingLevel] = None
     standing_change_justification: Optional[str] = None
+    memory_job_id: Optional[str] = Field(default=None, description="Background job summarizing this exchange into a memory; poll /api/jobs/<id>.")
+    canned_topic: Optional[str] = Field(default=None, description="Set when the reply is a canned conversation line matched locally, without a model call.")
+
+class StructuredDialogueOutput(BaseModel):
+    """
+    Schema the model fills in directly when dialogue is generated in structured-output mode.
+    One JSON response carries the reply, every suggestion and the memory summary, replacing the
+    free-text suggestion block and the separate summarization call.
+    """
+    dialogue: str = Field(..., description="What the NPC says, in character. Only dialogue and brief parenthetical reactions.")
+    npc_actions: List[str] = Field(default_factory=list, description="Three brief non-verbal actions the NPC might take.")
+    player_checks: List[str] = Field(default_factory=list, description="One relevant skill check the players might make.")
+    generated_topics: List[str] = Field(default_factory=list, description="Two brief follow-up questions the players could ask.")
+    suggested_new_standing: Optional[FactionStandingLevel] = Field(default=None, description="New standing towards the speaking player character, or null for no change.")
+    standing_change_justification: str = Field(default="", description="Brief explanation of the standing suggestion.")
+    memory_summary: str = Field(default="", description="One concise third-person memory of this exchange for the NPC, starting with a verb. Empty if the player said nothing.")
 
 class NPCProfileWithHistoryAndLore(NPCProfile):
     """
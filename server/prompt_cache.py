@@ -0,0 +1,251 @@
+# server/prompt_cache.py
+"""
+Persona Prompt Cache Module.
+Dialogue prompts are assembled as a stable per-NPC prefix (identity, background, detailed history,
+linked lore, standings legend) followed by a short per-turn suffix (memories, disposition, scene,
+candidate canned topics, recent conversation, the utterance and the output format). The prefix is
+registered once with a context cache backend and reused by every later turn with the same NPC, so
+repeat turns only send the suffix. Entries are keyed by a hash of the model and the prefix text: any
+change to the profile, history files or linked lore produces a new key, and sync notifications drop
+the stale entries (and their provider-side caches) straight away.
+"""
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Set
+
+from config import config as app_config
+
+def prefix_fingerprint(model_name: str, prefix_text: str) -> str:
+    """
+    Cache key for a persona prefix: identical text for the same model always maps to the same entry.
+    """
+    return hashlib.sha256(f"{model_name}\n{prefix_text}".encode('utf-8')).hexdigest()
+
+class ContextCacheBackend(ABC):
+    """
+    Interface for storing a prompt prefix so later requests can reference it instead of resending it.
+    `provider_side` tells the caller whether a handle can be passed to the model as `cached_content`
+    (True) or whether the full prompt must still be sent (False, e.g. for the local stand-in).
+    """
+    provider_side = False
+
+    @abstractmethod
+    def create(self, model_name: str, prefix_text: str, ttl_seconds: int, display_name: str) -> Optional[str]:
+        """
+        Stores the prefix and returns its handle, or None if this prefix cannot be cached.
+        """
+
+    @abstractmethod
+    def delete(self, handle: str):
+        """
+        Releases a handle returned by create(). Must not raise for handles that already expired.
+        """
+
+class GeminiContextCacheBackend(ContextCacheBackend):
+    """
+    Explicit context caching through the Gemini API (`client.caches`). Cached tokens are billed at a
+    reduced rate and skipped by prefill, but the API only accepts prefixes above a minimum size.
+    """
+    provider_side = True
+
+    def __init__(self, client, min_prefix_chars: Optional[int] = None):
+        self.client = client
+        self.min_prefix_chars = app_config.CONTEXT_CACHE_MIN_PREFIX_CHARS if min_prefix_chars is None else min_prefix_chars
+
+    def create(self, model_name: str, prefix_text: str, ttl_seconds: int, display_name: str) -> Optional[str]:
+        if len(prefix_text) < self.min_prefix_chars:
+            return None
+        # Imported here so the module stays importable (and the local backend usable) without the SDK.
+        from google.genai import types
+        cached_content = self.client.caches.create(
+            model=model_name,
+            config=types.CreateCachedContentConfig(
+                contents=[prefix_text],
+                ttl=f"{int(ttl_seconds)}s",
+                display_name=display_name[:128]
+            )
+        )
+        return cached_content.name
+
+    def delete(self, handle: str):
+        try:
+            self.client.caches.delete(name=handle)
+        except Exception as e:
+            print(f"[Prompt Cache] Could not delete provider cache {handle}: {e}")
+
+class LocalContextCacheBackend(ContextCacheBackend):
+    """
+    In-process stand-in used when provider caching is unavailable or disabled for testing. It keeps the
+    prefix bookkeeping (hits, misses, invalidation) identical, but the caller still sends the full prompt.
+    """
+    provider_side = False
+
+    def __init__(self):
+        self._prefixes: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def create(self, model_name: str, prefix_text: str, ttl_seconds: int, display_name: str) -> Optional[str]:
+        handle = f"local/{prefix_fingerprint(model_name, prefix_text)[:32]}"
+        with self._lock:
+            self._prefixes[handle] = prefix_text
+        return handle
+
+    def delete(self, handle: str):
+        with self._lock:
+            self._prefixes.pop(handle, None)
+
+    def get(self, handle: str) -> Optional[str]:
+        with self._lock:
+            return self._prefixes.get(handle)
+
+def build_context_cache_backend(client) -> Optional[ContextCacheBackend]:
+    """
+    Selects the backend named by CONTEXT_CACHE_BACKEND ('gemini', 'local' or 'off').
+    'gemini' falls back to the local stand-in when no model client is configured.
+    """
+    backend_name = app_config.CONTEXT_CACHE_BACKEND
+    if backend_name == 'off':
+        return None
+    if backend_name == 'gemini' and client is not None:
+        return GeminiContextCacheBackend(client)
+    return LocalContextCacheBackend()
+
+@dataclass
+class PersonaPrefixEntry:
+    handle: Optional[str]
+    expires_at: float
+    # Names this prefix was built from, used to drop it when a sync reports one of them changed.
+    tags: Dict[str, Set[str]] = field(default_factory=dict)
+
+class PersonaPrefixCache:
+    """
+    LRU of registered persona prefixes. A prefix the backend refuses (too small, API error) is remembered
+    with no handle for a while, so the refusal is not retried on every turn.
+    """
+
+    def __init__(self, backend: Optional[ContextCacheBackend], max_entries: Optional[int] = None,
+                 ttl_seconds: Optional[int] = None):
+        self.backend = backend
+        self.max_entries = app_config.CONTEXT_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.ttl_seconds = app_config.CONTEXT_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._entries: "OrderedDict[str, PersonaPrefixEntry]" = OrderedDict()
+        self._pending: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "uncacheable": 0, "invalidated": 0}
+
+    @property
+    def provider_side(self) -> bool:
+        return bool(self.backend is not None and self.backend.provider_side)
+
+    def _lookup(self, key: str) -> Optional[PersonaPrefixEntry]:
+        # Caller holds the lock. Entries are treated as expired slightly early so a handle never lapses mid-request.
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at - 30 <= time.monotonic():
+            self._entries.pop(key, None)
+            if entry.handle:
+                self._release(entry.handle)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _release(self, handle: str):
+        # Provider deletes are network calls; do them off the request path.
+        threading.Thread(target=self.backend.delete, args=(handle,), name="prompt-cache-delete", daemon=True).start()
+
+    def cached_handle(self, model_name: str, prefix_text: str) -> Optional[PersonaPrefixEntry]:
+        """
+        Returns the live entry for this prefix without creating one (counts a hit when found).
+        """
+        if self.backend is None:
+            return None
+        key = prefix_fingerprint(model_name, prefix_text)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.stats["hits"] += 1
+            return entry
+
+    def handle_for(self, model_name: str, prefix_text: str, display_name: str,
+                   tags: Optional[Dict[str, Set[str]]] = None) -> Optional[str]:
+        """
+        Returns the backend handle for this prefix, registering it on first use. Returns None when caching
+        is off or the backend cannot cache this prefix; the caller then sends the full prompt.
+        """
+        if self.backend is None:
+            return None
+        key = prefix_fingerprint(model_name, prefix_text)
+        while True:
+            with self._lock:
+                entry = self._lookup(key)
+                if entry is not None:
+                    self.stats["hits"] += 1
+                    return entry.handle
+                pending = self._pending.get(key)
+                if pending is None:
+                    # This thread registers the prefix; concurrent turns for the same NPC wait for it.
+                    pending = self._pending[key] = threading.Event()
+                    self.stats["misses"] += 1
+                    break
+            pending.wait(timeout=30)
+
+        handle: Optional[str] = None
+        try:
+            handle = self.backend.create(model_name, prefix_text, self.ttl_seconds, display_name)
+        except Exception as e:
+            print(f"[Prompt Cache] Could not cache the persona prefix for {display_name}: {e}")
+        # A refused prefix is retried after a shorter interval than a registered one lives.
+        ttl_seconds = self.ttl_seconds if handle else min(self.ttl_seconds, 300)
+        with self._lock:
+            if handle is None:
+                self.stats["uncacheable"] += 1
+            self._entries[key] = PersonaPrefixEntry(handle, time.monotonic() + ttl_seconds, dict(tags or {}))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                if evicted.handle:
+                    self._release(evicted.handle)
+            self._pending.pop(key).set()
+        return handle
+
+    async def ahandle_for(self, model_name: str, prefix_text: str, display_name: str,
+                          tags: Optional[Dict[str, Set[str]]] = None) -> Optional[str]:
+        """
+        Async variant of handle_for: a hit is answered inline, a registration runs in a worker thread.
+        """
+        entry = self.cached_handle(model_name, prefix_text)
+        if entry is not None:
+            return entry.handle
+        return await asyncio.to_thread(self.handle_for, model_name, prefix_text, display_name, tags)
+
+    def invalidate_changes(self, changes: Dict[str, Set[str]]):
+        """
+        Sync listener: drops every prefix built from a character, history file or lore entry that changed.
+        """
+        with self._lock:
+            stale_keys = [
+                key for key, entry in self._entries.items()
+                if any(entry.tags.get(kind, set()) & set(names) for kind, names in changes.items())
+            ]
+            for key in stale_keys:
+                entry = self._entries.pop(key)
+                if entry.handle:
+                    self._release(entry.handle)
+            self.stats["invalidated"] += len(stale_keys)
+
+    def clear(self):
+        with self._lock:
+            entries, self._entries = list(self._entries.values()), OrderedDict()
+        for entry in entries:
+            if entry.handle:
+                self._release(entry.handle)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries))
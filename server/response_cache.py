@@ -0,0 +1,201 @@
+# server/response_cache.py
+"""
+Model Response Cache Module.
+Remembers model replies so an identical request (re-clicking a generated topic, retrying after a UI
+error, replaying a canned-response directive) is answered without calling the model again. Keys are
+a hash of the model name, the generation config and the whitespace-normalized prompt. Lookups check
+an in-process LRU first and then a MongoDB collection whose TTL index evicts old replies, so cached
+answers also survive a restart and are shared between the Flask and ASGI processes.
+"""
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo.errors import PyMongoError
+
+from config import config as app_config
+from database import db_connector
+
+RESPONSE_CACHE_COLLECTION = 'llm_response_cache'
+
+@dataclass
+class CachedModelResponse:
+    """
+    Stand-in for a GenerateContentResponse served from the cache. Carries the attributes the dialogue
+    finalizers read (`text`, `candidates`), so cached and live replies go through the same code.
+    """
+    text: str
+    candidates: List[Any] = field(default_factory=list)
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Collapses insignificant whitespace so prompts that differ only in spacing share a cache entry.
+    """
+    prompt = re.sub(r"[ \t]+", " ", prompt)
+    prompt = re.sub(r" ?\n ?", "\n", prompt)
+    prompt = re.sub(r"\n{3,}", "\n\n", prompt)
+    return prompt.strip()
+
+def config_fingerprint(generation_config: Any) -> str:
+    """
+    Stable text form of a GenerateContentConfig. The provider cache handle is left out (it names the
+    prefix, which is already part of the prompt) and a pydantic response schema is reduced to its JSON schema.
+    """
+    if generation_config is None:
+        return ""
+    response_schema = getattr(generation_config, "response_schema", None)
+    config_json = generation_config.model_dump_json(
+        exclude={"cached_content", "http_options", "response_schema"}, exclude_none=True
+    )
+    if isinstance(response_schema, type) and hasattr(response_schema, "model_json_schema"):
+        config_json += repr(sorted(response_schema.model_json_schema().items()))
+    elif response_schema is not None:
+        config_json += repr(response_schema)
+    return config_json
+
+def response_cache_key(model_name: str, generation_config: Any, prompt: str) -> str:
+    """
+    Cache key for one model call.
+    """
+    key_material = "\x1f".join([model_name, config_fingerprint(generation_config), normalize_prompt(prompt)])
+    return hashlib.sha256(key_material.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """
+    Two-tier reply cache: a bounded in-process LRU in front of a MongoDB collection. Both tiers honour
+    the same TTL. Database errors only cost the persistent tier; they never fail a dialogue request.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[int] = None,
+                 persistent: Optional[bool] = None, enabled: Optional[bool] = None):
+        self.enabled = app_config.RESPONSE_CACHE_ENABLED if enabled is None else enabled
+        self.max_entries = app_config.RESPONSE_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.ttl_seconds = app_config.RESPONSE_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.persistent = app_config.RESPONSE_CACHE_PERSISTENT if persistent is None else persistent
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "db_errors": 0}
+
+    def _collection(self):
+        if not self.persistent:
+            return None
+        db = db_connector.get_db()
+        return db[RESPONSE_CACHE_COLLECTION] if db is not None else None
+
+    def _remember(self, key: str, text: str, expires_at: float):
+        # Caller holds the lock.
+        self._entries[key] = (text, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return entry[0]
+
+    def _get_persistent(self, key: str) -> Optional[str]:
+        collection = self._collection()
+        cached_doc = None
+        if collection is not None:
+            try:
+                # The TTL monitor only runs periodically, so expired documents are filtered out explicitly.
+                cached_doc = collection.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}}, {"text": 1, "expires_at": 1})
+            except PyMongoError as e:
+                print(f"[Response Cache] Lookup failed: {e}")
+                with self._lock:
+                    self.stats["db_errors"] += 1
+        with self._lock:
+            if cached_doc is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["db_hits"] += 1
+            remaining_seconds = (cached_doc["expires_at"] - datetime.utcnow()).total_seconds()
+            self._remember(key, cached_doc["text"], time.monotonic() + max(remaining_seconds, 0))
+        return cached_doc["text"]
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        """
+        Returns the cached reply text for `key`, or None. A None key (bypass) is always a miss.
+        """
+        if not self.enabled or key is None:
+            return None
+        cached_text = self._get_memory(key)
+        if cached_text is not None:
+            return cached_text
+        return self._get_persistent(key)
+
+    async def aget(self, key: Optional[str]) -> Optional[str]:
+        """
+        Async variant of get: memory hits are answered inline, the database lookup runs in a worker thread.
+        """
+        if not self.enabled or key is None:
+            return None
+        cached_text = self._get_memory(key)
+        if cached_text is not None:
+            return cached_text
+        return await asyncio.to_thread(self._get_persistent, key)
+
+    def put(self, key: Optional[str], model_name: str, text: str):
+        """
+        Stores a reply in both tiers.
+        """
+        if not self.enabled or key is None or not text:
+            return
+        with self._lock:
+            self._remember(key, text, time.monotonic() + self.ttl_seconds)
+            self.stats["stores"] += 1
+        collection = self._collection()
+        if collection is None:
+            return
+        now = datetime.utcnow()
+        try:
+            collection.update_one(
+                {"_id": key},
+                {"$set": {"model": model_name, "text": text, "created_at": now,
+                          "expires_at": now + timedelta(seconds=self.ttl_seconds)}},
+                upsert=True
+            )
+        except PyMongoError as e:
+            print(f"[Response Cache] Store failed: {e}")
+            with self._lock:
+                self.stats["db_errors"] += 1
+
+    async def aput(self, key: Optional[str], model_name: str, text: str):
+        """
+        Async variant of put; the database write runs in a worker thread.
+        """
+        if not self.enabled or key is None or not text:
+            return
+        await asyncio.to_thread(self.put, key, model_name, text)
+
+    def clear(self) -> int:
+        """
+        Empties both tiers. Returns the number of persistent entries removed.
+        """
+        with self._lock:
+            self._entries.clear()
+        collection = self._collection()
+        if collection is None:
+            return 0
+        return collection.delete_many({}).deleted_count
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats["memory_hits"] + self.stats["db_hits"] + self.stats["misses"]
+            hits = self.stats["memory_hits"] + self.stats["db_hits"]
+            return dict(self.stats, enabled=self.enabled, persistent=self.persistent, entries=len(self._entries),
+                        hit_rate=round(hits / lookups, 3) if lookups else None)
@@ -0,0 +1,304 @@
+# server/retrieval.py
+"""
+Knowledge Retrieval Module.
+An in-process BM25 inverted index over every lore entry (description, key facts, name, tags and type)
+and every character's `knowledge` list. Each dialogue turn queries it with the player's utterance plus
+the scene, and the best-scoring passages are added to the prompt, so an NPC can draw on lore the GM
+never linked by hand without the whole lore collection being sent. The index is built once from MongoDB
+and then updated per lore entry or character as they are edited or synced; GM notes are never indexed.
+"""
+import heapq
+import math
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from config import config as app_config
+from canned_matcher import light_stem, utterance_words
+
+# Common words that carry no meaning for relevance ranking.
+RETRIEVAL_STOPWORDS = {
+    "a", "an", "the", "of", "on", "to", "in", "at", "by", "for", "with", "and", "or", "but", "if", "is",
+    "are", "was", "were", "be", "been", "it", "its", "this", "that", "these", "those", "as", "from", "so",
+    "i", "you", "he", "she", "we", "they", "me", "him", "her", "us", "them", "my", "your", "his", "our",
+    "their", "what", "who", "whom", "which", "where", "when", "why", "how", "do", "does", "did", "have",
+    "has", "had", "can", "could", "would", "should", "will", "shall", "may", "might", "must", "not", "no",
+    "there", "here", "about", "any", "some", "all", "just", "than", "then", "too", "very", "tell", "know"
+}
+
+# The only fields the index reads; GM notes and link lists are never loaded.
+LORE_INDEX_PROJECTION = {"_id": 0, "name": 1, "lore_type": 1, "description": 1, "key_facts": 1, "tags": 1}
+CHARACTER_KNOWLEDGE_PROJECTION = {"_id": 0, "name": 1, "knowledge": 1}
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+def index_terms(text: str) -> List[str]:
+    """
+    Lower-cased, stemmed content words of a text, in order (duplicates kept for term frequencies).
+    """
+    return [light_stem(word) for word in utterance_words(text or "") if len(word) > 1 and word not in RETRIEVAL_STOPWORDS]
+
+def split_passages(text: str, max_chars: int) -> List[str]:
+    """
+    Splits a description into passages of whole sentences of at most max_chars (a longer sentence is cut).
+    """
+    passages: List[str] = []
+    current = ""
+    for sentence in _SENTENCE_END.split((text or "").strip()):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) > max_chars:
+            sentence = sentence[:max_chars - 3].rstrip() + "..."
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            passages.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        passages.append(current)
+    return passages
+
+@dataclass
+class KnowledgePassage:
+    # ("lore", lore name) or ("knowledge", character name): the unit that is replaced on an update.
+    source: Tuple[str, str]
+    text: str
+    # Character whose private knowledge this is; None for world lore every NPC may recall.
+    owner: Optional[str]
+    length: int
+
+@dataclass
+class RetrievedPassage:
+    source_kind: str
+    source_name: str
+    text: str
+    score: float
+
+class KnowledgeIndex:
+    """
+    BM25 (k1, b) over passages. Postings map each term to {passage id: term frequency}; removing a
+    source drops its passages from every posting list it appears in, so updates never need a rebuild.
+    """
+    K1 = 1.5
+    B = 0.75
+    # Scene words help disambiguate but must not outrank what the player actually asked.
+    CONTEXT_TERM_WEIGHT = 0.5
+    # At most this many passages per lore entry, so one long entry cannot crowd out everything else.
+    MAX_PASSAGES_PER_SOURCE = 2
+
+    def __init__(self, max_passage_chars: Optional[int] = None):
+        self.max_passage_chars = app_config.RETRIEVAL_MAX_PASSAGE_CHARS if max_passage_chars is None else max_passage_chars
+        self._passages: Dict[int, KnowledgePassage] = {}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._passage_terms: Dict[int, Set[str]] = {}
+        self._by_source: Dict[Tuple[str, str], List[int]] = {}
+        self._total_length = 0
+        self._next_id = 0
+        self._built = False
+        self._lock = threading.RLock()
+        self.stats = {"builds": 0, "updates": 0, "queries": 0, "last_query_ms": 0.0, "last_build_ms": 0.0}
+
+    @property
+    def is_built(self) -> bool:
+        return self._built
+
+    def _add_passage(self, source: Tuple[str, str], text: str, terms: List[str], owner: Optional[str]):
+        # Caller holds the lock.
+        if not terms:
+            return
+        passage_id = self._next_id
+        self._next_id += 1
+        self._passages[passage_id] = KnowledgePassage(source, text, owner, len(terms))
+        self._passage_terms[passage_id] = set(terms)
+        self._by_source.setdefault(source, []).append(passage_id)
+        self._total_length += len(terms)
+        for term, term_frequency in Counter(terms).items():
+            self._postings.setdefault(term, {})[passage_id] = term_frequency
+
+    def _remove_source(self, source: Tuple[str, str]):
+        # Caller holds the lock.
+        for passage_id in self._by_source.pop(source, []):
+            passage = self._passages.pop(passage_id)
+            self._total_length -= passage.length
+            for term in self._passage_terms.pop(passage_id):
+                postings = self._postings[term]
+                postings.pop(passage_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def _index_lore(self, lore_doc: Dict[str, Any]):
+        # Caller holds the lock. Every passage also carries the entry's name, tags and type as terms,
+        # so "the Zhentarim" finds the Zhentarim's facts even when a fact never repeats the name.
+        lore_name = lore_doc.get('name')
+        if not lore_name:
+            return
+        source = ("lore", lore_name)
+        self._remove_source(source)
+        lore_type = lore_doc.get('lore_type')
+        lore_type = getattr(lore_type, 'value', lore_type) or ""
+        entry_terms = index_terms(" ".join([lore_name, lore_type, *(lore_doc.get('tags') or [])]))
+        passage_texts = split_passages(lore_doc.get('description') or "", self.max_passage_chars)
+        passage_texts.extend(fact.strip()[:self.max_passage_chars] for fact in (lore_doc.get('key_facts') or []) if fact and fact.strip())
+        for passage_text in passage_texts:
+            self._add_passage(source, passage_text, index_terms(passage_text) + entry_terms, None)
+
+    def _index_character_knowledge(self, character_name: str, knowledge: Iterable[str]):
+        # Caller holds the lock.
+        source = ("knowledge", character_name)
+        self._remove_source(source)
+        for knowledge_item in knowledge or []:
+            if knowledge_item and knowledge_item.strip():
+                passage_text = knowledge_item.strip()[:self.max_passage_chars]
+                self._add_passage(source, passage_text, index_terms(passage_text), character_name)
+
+    def build(self, db):
+        """
+        (Re)builds the whole index from the lore_entries and npcs collections.
+        """
+        started = time.perf_counter()
+        lore_docs = list(db.lore_entries.find({}, LORE_INDEX_PROJECTION))
+        character_docs = list(db.npcs.find({"knowledge.0": {"$exists": True}}, CHARACTER_KNOWLEDGE_PROJECTION))
+        with self._lock:
+            self._passages.clear()
+            self._postings.clear()
+            self._passage_terms.clear()
+            self._by_source.clear()
+            self._total_length = 0
+            for lore_doc in lore_docs:
+                self._index_lore(lore_doc)
+            for character_doc in character_docs:
+                if character_doc.get('name'):
+                    self._index_character_knowledge(character_doc['name'], character_doc.get('knowledge'))
+            self._built = True
+            self.stats["builds"] += 1
+            self.stats["last_build_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        print(f"[Retrieval] Indexed {len(self._passages)} passages from {len(lore_docs)} lore entries "
+              f"and {len(character_docs)} characters in {self.stats['last_build_ms']} ms.")
+
+    def ensure_built(self, db):
+        """
+        Builds the index on first use. Later changes arrive through the update methods.
+        """
+        if self._built or db is None:
+            return
+        with self._lock:
+            if not self._built:
+                self.build(db)
+
+    def update_lore(self, lore_doc: Dict[str, Any], previous_name: Optional[str] = None):
+        """
+        Re-indexes one lore entry (dropping it under its previous name first, if it was renamed).
+        """
+        if not self._built:
+            return
+        with self._lock:
+            if previous_name and previous_name != lore_doc.get('name'):
+                self._remove_source(("lore", previous_name))
+            self._index_lore(lore_doc)
+            self.stats["updates"] += 1
+
+    def remove_lore(self, lore_name: Optional[str]):
+        if not self._built or not lore_name:
+            return
+        with self._lock:
+            self._remove_source(("lore", lore_name))
+            self.stats["updates"] += 1
+
+    def update_character_knowledge(self, character_name: str, knowledge: Iterable[str], previous_name: Optional[str] = None):
+        """
+        Re-indexes one character's knowledge list (dropping it under its previous name first, if renamed).
+        """
+        if not self._built or not character_name:
+            return
+        with self._lock:
+            if previous_name and previous_name != character_name:
+                self._remove_source(("knowledge", previous_name))
+            self._index_character_knowledge(character_name, knowledge)
+            self.stats["updates"] += 1
+
+    def remove_character(self, character_name: Optional[str]):
+        if not self._built or not character_name:
+            return
+        with self._lock:
+            self._remove_source(("knowledge", character_name))
+            self.stats["updates"] += 1
+
+    def refresh_changes(self, db, changes: Dict[str, Set[str]]):
+        """
+        Sync listener body: reloads the lore entries and characters a sync created, changed or removed.
+        Names no longer in the database are dropped from the index.
+        """
+        if not self._built or db is None:
+            return
+        lore_names = sorted(changes.get("lore") or set())
+        character_names = sorted(changes.get("character") or set())
+        lore_docs = {doc.get('name'): doc for doc in db.lore_entries.find({"name": {"$in": lore_names}}, LORE_INDEX_PROJECTION)} if lore_names else {}
+        character_docs = {doc.get('name'): doc for doc in db.npcs.find({"name": {"$in": character_names}}, CHARACTER_KNOWLEDGE_PROJECTION)} if character_names else {}
+        with self._lock:
+            for lore_name in lore_names:
+                if lore_name in lore_docs:
+                    self._index_lore(lore_docs[lore_name])
+                else:
+                    self._remove_source(("lore", lore_name))
+            for character_name in character_names:
+                self._index_character_knowledge(character_name, (character_docs.get(character_name) or {}).get('knowledge'))
+            self.stats["updates"] += len(lore_names) + len(character_names)
+
+    def query(self, text: str, context_text: str = "", owner: Optional[str] = None,
+              top_k: Optional[int] = None) -> List[RetrievedPassage]:
+        """
+        Returns up to top_k passages ranked by BM25 against `text` (scene words in `context_text` count at
+        CONTEXT_TERM_WEIGHT). Only world lore and the given owner's own knowledge are considered.
+        """
+        top_k = app_config.RETRIEVAL_TOP_K if top_k is None else top_k
+        query_weights: Dict[str, float] = {}
+        for term in index_terms(context_text):
+            query_weights[term] = self.CONTEXT_TERM_WEIGHT
+        for term in index_terms(text):
+            query_weights[term] = 1.0
+        if not query_weights or top_k <= 0:
+            return []
+
+        started = time.perf_counter()
+        with self._lock:
+            passage_count = len(self._passages)
+            if not passage_count:
+                return []
+            average_length = self._total_length / passage_count
+            k1, b = self.K1, self.B
+            scores: Dict[int, float] = {}
+            for term, weight in query_weights.items():
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (passage_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for passage_id, term_frequency in postings.items():
+                    passage = self._passages[passage_id]
+                    if passage.owner is not None and passage.owner != owner:
+                        continue
+                    norm = k1 * (1 - b + b * passage.length / average_length)
+                    scores[passage_id] = scores.get(passage_id, 0.0) + weight * idf * term_frequency * (k1 + 1) / (term_frequency + norm)
+            results: List[RetrievedPassage] = []
+            taken_per_source: Counter = Counter()
+            for passage_id, score in heapq.nlargest(top_k * 4, scores.items(), key=lambda item: item[1]):
+                passage = self._passages[passage_id]
+                if taken_per_source[passage.source] >= self.MAX_PASSAGES_PER_SOURCE:
+                    continue
+                taken_per_source[passage.source] += 1
+                results.append(RetrievedPassage(passage.source[0], passage.source[1], passage.text, round(score, 3)))
+                if len(results) == top_k:
+                    break
+            self.stats["queries"] += 1
+            self.stats["last_query_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return results
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, built=self._built, passages=len(self._passages), terms=len(self._postings),
+                        sources=len(self._by_source))
+
+knowledge_index = KnowledgeIndex()
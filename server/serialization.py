@@ -0,0 +1,80 @@
+# server/serialization.py
+"""
+BSON-aware JSON Serialization Module.
+Encodes MongoDB documents straight to JSON bytes in a single pass, replacing the
+`json_util.dumps` -> `json.loads` -> `jsonify` round trip. ObjectId and datetime keep the relaxed
+Extended JSON shape the frontend already understands ({"$oid": ...}, {"$date": ...}) and Enums are
+written as their values. Uses orjson when it is installed and the standard library otherwise.
+"""
+import json
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any
+
+from bson import ObjectId, json_util
+from bson.json_util import RELAXED_JSON_OPTIONS
+from flask.json.provider import DefaultJSONProvider
+
+# orjson is optional: the stdlib encoder produces identical output, just more slowly.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _format_bson_datetime(value: datetime) -> str:
+    """
+    Formats a datetime the way relaxed Extended JSON does: UTC, millisecond precision, trailing 'Z'.
+    Naive datetimes are treated as UTC, matching how PyMongo stores them.
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    formatted = value.strftime('%Y-%m-%dT%H:%M:%S')
+    milliseconds = value.microsecond // 1000
+    if milliseconds:
+        formatted += f".{milliseconds:03d}"
+    return formatted + 'Z'
+
+def bson_default(obj: Any) -> Any:
+    """
+    `default` hook for orjson and json: converts the BSON and Python types found in Mongo documents.
+    """
+    if isinstance(obj, ObjectId):
+        return {"$oid": str(obj)}
+    if isinstance(obj, datetime):
+        return {"$date": _format_bson_datetime(obj)}
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    # Remaining BSON types (Decimal128, Binary, Regex, ...) use PyMongo's relaxed representation.
+    return json_util.default(obj, json_options=RELAXED_JSON_OPTIONS)
+
+def dumps_bytes(obj: Any) -> bytes:
+    """
+    Serializes a document (or any structure containing documents) to UTF-8 JSON bytes in one pass.
+    """
+    if orjson is not None:
+        # Datetimes are passed through to bson_default so they keep the {"$date": ...} shape.
+        return orjson.dumps(obj, default=bson_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(obj, default=bson_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def to_json_compatible(obj: Any) -> Any:
+    """
+    Returns a plain-JSON copy of a document (ObjectIds, datetimes and Enums converted), for callers
+    that need Python objects rather than bytes.
+    """
+    if orjson is not None:
+        return orjson.loads(dumps_bytes(obj))
+    return json.loads(dumps_bytes(obj))
+
+class BSONJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that makes `jsonify` encode Mongo documents directly with dumps_bytes.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return dumps_bytes(obj).decode('utf-8')
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
@@ -39,6 +39,26 @@ var ApiService = (function() {
             return _fetchData(`${API_BASE_URL}/api/npcs`);
         },
 
+        /**
+         * Retrieves the lightweight character roster (id, name, type, race, class, img, standings)
+         * by walking the keyset-paginated summary listing. Full sheets are fetched on demand.
+         * @param {number} pageSize - Number of characters requested per page.
+         * @returns {Promise<Array<Object>>} Summary documents for every character.
+         */
+        fetchCharacterRoster: async function(pageSize = 200) {
+            console.log("ApiService: Fetching character roster...");
+            let roster = [];
+            let cursor = null;
+            do {
+                const params = new URLSearchParams({ view: 'summary', limit: pageSize });
+                if (cursor) params.set('cursor', cursor);
+                const payload = await _fetchData(`${API_BASE_URL}/api/npcs?${params.toString()}`);
+                roster = roster.concat(payload.data || []);
+                cursor = payload.meta ? payload.meta.next_cursor : null;
+            } while (cursor);
+            return roster;
+        },
+
         /** Retrieves a specific character document by its MongoDB ObjectId. */
         fetchNpcDetails: async function(npcId) {
             console.log(`ApiService: Fetching details for char ID: ${npcId}`);
@@ -54,6 +74,134 @@ var ApiService = (function() {
             });
         },
 
+        /**
+         * Streams an NPC's reply over Server-Sent Events (read from the fetch body, since EventSource cannot POST).
+         * Dialogue tokens arrive first, then one `suggestion` event per completed suggestion line.
+         * @param {string} npcId - The NPC who should respond.
+         * @param {Object} payload - Same payload as generateNpcDialogue.
+         * @param {Object} handlers - Optional callbacks: onToken(text), onSuggestion(field, value).
+         * @returns {Promise<Object>} The fully parsed dialogue result (same shape as generateNpcDialogue's data).
+         */
+        streamNpcDialogue: async function(npcId, payload, handlers = {}) {
+            const response = await fetch(`${API_BASE_URL}/api/npcs/${npcId}/dialogue/stream`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+                body: JSON.stringify(payload)
+            });
+            if (!response.ok) {
+                const errorData = await response.json().catch(() => ({ error: "Unknown error structure" }));
+                throw new Error(`HTTP error! status: ${response.status}, message: ${errorData.error || response.statusText}`);
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffered = '';
+            let finalResult = null;
+            const handleEvent = (rawEvent) => {
+                let eventName = 'message';
+                const dataLines = [];
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                    else if (line.startsWith('data:')) dataLines.push(line.slice(5).trimStart());
+                });
+                if (dataLines.length === 0) return;
+                const data = JSON.parse(dataLines.join('\n'));
+                if (eventName === 'token' && handlers.onToken) {
+                    handlers.onToken(data.text);
+                } else if (eventName === 'suggestion' && handlers.onSuggestion) {
+                    handlers.onSuggestion(data.field, data.value);
+                } else if (eventName === 'done') {
+                    finalResult = data.data;
+                } else if (eventName === 'error') {
+                    throw new Error(data.error || "Streaming dialogue failed");
+                }
+            };
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffered += decoder.decode(value, { stream: true });
+                const rawEvents = buffered.split('\n\n');
+                buffered = rawEvents.pop();
+                rawEvents.forEach(handleEvent);
+            }
+            if (buffered.trim()) handleEvent(buffered);
+            if (!finalResult) {
+                throw new Error("Dialogue stream ended before the reply was complete");
+            }
+            return finalResult;
+        },
+
+        /**
+         * Sends one utterance to several NPCs at once. The server generates their replies concurrently and
+         * streams one NDJSON line per NPC as soon as it finishes; `onNpcResult` is called for each of them.
+         * @param {Array<string>} npcIds - The NPCs in the scene who should respond.
+         * @param {Object} payload - Scene context, utterance and (optionally) per-NPC dialogue histories.
+         * @param {Function} onNpcResult - Called with (npcId, dialogueResult | null, errorMessage | null).
+         * @returns {Promise<Object>} The final scene summary (npc_count, failed, elapsed_ms).
+         */
+        generateSceneDialogue: async function(npcIds, payload, onNpcResult) {
+            const response = await fetch(`${API_BASE_URL}/api/scene/dialogue`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ ...payload, npc_ids: npcIds })
+            });
+            if (!response.ok) {
+                const errorData = await response.json().catch(() => ({ error: "Unknown error structure" }));
+                throw new Error(`HTTP error! status: ${response.status}, message: ${errorData.error || response.statusText}`);
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffered = '';
+            let sceneSummary = null;
+            const handleLine = (line) => {
+                if (!line.trim()) return;
+                const envelope = JSON.parse(line);
+                const meta = envelope.meta || {};
+                if (meta.scene_complete) {
+                    sceneSummary = meta;
+                } else {
+                    onNpcResult(meta.npc_id, envelope.success ? envelope.data : null, envelope.error);
+                }
+            };
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffered += decoder.decode(value, { stream: true });
+                const lines = buffered.split('\n');
+                buffered = lines.pop();
+                lines.forEach(handleLine);
+            }
+            handleLine(buffered + decoder.decode());
+            return sceneSummary;
+        },
+
+        /** Retrieves the status (and, once finished, the result) of a background job. */
+        fetchJob: async function(jobId) {
+            return _fetchData(`${API_BASE_URL}/api/jobs/${jobId}`);
+        },
+
+        /**
+         * Polls a background job until it succeeds or is dead-lettered, backing off between polls.
+         * @param {string} jobId - e.g. the memory_job_id returned with a dialogue reply.
+         * @param {number} timeoutMs - Give up (resolving to the last seen job) after this long.
+         * @returns {Promise<Object>} The job view: status, attempts, result, last_error.
+         */
+        waitForJob: async function(jobId, timeoutMs = 90000) {
+            const deadline = Date.now() + timeoutMs;
+            let delayMs = 500;
+            let job = null;
+            while (Date.now() < deadline) {
+                job = (await this.fetchJob(jobId)).data;
+                if (job.status === 'succeeded' || job.status === 'dead') {
+                    return job;
+                }
+                await new Promise(resolve => setTimeout(resolve, delayMs));
+                delayMs = Math.min(delayMs * 2, 3000);
+            }
+            return job;
+        },
+
         /** Pushes partial updates (like GM notes or edited attributes) to a character document. */
         updateCharacterOnServer: async function(npcId, updatePayload) {
             return _fetchData(`${API_BASE_URL}/api/npcs/${npcId}`, {
@@ -72,6 +220,13 @@ var ApiService = (function() {
             });
         },
 
+        /** Removes a background memory suggestion from a character once the GM has added or rejected it. */
+        dismissPendingMemory: async function(npcId, jobId) {
+            return _fetchData(`${API_BASE_URL}/api/npcs/${npcId}/pending_memories/${jobId}`, {
+                method: 'DELETE'
+            });
+        },
+
         /** Removes a specific memory object from a character using its unique UUID. */
         deleteNpcMemory: async function(npcId, memoryId) {
             return _fetchData(`${API_BASE_URL}/api/npcs/${npcId}/memory/${memoryId}`, {
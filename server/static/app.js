@@ -76,7 +76,7 @@ var App = {
             // Construct the dynamic flex row for individual PC and GM inputs
             this.renderPartyInboxUI();
 
-            // Start polling the backend for new Discord messages every 3 seconds
+            // Open the live Discord chat feed (pushed as new messages arrive)
             this.startLiveChatPolling();
 
             // Force an initial view update to ensure the UI matches the loaded state
@@ -184,122 +184,147 @@ var App = {
         }
     },
 
-    /** Initiates the interval that repeatedly fetches new Discord messages. */
+    /** Opens the live Discord chat feed: pushed over Server-Sent Events, or long-polled where EventSource is unavailable. */
     startLiveChatPolling: function() {
-        console.log("App.js: [DEBUG - UI] Starting Live Discord Chat polling interval...");
-        setInterval(() => this.pollLiveChat(), 3000);
+        this.liveChatSeq = null;
+        this.renderLiveChatLines([], true);
+        if (window.EventSource) {
+            console.log("App.js: [DEBUG - UI] Subscribing to the live Discord chat stream...");
+            // EventSource reconnects on its own and resumes from the last event id it saw.
+            const source = new EventSource('/api/live_chat/stream');
+            source.addEventListener('lines', (event) => this.applyLiveChatUpdate(JSON.parse(event.data)));
+            source.onerror = () => console.warn("App.js: [DEBUG - UI] Live chat stream interrupted; the browser will reconnect.");
+            return;
+        }
+        console.log("App.js: [DEBUG - UI] EventSource unavailable; long-polling the live Discord chat...");
         this.pollLiveChat();
     },
 
-    /** Fetches the latest session history from the backend and updates the visual feed. */
+    /** Long-polls for lines newer than the last one shown; the server holds the request until one arrives. */
     pollLiveChat: async function() {
-        try {
-            const response = await fetch('/api/live_chat');
-            
-            if (!response.ok) {
-                console.error(`App.js: [DEBUG - UI] Fetch failed with status ${response.status}. Payload:`, await response.text());
-                return;
-            }
-            
-            const messages = await response.json();
-            
-            const container = document.getElementById('live-discord-messages');
-            if (!container) {
-                console.error("App.js: [DEBUG - UI] Could not find 'live-discord-messages' div in the DOM!");
-                return;
+        while (true) {
+            try {
+                const query = this.liveChatSeq === null ? '' : `?since=${this.liveChatSeq}&wait=25`;
+                const response = await fetch(`/api/live_chat${query}`);
+                if (!response.ok) {
+                    console.error(`App.js: [DEBUG - UI] Fetch failed with status ${response.status}. Payload:`, await response.text());
+                    await new Promise(resolve => setTimeout(resolve, 3000));
+                    continue;
+                }
+                this.applyLiveChatUpdate(await response.json());
+            } catch (error) {
+                console.error("App.js: [DEBUG - UI] Error during fetch call to /api/live_chat:", error);
+                await new Promise(resolve => setTimeout(resolve, 3000));
             }
+        }
+    },
 
-            container.innerHTML = ''; // Wipe existing visual feed to rewrite
-            
-            if (messages.length === 0) {
-                const emptyMsg = document.createElement('p');
-                emptyMsg.style.color = '#888';
-                emptyMsg.style.fontStyle = 'italic';
-                emptyMsg.textContent = 'Waiting for live session messages...';
-                container.appendChild(emptyMsg);
-                return;
-            }
+    /** Applies one live chat update: appends its new lines, or replaces the feed when the server asks for a reset. */
+    applyLiveChatUpdate: function(payload) {
+        if (!payload || !payload.success) {
+            return;
+        }
+        const meta = payload.meta || {};
+        this.renderLiveChatLines(payload.data || [], meta.reset);
+        this.liveChatSeq = meta.latest_seq;
+    },
 
-            // Iterate over fetched messages and build clickable DOM elements
-            messages.forEach(msg => {
-                const p = document.createElement('p');
-                p.className = 'discord-msg';
-                p.style.margin = '4px 0';
-                p.style.padding = '6px';
-                p.style.backgroundColor = '#333';
-                p.style.borderRadius = '4px';
-                p.style.cursor = 'pointer'; 
-                p.style.transition = 'background-color 0.2s ease';
-                
-                // Add hover states for better UX indicating clickability
-                p.onmouseover = () => { p.style.backgroundColor = '#444'; };
-                p.onmouseout = () => { p.style.backgroundColor = '#333'; };
-                
-                p.textContent = msg;
-                p.title = "Click to load into Player Input";
+    /** Adds live chat lines to the visual feed (after wiping it on a reset). */
+    renderLiveChatLines: function(messages, reset) {
+        const container = document.getElementById('live-discord-messages');
+        if (!container) {
+            console.error("App.js: [DEBUG - UI] Could not find 'live-discord-messages' div in the DOM!");
+            return;
+        }
+
+        const placeholder = container.querySelector('.live-chat-empty');
+        if (reset) {
+            container.innerHTML = '';
+        } else if (placeholder && messages.length > 0) {
+            placeholder.remove();
+        }
+
+        if (container.childElementCount === 0 && messages.length === 0) {
+            const emptyMsg = document.createElement('p');
+            emptyMsg.className = 'live-chat-empty';
+            emptyMsg.style.color = '#888';
+            emptyMsg.style.fontStyle = 'italic';
+            emptyMsg.textContent = 'Waiting for live session messages...';
+            container.appendChild(emptyMsg);
+            return;
+        }
+
+        messages.forEach(msg => container.appendChild(this.createLiveChatMessageElement(msg)));
+
+        // Keep the feed scrolled to the most recent message
+        container.scrollTop = container.scrollHeight;
+    },
+
+    /** Builds one clickable live chat line that loads its utterance into the speaker's input. */
+    createLiveChatMessageElement: function(msg) {
+        const p = document.createElement('p');
+        p.className = 'discord-msg';
+        p.style.margin = '4px 0';
+        p.style.padding = '6px';
+        p.style.backgroundColor = '#333';
+        p.style.borderRadius = '4px';
+        p.style.cursor = 'pointer'; 
+        p.style.transition = 'background-color 0.2s ease';
+        
+        // Add hover states for better UX indicating clickability
+        p.onmouseover = () => { p.style.backgroundColor = '#444'; };
+        p.onmouseout = () => { p.style.backgroundColor = '#333'; };
+        
+        p.textContent = msg;
+        p.title = "Click to load into Player Input";
+        
+        // When a log entry is clicked, route its text to the appropriate text area
+        p.addEventListener('click', async () => {
+            const match = msg.match(/^([^:]+):\s*(.*)$/);
+            if (match) {
+                const speakerName = match[1].trim();
+                const utterance = match[2].trim();
+
+                let targetTextAreaId = 'gm-utterance'; 
                 
-                // When a log entry is clicked, route its text to the appropriate text area
-                p.addEventListener('click', () => {
-                    const match = msg.match(/^([^:]+):\s*(.*)$/);
-                    if (match) {
-                        const speakerName = match[1].trim();
-                        const utterance = match[2].trim();
-
-                        let targetTextAreaId = 'gm-utterance'; 
-                        
-                        // Check if the speaker is a PC
-                        if (!speakerName.includes("DM") && !speakerName.includes("SRWM")) {
-                            const allChars = window.AppState ? window.AppState.getAllCharacters() : [];
-                            const pc = allChars.find(c => c.name === speakerName && (c.character_type === 'PC' || c.character_type === 'Player Character'));
-                            
-                            if (pc) {
-                                // If the PC exists but isn't "active" in the scene yet, add them and rebuild the row
-                                if (window.AppState && !window.AppState.hasActivePc(pc._id)) {
-                                    window.AppState.addActivePc(pc._id);
-                                    if (window.PCRenderers) {
-                                        const activePcs = window.AppState.getAllCharacters().filter(c => c.character_type === 'PC');
-                                        PCRenderers.renderPcListUI(activePcs);
-                                    }
-                                    App.renderPartyInboxUI(); 
-                                }
-                                targetTextAreaId = `pc-utterance-${pc._id}`;
-                            }
-                        }
+                // Check if the speaker is a PC
+                if (!speakerName.includes("DM") && !speakerName.includes("SRWM")) {
+                    const allChars = window.AppState ? window.AppState.getAllCharacters() : [];
+                    const pc = allChars.find(c => c.name === speakerName && (c.character_type === 'PC' || c.character_type === 'Player Character'));
+                    
+                    if (pc) {
+                        // If the PC exists but isn't "active" in the scene yet, add them and rebuild the row
+                        await App.activatePcFromChat(pc._id);
+                        targetTextAreaId = `pc-utterance-${pc._id}`;
+                    }
+                }
 
-                        // Target the calculated text area and append the utterance
-                        const dynamicUtteranceArea = document.getElementById(targetTextAreaId);
-                        if (dynamicUtteranceArea) {
-                            dynamicUtteranceArea.value = utterance;
-                            // Visual feedback flash
-                            const originalBg = dynamicUtteranceArea.style.backgroundColor;
-                            dynamicUtteranceArea.style.backgroundColor = '#2c4a2c'; 
-                            setTimeout(() => {
-                                dynamicUtteranceArea.style.backgroundColor = originalBg;
-                            }, 300);
-                        } else {
-                            // Fallback to legacy structure if dynamic area is missing
-                            const oldUtteranceArea = document.getElementById('player-utterance');
-                            if (oldUtteranceArea) {
-                                oldUtteranceArea.value = utterance;
-                                const originalBg = oldUtteranceArea.style.backgroundColor;
-                                oldUtteranceArea.style.backgroundColor = '#2c4a2c';
-                                setTimeout(() => {
-                                    oldUtteranceArea.style.backgroundColor = originalBg;
-                                }, 300);
-                            }
-                        }
+                // Target the calculated text area and append the utterance
+                const dynamicUtteranceArea = document.getElementById(targetTextAreaId);
+                if (dynamicUtteranceArea) {
+                    dynamicUtteranceArea.value = utterance;
+                    // Visual feedback flash
+                    const originalBg = dynamicUtteranceArea.style.backgroundColor;
+                    dynamicUtteranceArea.style.backgroundColor = '#2c4a2c'; 
+                    setTimeout(() => {
+                        dynamicUtteranceArea.style.backgroundColor = originalBg;
+                    }, 300);
+                } else {
+                    // Fallback to legacy structure if dynamic area is missing
+                    const oldUtteranceArea = document.getElementById('player-utterance');
+                    if (oldUtteranceArea) {
+                        oldUtteranceArea.value = utterance;
+                        const originalBg = oldUtteranceArea.style.backgroundColor;
+                        oldUtteranceArea.style.backgroundColor = '#2c4a2c';
+                        setTimeout(() => {
+                            oldUtteranceArea.style.backgroundColor = originalBg;
+                        }, 300);
                     }
-                });
-                
-                container.appendChild(p);
-            });
-            
-            // Keep the feed scrolled to the most recent message
-            container.scrollTop = container.scrollHeight;
-            
-        } catch (error) {
-            console.error("App.js: [DEBUG - UI] Error during fetch call to /api/live_chat:", error);
-        }
+                }
+            }
+        });
+
+        return p;
     },
 
     /** Connects the DOM drag event to resize the left-hand sidebar width. */
@@ -514,9 +539,14 @@ var App = {
         const isAdding = !AppState.hasActiveNpc(npcIdStr);
     
         if (isAdding) {
-            // NPC is joining the scene
+            // NPC is joining the scene; the introduction below needs the full sheet, not the roster summary
             AppState.addActiveNpc(npcIdStr);
-            const toggledNpc = AppState.getCharacterById(npcIdStr);
+            let toggledNpc = AppState.getCharacterById(npcIdStr);
+            try {
+                toggledNpc = await CharacterService.ensureFullCharacterLoaded(npcIdStr);
+            } catch (error) {
+                console.error("App.js: Could not load full NPC sheet:", error);
+            }
             if (!toggledNpc) {
                 AppState.removeActiveNpc(npcIdStr);
                 return;
@@ -608,41 +638,109 @@ var App = {
             thinkingMessageElement = sceneEventP;
         }
 
+        // Live transcript line that fills in word by word while the reply streams
+        let liveEntry = null;
+        let liveText = '';
+        const partialSuggestions = { generated_topics: [], suggested_npc_actions: [], suggested_player_checks: [] };
+        const suggestionKeys = { npc_action: 'suggested_npc_actions', player_check: 'suggested_player_checks', generated_topics: 'generated_topics' };
+
         try {
-            // Issue the core API call
-            const result = await ApiService.generateNpcDialogue(npcIdStr, payload);
-            
-            // Remove the thinking indicator upon success
-            if (thinkingMessageElement && thinkingMessageElement.parentNode) {
-                thinkingMessageElement.remove();
-            }
+            // Issue the core API call as a stream so the first words show up while the model is still generating
+            const result = await ApiService.streamNpcDialogue(npcIdStr, payload, {
+                onToken: (text) => {
+                    if (!liveEntry) {
+                        if (thinkingMessageElement && thinkingMessageElement.parentNode) {
+                            thinkingMessageElement.remove();
+                        }
+                        liveEntry = document.createElement('p');
+                        liveEntry.className = 'dialogue-entry npc-response';
+                        transcriptArea.appendChild(liveEntry);
+                    }
+                    liveText += text;
+                    liveEntry.textContent = `${npcName}: ${liveText.trim()}`;
+                    transcriptArea.scrollTop = transcriptArea.scrollHeight;
+                },
+                onSuggestion: (field, value) => {
+                    if (!suggestionKeys[field] || !window.NPCRenderers) return;
+                    partialSuggestions[suggestionKeys[field]] = value;
+                    NPCRenderers.renderSuggestionsArea(partialSuggestions, npcIdStr);
+                }
+            });
+            if (liveEntry) liveEntry.remove();
+            App.applyNpcDialogueResult(npcIdStr, npcName, result, thinkingMessageElement);
+        } catch (error) {
+            // Handle HTTP or Python backend errors gracefully
+            console.error(`Error generating dialogue for ${npcName}:`, error);
+            if (liveEntry) liveEntry.remove();
+            App.applyNpcDialogueError(npcIdStr, npcName, error.message, thinkingMessageElement);
+        }
+    },
 
-            // Append response text and render AI metadata suggestions (checks, actions, etc)
-            if (window.NPCRenderers) {
-                NPCRenderers.appendMessageToTranscriptUI(transcriptArea, `${npcName}: ${result.npc_dialogue}`, 'dialogue-entry npc-response');
-                NPCRenderers.renderSuggestionsArea(result, npcIdStr);
-            }
-            AppState.addDialogueToHistory(npcIdStr, `${npcName}: ${result.npc_dialogue}`);
-            
-            // Set context so Canned Responses map to this specific NPC
-            AppState.setCurrentProfileCharId(npcIdStr); 
-            const interactingChar = AppState.getCharacterById(npcIdStr);
-            if (interactingChar) {
+    /**
+     * Renders one NPC's generated dialogue and suggestions into its transcript. Shared by the
+     * single-NPC request path and the streamed scene endpoint.
+     */
+    applyNpcDialogueResult: function(npcIdStr, npcName, result, thinkingMessageElement = null) {
+        const transcriptArea = document.getElementById(`transcript-${npcIdStr}`);
+        if (!transcriptArea) { return; }
+
+        // Remove the thinking indicator upon success
+        if (thinkingMessageElement && thinkingMessageElement.parentNode) {
+            thinkingMessageElement.remove();
+        }
+
+        // Append response text and render AI metadata suggestions (checks, actions, etc)
+        if (window.NPCRenderers) {
+            NPCRenderers.appendMessageToTranscriptUI(transcriptArea, `${npcName}: ${result.npc_dialogue}`, 'dialogue-entry npc-response');
+            NPCRenderers.renderSuggestionsArea(result, npcIdStr);
+        }
+        AppState.addDialogueToHistory(npcIdStr, `${npcName}: ${result.npc_dialogue}`);
+        
+        // Set context so Canned Responses map to this specific NPC (read from the full sheet, not the roster summary)
+        AppState.setCurrentProfileCharId(npcIdStr); 
+        AppState.lastAiResultForProfiledChar = result;
+        transcriptArea.scrollTop = transcriptArea.scrollHeight;
+        CharacterService.ensureFullCharacterLoaded(npcIdStr).then(interactingChar => {
+            if (interactingChar && AppState.getCurrentProfileCharId() === npcIdStr) {
                 AppState.setCannedResponsesForProfiledChar(interactingChar.canned_conversations || {});
             }
-            AppState.lastAiResultForProfiledChar = result;
+        }).catch(error => console.warn(`App.js: Could not load full sheet for ${npcIdStr}:`, error));
 
-        } catch (error) {
-            // Handle HTTP or Python backend errors gracefully
-            console.error(`Error generating dialogue for ${npcName}:`, error);
-            if (thinkingMessageElement && thinkingMessageElement.parentNode) {
-                thinkingMessageElement.remove();
+        // The memory summary is produced by a background job; show it once it is ready
+        if (result.memory_job_id) {
+            App.awaitMemorySuggestion(npcIdStr, result);
+        }
+    },
+
+    /** Waits for a reply's background memory summary and adds it to that reply's suggestions. */
+    awaitMemorySuggestion: async function(npcIdStr, result) {
+        try {
+            const job = await ApiService.waitForJob(result.memory_job_id);
+            if (!job || job.status !== 'succeeded' || !job.result) {
+                return;
             }
-            if (window.NPCRenderers) {
-                NPCRenderers.appendMessageToTranscriptUI(transcriptArea, `${npcName}: (Error: ${error.message})`, 'dialogue-entry npc-response');
+            result.new_memory_suggestions = [job.result.memory];
+            // Only re-render if the GM is still looking at this reply
+            if (AppState.lastAiResultForProfiledChar === result && window.NPCRenderers) {
+                NPCRenderers.renderSuggestionsArea(result, npcIdStr);
             }
-            AppState.addDialogueToHistory(npcIdStr, `${npcName}: (Error generating dialogue)`);
+        } catch (error) {
+            console.warn(`App.js: Memory summary for ${npcIdStr} not available:`, error);
+        }
+    },
+
+    /** Replaces an NPC's thinking indicator with an error line in its transcript. */
+    applyNpcDialogueError: function(npcIdStr, npcName, errorMessage, thinkingMessageElement = null) {
+        const transcriptArea = document.getElementById(`transcript-${npcIdStr}`);
+        if (!transcriptArea) { return; }
+
+        if (thinkingMessageElement && thinkingMessageElement.parentNode) {
+            thinkingMessageElement.remove();
+        }
+        if (window.NPCRenderers) {
+            NPCRenderers.appendMessageToTranscriptUI(transcriptArea, `${npcName}: (Error: ${errorMessage})`, 'dialogue-entry npc-response');
         }
+        AppState.addDialogueToHistory(npcIdStr, `${npcName}: (Error generating dialogue)`);
         transcriptArea.scrollTop = transcriptArea.scrollHeight;
     },
 
@@ -659,7 +757,7 @@ var App = {
 
     /**
      * The core action trigger for sending text from the new dynamic text areas.
-     * Initiates parallel API calls to every active NPC in the scene based on the input text.
+     * Sends the input text to every active NPC in the scene through a single streamed scene request.
      * @param {string} textareaId - The HTML ID of the box that was submitted.
      * @param {string|null} speakerId - The target character ID, or null if it was the GM.
      */
@@ -719,11 +817,10 @@ var App = {
             }
         });
 
-        // 3. Initiate parallel generation requests
-        const dialoguePromises = listeningNpcIds.map(npcId => {
-            const npc = AppState.getCharacterById(npcId);
-            if (!npc) return Promise.resolve();
-
+        // 3. A single listener gets a token stream; several share one scene request that streams each reply as it finishes
+        const sceneNpcIds = listeningNpcIds.filter(npcId => AppState.getCharacterById(npcId));
+        if (sceneNpcIds.length === 1) {
+            const npcId = sceneNpcIds[0];
             const payload = {
                 scene_context: sceneContext,
                 player_utterance: playerUtterance,
@@ -731,11 +828,43 @@ var App = {
                 speaking_pc_id: speakerId,
                 recent_dialogue_history: AppState.getRecentDialogueHistory(npcId, 10)
             };
-            return App.triggerNpcInteraction(npcId, npc.name, payload, false, `thinking-${npcId}-main`);
-        });
+            await App.triggerNpcInteraction(npcId, AppState.getCharacterById(npcId).name, payload, false, `thinking-${npcId}-main`);
+        } else if (sceneNpcIds.length > 1) {
+            const recentHistoryByNpc = {};
+            sceneNpcIds.forEach(npcId => {
+                recentHistoryByNpc[npcId] = AppState.getRecentDialogueHistory(npcId, 10);
+            });
+            const payload = {
+                scene_context: sceneContext,
+                player_utterance: playerUtterance,
+                active_pcs: activePcsNames,
+                speaking_pc_id: speakerId,
+                recent_dialogue_history_by_npc: recentHistoryByNpc
+            };
+            const pendingNpcIds = new Set(sceneNpcIds);
+
+            try {
+                await ApiService.generateSceneDialogue(sceneNpcIds, payload, (npcId, result, errorMessage) => {
+                    const npc = AppState.getCharacterById(npcId);
+                    if (!npc) return;
+                    pendingNpcIds.delete(npcId);
+                    const thinkingMessageElement = document.getElementById(`thinking-${npcId}-main`);
+                    if (result) {
+                        App.applyNpcDialogueResult(npcId, npc.name, result, thinkingMessageElement);
+                    } else {
+                        App.applyNpcDialogueError(npcId, npc.name, errorMessage, thinkingMessageElement);
+                    }
+                });
+            } catch (error) {
+                console.error("Error generating scene dialogue:", error);
+            }
 
-        // Await all parallel requests to finish
-        await Promise.all(dialoguePromises);
+            // Any NPC the stream never reported on (request failed or was cut off) gets an error line
+            pendingNpcIds.forEach(npcId => {
+                const npc = AppState.getCharacterById(npcId);
+                App.applyNpcDialogueError(npcId, npc.name, "No response received", document.getElementById(`thinking-${npcId}-main`));
+            });
+        }
 
         inputElem.value = ''; // Clear only the specific input box used
         
@@ -746,10 +875,35 @@ var App = {
         }
     },
 
+    /** Activates a PC who spoke in the live chat, loading their full sheet before the dashboard renders it. */
+    activatePcFromChat: async function(pcIdStr) {
+        if (AppState.hasActivePc(pcIdStr)) { return; }
+        try {
+            await CharacterService.ensureFullCharacterLoaded(pcIdStr);
+        } catch (error) {
+            console.error("App.js: Could not load full PC sheet:", error);
+        }
+        AppState.addActivePc(pcIdStr);
+        if (window.PCRenderers) {
+            const activePcs = AppState.getAllCharacters().filter(c => c.character_type === 'PC');
+            PCRenderers.renderPcListUI(activePcs);
+        }
+        App.renderPartyInboxUI();
+    },
+
     /** Adds or removes a PC from the active tracking sets and rebuilds the inbox row. */
-    handleTogglePcSelection: function(pcIdStr) {
+    handleTogglePcSelection: async function(pcIdStr) {
         AppState.toggleActivePc(pcIdStr);
         AppState.currentView = 'pc'; 
+
+        // The roster only holds summaries; the dashboard needs the PC's full sheet
+        if (AppState.hasActivePc(pcIdStr)) {
+            try {
+                await CharacterService.ensureFullCharacterLoaded(pcIdStr);
+            } catch (error) {
+                console.error("App.js: Could not load full PC sheet:", error);
+            }
+        }
         
         if (window.PCRenderers) {
             const allPcs = AppState.getAllCharacters().filter(c => 
@@ -842,12 +996,30 @@ var App = {
                 }
             }
             alert(`Suggested memory added to ${character.name}.`);
+            App.dismissMemorySuggestion(npcId, memoryContent);
         } catch (error) {
             console.error("App.js: Error adding suggested memory:", error);
             alert("Error adding suggested memory: " + error.message);
         }
     },
 
+    /** Removes a memory suggestion from the current reply and, if a background job produced it, from the NPC. */
+    dismissMemorySuggestion: async function(npcId, memoryContent) {
+        const result = AppState.lastAiResultForProfiledChar;
+        if (!result || result.npc_id !== npcId) { return; }
+        result.new_memory_suggestions = (result.new_memory_suggestions || []).filter(item => item !== memoryContent);
+        if (window.NPCRenderers) {
+            NPCRenderers.renderSuggestionsArea(result, npcId);
+        }
+        if (!result.memory_job_id) { return; }
+        try {
+            await ApiService.dismissPendingMemory(npcId, result.memory_job_id);
+        } catch (error) {
+            // Already gone (dismissed elsewhere or trimmed as one of the oldest); nothing left to clean up
+            console.warn(`App.js: Pending memory ${result.memory_job_id} not dismissed:`, error);
+        }
+    },
+
     /** Approves an AI suggestion to alter a PC's standing with an NPC. */
     acceptFactionStandingChange: async function(npcIdToUpdate, pcTargetId, newStanding) {
         if (!npcIdToUpdate || !pcTargetId || !newStanding) {
@@ -951,6 +1123,7 @@ window.handleTogglePcSelection = App.handleTogglePcSelection.bind(App);
 window.handleBackToDashboardOverview = App.handleBackToDashboardOverview.bind(App);
 window.toggleAbilityExpansion = App.toggleAbilityExpansion.bind(App);
 window.addSuggestedMemoryAsActual = App.addSuggestedMemoryAsActual.bind(App);
+window.dismissMemorySuggestion = App.dismissMemorySuggestion.bind(App);
 window.acceptFactionStandingChange = App.acceptFactionStandingChange.bind(App);
 window.useSpecificCannedResponse = App.useSpecificCannedResponse.bind(App);
 window.sendTopicToChat = App.sendTopicToChat.bind(App);
@@ -37,8 +37,9 @@ const CharacterService = {
     initializeAppCharacters: async function() {
         console.log("Fetching characters via characterService...");
         try {
-            // Await complete document pull
-            let charactersFromServer = await ApiService.fetchCharactersFromServer();
+            // Pull only the lightweight roster; full sheets are loaded on demand
+            let charactersFromServer = await ApiService.fetchCharacterRoster();
+            charactersFromServer.forEach(char => { char.is_summary = true; });
             
             // Push raw data into AppState normalization
             appState.setAllCharacters(charactersFromServer);
@@ -80,6 +81,24 @@ const CharacterService = {
         }
     },
 
+    /**
+     * Replaces a roster summary with the character's full sheet (VTT stats, items, etc.)
+     * the first time a view needs it. Already-loaded characters are returned as-is unless
+     * forceRefresh is set.
+     * @param {string} charIdStr - The MongoDB ObjectId of the character.
+     * @param {boolean} forceRefresh - Re-fetch even if the full sheet is already loaded.
+     * @returns {Promise<Object|null>} The full character document.
+     */
+    ensureFullCharacterLoaded: async function(charIdStr, forceRefresh = false) {
+        const existing = appState.getCharacterById(charIdStr);
+        if (existing && !existing.is_summary && !forceRefresh) return existing;
+        const payload = await ApiService.fetchNpcDetails(charIdStr);
+        const fullChar = payload && payload.data ? payload.data : payload;
+        if (!fullChar) return existing;
+        fullChar.is_summary = false;
+        return appState.updateCharacterInList(fullChar);
+    },
+
     /**
      * Executes when an NPC name is clicked, swapping to the profile view
      * and loading their deep context info.
@@ -108,8 +127,7 @@ const CharacterService = {
         
         try {
             // Make a detailed query to the DB to fetch large text blocks (histories)
-            const selectedCharFromServer = await ApiService.fetchNpcDetails(charIdStr);
-            const processedChar = appState.updateCharacterInList(selectedCharFromServer);
+            const processedChar = await CharacterService.ensureFullCharacterLoaded(charIdStr, true);
             
             // Cache their specific predefined topic outputs
             appState.setCannedResponsesForProfiledChar(processedChar.canned_conversations || {});
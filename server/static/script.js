@@ -70,7 +70,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const liveMessagesDiv = document.getElementById('live-discord-messages');
 
     if (stepBtn && pasteArea) {
-        stepBtn.addEventListener('click', () => {
+        stepBtn.addEventListener('click', async () => {
             
             // 1. Initialize Queue if empty
             if (messageQueue.length === 0 && pasteArea.value.trim() !== '') {
@@ -98,16 +98,9 @@ document.addEventListener('DOMContentLoaded', () => {
                     const pc = allChars.find(c => c.name === nextMsg.characterName && (c.character_type === 'PC' || c.character_type === 'Player Character'));
                     
                     if (pc) {
-                        // If PC isn't active, activate them and render the box
-                        if (window.AppState && !window.AppState.hasActivePc(pc._id)) {
-                            window.AppState.addActivePc(pc._id);
-                            if (window.PCRenderers) {
-                                const activePcs = window.AppState.getAllCharacters().filter(c => c.character_type === 'PC');
-                                PCRenderers.renderPcListUI(activePcs);
-                            }
-                            if (window.App && window.App.renderPartyInboxUI) {
-                                window.App.renderPartyInboxUI(); 
-                            }
+                        // If PC isn't active, activate them (loading their full sheet) and render the box
+                        if (window.App && window.App.activatePcFromChat) {
+                            await window.App.activatePcFromChat(pc._id);
                         }
                         targetTextAreaId = `pc-utterance-${pc._id}`;
                     }
@@ -0,0 +1,226 @@
+# server/sync_parsing.py
+"""
+Sync Parsing Module.
+Pure parse-and-validate stage of the file-to-database sync. Contains no database access so the
+functions can run inside worker processes: each call reads one file, hashes it, validates it through
+the Pydantic models and returns plain, picklable documents for the single writer in database.py.
+"""
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from bson import ObjectId
+from pydantic import TypeAdapter
+
+from config import config as app_config
+from models import NPCProfile, LoreEntry
+
+# ijson is optional: without it large actor files fall back to a full json.load.
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:
+    ijson = None
+
+# Reusable validator for whole lore arrays; built once per process instead of one model call per entry.
+LORE_LIST_ADAPTER = TypeAdapter(List[LoreEntry])
+
+# Top-level actor keys worth keeping: every NPCProfile field (and alias) plus the keys read during normalization.
+# Anything else in a Foundry export (effects, _stats, prototypeToken, ownership, ...) is never materialized.
+ACTOR_FIELDS_TO_KEEP = (
+    set(NPCProfile.model_fields)
+    | {field.alias for field in NPCProfile.model_fields.values() if field.alias}
+    | {'type', '_id'}
+)
+
+# Bulky VTT payloads stored exactly as exported. They bypass the Pydantic model so that the
+# validated copy and the model_dump copy of an 850 KB actor never exist alongside the parsed one.
+PASSTHROUGH_ACTOR_FIELDS = {'items': list, 'system': dict}
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def hash_file(file_path: str) -> str:
+    """
+    Computes the SHA-256 of a file in fixed-size chunks without holding its contents in memory.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def stream_actor_fields(file_obj) -> Dict[str, Any]:
+    """
+    Incrementally parses a Foundry actor export and returns only the top-level keys listed in
+    ACTOR_FIELDS_TO_KEEP. Unwanted subtrees are consumed as parser events and discarded without
+    ever being built into Python objects.
+    """
+    if ijson is None:
+        raw_data = json.load(file_obj)
+        if not isinstance(raw_data, dict):
+            return {}
+        return {key: value for key, value in raw_data.items() if key in ACTOR_FIELDS_TO_KEEP}
+
+    fields: Dict[str, Any] = {}
+    current_key = None
+    builder = None
+    for prefix, event, value in ijson.parse(file_obj, use_float=True):
+        if prefix == '':
+            # Events at the root: a new key starts, or the actor object ends.
+            if event in ('map_key', 'end_map') and builder is not None:
+                fields[current_key] = builder.value
+                builder = None
+            if event == 'map_key' and value in ACTOR_FIELDS_TO_KEEP:
+                current_key = value
+                builder = ObjectBuilder()
+            continue
+        if builder is not None:
+            builder.event(event, value)
+    return fields
+
+def build_lore_documents(raw_data: Any) -> List[Dict[str, Any]]:
+    """
+    Validates the contents of a lore file and returns the documents to upsert, keyed by name.
+    """
+    # Normalize single object files vs array dumps
+    lore_list = raw_data if isinstance(raw_data, list) else [raw_data]
+
+    # Skip invalid structural blocks
+    lore_list = [lore_data for lore_data in lore_list if isinstance(lore_data, dict) and 'name' in lore_data]
+
+    for lore_data in lore_list:
+        # Provision a unique ID if the document lacks one natively
+        if 'lore_id' not in lore_data:
+            lore_data['lore_id'] = str(ObjectId())
+
+    # Route the whole array through Pydantic in one pass to ensure the schema matches expectations
+    validated_lore = LORE_LIST_ADAPTER.validate_python(lore_list)
+    return LORE_LIST_ADAPTER.dump_python(validated_lore, by_alias=True, exclude={'__all__': {'lore_id'}})
+
+def build_character_document(char_data: Any, is_pc_folder: bool) -> Optional[Dict[str, Any]]:
+    """
+    Normalizes and validates a single character file, returning the document to upsert by name.
+    Returns None if the file does not describe a character.
+    """
+    if not isinstance(char_data, dict) or 'name' not in char_data:
+        return None
+
+    # Normalization Step: Consolidate naming conventions for "Player Character"
+    # distinguishing it definitively from "NPC".
+    if char_data.get('type') == 'character' or is_pc_folder:
+        char_data['character_type'] = 'Player Character'
+    else:
+        char_data['character_type'] = 'NPC'
+
+    # Supply a fallback description to pass Pydantic validation if missing
+    if not char_data.get('description'):
+        char_data['description'] = "..."
+
+    # Flatten MongoDB BSON ObjectIds structured as dicts `{"$oid": "..."}`
+    # into raw string IDs.
+    if '_id' in char_data and isinstance(char_data['_id'], dict):
+        char_data['_id'] = char_data['_id'].get('$oid', str(ObjectId()))
+
+    # Lift the bulky VTT payloads out so the model only validates (and copies) the small fields.
+    passthrough: Dict[str, Any] = {}
+    for field_name, expected_type in PASSTHROUGH_ACTOR_FIELDS.items():
+        value = char_data.pop(field_name, None)
+        if value is None:
+            value = expected_type()
+        if not isinstance(value, expected_type):
+            raise ValueError(f"'{field_name}' must be a {expected_type.__name__}")
+        if field_name == 'items' and not all(isinstance(item, dict) for item in value):
+            raise ValueError("'items' must only contain objects")
+        passthrough[field_name] = value
+
+    # Pass standard and VTT data through the rigorous Pydantic NPC model.
+    validated_char = NPCProfile(**char_data)
+
+    # Convert the validated class back into a dictionary for DB insertion.
+    char_dump = validated_char.model_dump(by_alias=True, exclude=set(passthrough))
+    char_dump.update(passthrough)
+
+    # Drop the `_id` field from the dictionary before upserting by `name`
+    # to prevent Mongo immutable _id conflict errors.
+    if '_id' in char_dump: del char_dump['_id']
+    return char_dump
+
+def parse_sync_file(kind: str, file_path: str, is_pc_folder: bool, previous_hash: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Reads, hashes and validates one lore or character file.
+    When the content hash equals `previous_hash` the file is reported as unchanged and not parsed.
+    Errors are returned in the result instead of raised so one bad file never aborts a pool run.
+    """
+    result: Dict[str, Any] = {
+        "kind": kind,
+        "file_path": file_path,
+        "unchanged": False,
+        "documents": [],
+        "error": None
+    }
+    try:
+        stat_result = os.stat(file_path)
+    except OSError as e:
+        result["error"] = f"Could not read file: {e}"
+        return result
+
+    result["size"] = stat_result.st_size
+    result["mtime_ns"] = stat_result.st_mtime_ns
+
+    # Large actor exports are hashed in chunks and parsed as a stream so peak memory stays bounded.
+    if kind == "character" and stat_result.st_size >= app_config.SYNC_STREAM_THRESHOLD_BYTES:
+        try:
+            result["sha256"] = hash_file(file_path)
+            if previous_hash is not None and previous_hash == result["sha256"]:
+                result["unchanged"] = True
+                return result
+            with open(file_path, 'rb') as f:
+                char_data = stream_actor_fields(f)
+            char_document = build_character_document(char_data, is_pc_folder)
+            result["documents"] = [char_document] if char_document else []
+        except Exception as e:
+            result["error"] = str(e)
+        return result
+
+    try:
+        with open(file_path, 'rb') as f:
+            raw_bytes = f.read()
+    except OSError as e:
+        result["error"] = f"Could not read file: {e}"
+        return result
+
+    result["sha256"] = hashlib.sha256(raw_bytes).hexdigest()
+    if previous_hash is not None and previous_hash == result["sha256"]:
+        result["unchanged"] = True
+        return result
+
+    try:
+        raw_data = json.loads(raw_bytes.decode('utf-8'))
+        # Drop the raw buffer before validation so only one copy of a large actor stays alive.
+        del raw_bytes
+        if kind == "lore":
+            result["documents"] = build_lore_documents(raw_data)
+        else:
+            char_document = build_character_document(raw_data, is_pc_folder)
+            result["documents"] = [char_document] if char_document else []
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+def iter_parsed_files(work_items: List[Tuple[str, str, bool, Optional[str]]], workers: int) -> Iterator[Dict[str, Any]]:
+    """
+    Runs parse_sync_file over (kind, file_path, is_pc_folder, previous_hash) work items and yields each
+    result as soon as it is ready. With more than one worker the files are fanned out to a process pool;
+    otherwise they are parsed serially in the calling process.
+    """
+    if workers <= 1 or len(work_items) <= 1:
+        for work_item in work_items:
+            yield parse_sync_file(*work_item)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(work_items))) as executor:
+        futures = [executor.submit(parse_sync_file, *work_item) for work_item in work_items]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,265 @@
+# server/token_budget.py
+"""
+Prompt Token Budget Module.
+Estimates the token size of each dialogue prompt section locally and fits the sections into
+PROMPT_TOKEN_BUDGET. Every section has a cap (its most tokens) and a priority: caps are applied first,
+then, if the prompt is still too large, the lowest-priority sections give way first. Text sections keep
+their head, their tail or both ends around an omission marker; list sections (memories, conversation
+lines, retrieved passages, canned topics) drop whole items from their less important end.
+
+Estimates come from a word-piece approximation of the model's tokenizer (or SentencePiece itself when
+the google-genai local tokenizer is installed and selected), scaled by a calibration factor learned from
+the prompt token counts the model reports back.
+"""
+import functools
+import math
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from config import config as app_config
+
+# Default per-section caps in tokens; PROMPT_SECTION_CAPS ("history=4000,lore=1000") overrides them.
+DEFAULT_SECTION_CAPS = {
+    "background": 1500,
+    "history": 6000,
+    "lore": 1500,
+    "memories": 600,
+    "conversation": 1500,
+    "knowledge": 800,
+    "canned_topics": 800,
+}
+
+# Which sections give way first when the capped prompt is still over budget (lowest first).
+SECTION_PRIORITIES = {
+    "history": 10,
+    "background": 20,
+    "lore": 30,
+    "knowledge": 40,
+    "memories": 50,
+    "canned_topics": 60,
+    "conversation": 70,
+}
+
+# A word of up to four characters is one token, a longer word one per four characters, punctuation one each:
+# matching words in 4-character pieces yields exactly that count.
+_TOKEN_PIECES = re.compile(r"\w{1,4}|[^\w\s]", re.UNICODE)
+# Texts at least this long have their counts memoized; the large sections (history, lore) repeat every turn.
+_MEMOIZE_MIN_CHARS = 2048
+
+@functools.lru_cache(maxsize=256)
+def _memoized_approximate_tokens(text: str) -> int:
+    return len(_TOKEN_PIECES.findall(text))
+
+def _approximate_tokens(text: str) -> int:
+    if len(text) >= _MEMOIZE_MIN_CHARS:
+        return _memoized_approximate_tokens(text)
+    return len(_TOKEN_PIECES.findall(text))
+
+def _load_sentencepiece_counter(model_name: str):
+    # The google-genai local tokenizer needs the optional sentencepiece package and downloads the
+    # tokenizer model on first use; any failure falls back to the approximation.
+    try:
+        from google.genai.local_tokenizer import LocalTokenizer
+    except ImportError:
+        print("[Token Budget] sentencepiece not installed; using the approximate token estimator.")
+        return None
+    try:
+        tokenizer = LocalTokenizer(model_name=model_name)
+    except Exception as e:
+        print(f"[Token Budget] Could not load the local tokenizer for {model_name}: {e}")
+        return None
+    return lambda text: tokenizer.count_tokens(text).total_tokens
+
+class TokenEstimator:
+    """
+    Token counts for prompt text. `observe` compares an estimate with the count the model reported and
+    nudges the calibration factor, which moves in 5% steps so budget cuts (and cached prefixes) stay stable.
+    """
+
+    def __init__(self, model_name: str, backend: Optional[str] = None):
+        self.model_name = model_name
+        backend = (app_config.TOKEN_ESTIMATOR if backend is None else backend).lower()
+        self._exact_counter = _load_sentencepiece_counter(model_name) if backend == 'sentencepiece' else None
+        self.backend = 'sentencepiece' if self._exact_counter is not None else 'approximate'
+        self._ratio = 1.0
+        self._lock = threading.Lock()
+        self.stats = {"observations": 0, "last_estimated": 0, "last_reported": 0}
+
+    @property
+    def calibration(self) -> float:
+        return round(self._ratio * 20) / 20
+
+    def raw(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._exact_counter is not None:
+            return self._exact_counter(text)
+        return _approximate_tokens(text)
+
+    def estimate(self, text: str) -> int:
+        if not text:
+            return 0
+        return int(math.ceil(self.raw(text) * self.calibration))
+
+    def observe(self, text: str, reported_tokens: Optional[int]):
+        """
+        Records the model's prompt token count for text that was sent, as an exponential moving average
+        of the reported/estimated ratio (bounded to 0.5-2.0).
+        """
+        estimated = self.raw(text)
+        if not reported_tokens or estimated <= 0:
+            return
+        with self._lock:
+            sample = min(2.0, max(0.5, reported_tokens / estimated))
+            self._ratio = sample if self.stats["observations"] == 0 else 0.9 * self._ratio + 0.1 * sample
+            self.stats["observations"] += 1
+            self.stats["last_estimated"] = estimated
+            self.stats["last_reported"] = reported_tokens
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return dict(self.stats, backend=self.backend, calibration=self.calibration, raw_ratio=round(self._ratio, 3))
+
+def section_caps() -> Dict[str, int]:
+    """
+    DEFAULT_SECTION_CAPS with the overrides from PROMPT_SECTION_CAPS applied.
+    """
+    caps = dict(DEFAULT_SECTION_CAPS)
+    for assignment in (app_config.PROMPT_SECTION_CAPS or "").split(","):
+        name, _, value = assignment.partition("=")
+        if name.strip() and value.strip().isdigit():
+            caps[name.strip()] = int(value.strip())
+    return caps
+
+@dataclass
+class BudgetSection:
+    name: str
+    # Text sections are cut to size; list sections keep or drop whole items.
+    text: str = ""
+    items: Optional[List[str]] = None
+    # 'head', 'tail' or 'both': the end(s) of the section that survive a cut.
+    keep: str = "head"
+    cap: Optional[int] = None
+    priority: int = 50
+    original_tokens: int = 0
+    tokens: int = 0
+    item_tokens: List[int] = field(default_factory=list)
+    kept_items: int = 0
+
+    @property
+    def trimmed(self) -> bool:
+        return self.tokens < self.original_tokens
+
+    def kept(self) -> List[str]:
+        # The surviving items, in their original order.
+        if self.items is None:
+            return []
+        if self.keep == "tail":
+            return self.items[len(self.items) - self.kept_items:] if self.kept_items else []
+        return self.items[:self.kept_items]
+
+def make_section(name: str, estimator: TokenEstimator, text: str = "", items: Optional[Sequence[str]] = None,
+                 keep: str = "head", caps: Optional[Dict[str, int]] = None) -> BudgetSection:
+    """
+    A section measured with the estimator, with its cap and priority looked up by name.
+    """
+    caps = section_caps() if caps is None else caps
+    section = BudgetSection(name=name, text=text or "", items=list(items) if items is not None else None, keep=keep,
+                            cap=caps.get(name), priority=SECTION_PRIORITIES.get(name, 50))
+    if section.items is not None:
+        section.item_tokens = [estimator.estimate(item) for item in section.items]
+        section.kept_items = len(section.items)
+        section.original_tokens = sum(section.item_tokens)
+    else:
+        section.original_tokens = estimator.estimate(section.text)
+    section.tokens = section.original_tokens
+    return section
+
+def _cut_text(text: str, tokens: int, target: int, keep: str) -> str:
+    # Cuts text to about `target` tokens at line (or word) boundaries, proportionally by characters.
+    if target <= 0:
+        return ""
+    chars_per_token = len(text) / max(tokens, 1)
+    marker = f"\n[... about {tokens - target} tokens omitted ...]\n"
+    budget_chars = max(0, int(target * chars_per_token) - len(marker))
+    if keep == "both":
+        head_chars = budget_chars // 2
+        head = text[:head_chars].rsplit("\n", 1)[0] if "\n" in text[:head_chars] else text[:head_chars].rsplit(" ", 1)[0]
+        tail_chars = budget_chars - len(head)
+        tail = text[len(text) - tail_chars:] if tail_chars > 0 else ""
+        tail = tail.split("\n", 1)[-1] if "\n" in tail else tail.split(" ", 1)[-1]
+        return head.rstrip() + marker + tail.lstrip()
+    if keep == "tail":
+        tail = text[len(text) - budget_chars:] if budget_chars > 0 else ""
+        tail = tail.split("\n", 1)[-1] if "\n" in tail else tail.split(" ", 1)[-1]
+        return marker.lstrip() + tail.lstrip()
+    head = text[:budget_chars]
+    head = head.rsplit("\n", 1)[0] if "\n" in head else head.rsplit(" ", 1)[0]
+    return head.rstrip() + marker.rstrip()
+
+def shrink_section(section: BudgetSection, target: int, estimator: TokenEstimator):
+    """
+    Reduces a section to at most `target` tokens (no-op if it already fits).
+    """
+    target = max(0, target)
+    if section.tokens <= target:
+        return
+    if section.items is not None:
+        # Drop items from the unimportant end until the rest fits.
+        order = range(len(section.items)) if section.keep == "tail" else range(len(section.items) - 1, -1, -1)
+        kept_tokens, kept_items = section.tokens, section.kept_items
+        for index in order:
+            if kept_tokens <= target or kept_items == 0:
+                break
+            kept_tokens -= section.item_tokens[index]
+            kept_items -= 1
+        section.tokens, section.kept_items = kept_tokens, kept_items
+        return
+    # The cut is proportional by characters, so text denser than average can land slightly over; aim lower and retry.
+    original_text, original_tokens, goal = section.text, section.tokens, target
+    for _ in range(3):
+        section.text = _cut_text(original_text, original_tokens, goal, section.keep)
+        section.tokens = estimator.estimate(section.text)
+        if section.tokens <= target:
+            break
+        goal = max(0, goal - (section.tokens - target) - 16)
+
+def fit_sections(sections: List[BudgetSection], budget: Optional[int], estimator: TokenEstimator):
+    """
+    Applies every section's cap, then shrinks the lowest-priority sections until the total fits `budget`
+    (None means no overall limit).
+    """
+    for section in sections:
+        if section.cap is not None:
+            shrink_section(section, section.cap, estimator)
+    if budget is None:
+        return
+    overflow = sum(section.tokens for section in sections) - budget
+    for section in sorted(sections, key=lambda section: section.priority):
+        if overflow <= 0:
+            break
+        before = section.tokens
+        shrink_section(section, before - overflow, estimator)
+        overflow -= before - section.tokens
+
+@dataclass
+class BudgetReport:
+    budget: int
+    fixed_tokens: int
+    sections: List[BudgetSection]
+
+    @property
+    def total_tokens(self) -> int:
+        return self.fixed_tokens + sum(section.tokens for section in self.sections)
+
+    def breakdown(self) -> Dict[str, Dict[str, int]]:
+        return {section.name: {"tokens": section.tokens, "original_tokens": section.original_tokens} for section in self.sections}
+
+    def __str__(self) -> str:
+        parts = [f"~{self.total_tokens}/{self.budget or 'unlimited'} tokens", f"instructions {self.fixed_tokens}"]
+        for section in self.sections:
+            if section.original_tokens:
+                parts.append(f"{section.name} {section.tokens}" + (f" (of {section.original_tokens})" if section.trimmed else ""))
+        return " | ".join(parts)